@@ -12,6 +12,7 @@ from drf_spectacular.utils import extend_schema
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from cart.service import merge_guest_cart
 
 @extend_schema(tags=["Authentication"],
                request=RegisterSerializer,   
@@ -51,6 +52,7 @@ class VerifyOTPView(APIView):
             if verify_otp(user, otp):  # use utils.py function
                 refresh = RefreshToken.for_user(user)
                 login(request, user)
+                merge_guest_cart(request, user)
                 return Response({
                     'message': 'OTP verified successfully',
                     'access': str(refresh.access_token),
@@ -71,6 +73,7 @@ class UserLoginAPIView(APIView):
         serializer = UserLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data
+        merge_guest_cart(request, user)
         serializer = RegisterSerializer(user)
         token = RefreshToken.for_user(user)
         data = serializer.data
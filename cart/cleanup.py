@@ -0,0 +1,78 @@
+# carts/cleanup.py
+"""
+Removal of abandoned carts and expired sessions.
+
+Both jobs work in batches: each batch reads up to `batch_size` primary keys
+through an index (Cart.last_modified, Session.expire_date) and deletes
+exactly those rows in a short transaction, so no lock is held for long
+and other writers get in between batches. `pause` sleeps between batches
+to leave the database some room during busy hours.
+"""
+import time
+
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import Cart, CartItem
+from .service import invalidate_cart
+from .storage import forget_cached_carts
+
+
+def delete_abandoned_carts(before, batch_size=1000, pause=0):
+    """Delete carts not modified since `before`, with their items. Returns {"carts", "items"}."""
+    deleted = {"carts": 0, "items": 0}
+    while True:
+        rows = list(
+            Cart.objects.filter(last_modified__lt=before)
+            .order_by("last_modified")
+            .values_list("pk", "user_id")[:batch_size]
+        )
+        if not rows:
+            return deleted
+        with transaction.atomic():
+            # Re-check the age under lock: a cart touched since it was read is kept.
+            abandoned = dict(
+                Cart.objects.select_for_update()
+                .filter(pk__in=[pk for pk, _ in rows], last_modified__lt=before)
+                .values_list("pk", "user_id")
+            )
+            items, _ = CartItem.objects.filter(cart_id__in=abandoned).delete()
+            carts, _ = Cart.objects.filter(pk__in=abandoned).delete()
+            # Cached summaries and their ETags must not outlive the cart.
+            for user_id in abandoned.values():
+                invalidate_cart(user_id)
+        forget_cached_carts(abandoned.values())
+        deleted["carts"] += carts
+        deleted["items"] += items
+        if len(rows) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def purge_expired_sessions(batch_size=1000, pause=0):
+    """
+    Delete expired sessions, guest carts included. Returns {"sessions", "bytes"};
+    bytes is the size of the deleted session data only.
+    """
+    purged = {"sessions": 0, "bytes": 0}
+    now = timezone.now()
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by("expire_date")
+            .values_list("session_key", flat=True)[:batch_size]
+        )
+        if not keys:
+            return purged
+        batch = Session.objects.filter(session_key__in=keys)
+        with transaction.atomic():
+            size = batch.aggregate(size=Sum(Length("session_data")))["size"] or 0
+            count, _ = batch.delete()
+        purged["sessions"] += count
+        purged["bytes"] += size
+        if len(keys) < batch_size:
+            return purged
+        time.sleep(pause)
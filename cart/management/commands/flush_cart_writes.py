@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from cart.storage import flush_pending_writes
+
+
+class Command(BaseCommand):
+    help = (
+        "Write carts changed in the cart cache back to CartItem rows. "
+        "Only needed when CART_STORAGE_BACKEND is cart.storage.CacheCartStorage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.CART_WRITE_BEHIND_BATCH_SIZE)
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep running, flushing every N seconds. By default flush once and exit.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush_pending_writes(batch_size=options["batch_size"])
+            if options["verbosity"] > 1 or not options["interval"]:
+                self.stdout.write(self.style.SUCCESS(f"Wrote back {written} carts."))
+            if not options["interval"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
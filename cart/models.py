@@ -6,6 +6,13 @@ from product.models import Product
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="cart")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped by every change to the cart's items; see cleanup.py.
+    last_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["last_modified"]),
+        ]
 
     def get_total_price(self):
         return sum(item.total_price for item in self.items.all())
@@ -21,6 +28,11 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cart", "product"], name="uniq_cart_item_product"),
+        ]
+
     @property
     def total_price(self):
         return self.price * self.quantity
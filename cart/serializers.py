@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from product.serializers import ProductSerializer
 
@@ -5,4 +6,18 @@ class CartActionSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=["add", "remove", "clear"])
     product_id = serializers.IntegerField(required=False)
     quantity = serializers.IntegerField(required=False, min_value=1, default=1)
-    override_quantity = serializers.BooleanField(required=False, default=False)
\ No newline at end of file
+    override_quantity = serializers.BooleanField(required=False, default=False)
+
+class CartBatchSerializer(serializers.Serializer):
+    actions = CartActionSerializer(many=True, allow_empty=False, max_length=settings.CART_BATCH_MAX_ACTIONS)
+
+    def validate_actions(self, actions):
+        missing = [str(i) for i, action in enumerate(actions) if action["action"] != "clear" and action.get("product_id") is None]
+        if missing:
+            raise serializers.ValidationError(f"product_id is required for add and remove (actions {', '.join(missing)}).")
+        return actions
+
+
+class CartSummarySerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    total = serializers.DecimalField(max_digits=12, decimal_places=2)
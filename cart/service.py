@@ -1,121 +1,148 @@
 # carts/service.py
+import hashlib
+import json
 from decimal import Decimal
 from django.conf import settings
-from .models import Cart, CartItem
-from product.models import Product
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from .storage import SessionCartStorage, get_storage, get_user_storage
+from product.cache import bump_generations, get_generations
+from product.models import AttributeValue, Product
 from product.serializers import ProductSerializer
 
+
+def cart_generation_key(user_id):
+    return f"cart-gen:{user_id}"
+
+
+def invalidate_cart(user_id):
+    """Drop the user's cached cart summary once the current transaction commits."""
+    transaction.on_commit(lambda: bump_generations([cart_generation_key(user_id)]))
+
+
+def _product_relations(prefix=""):
+    """select_related/prefetch_related arguments covering everything ProductSerializer renders."""
+    select = [f"{prefix}category", f"{prefix}brand", f"{prefix}seller"]
+    prefetch = [
+        Prefetch(f"{prefix}attributes", queryset=AttributeValue.objects.select_related("attribute")),
+        f"{prefix}images",
+    ]
+    return select, prefetch
+
+
+class CartSnapshot:
+    """
+    Items, total price and vendor grouping of a cart, built in a single
+    pass over one prefetched query.
+    """
+
+    def __init__(self, items):
+        self.items = []
+        self.total_price = Decimal("0")
+        self.by_vendor = {}
+        for item in items:
+            item["total_price"] = item["price"] * item["quantity"]
+            self.items.append(item)
+            self.total_price += item["total_price"]
+            self.by_vendor.setdefault(item["vendor_id"], []).append(item)
+
+
 class CartService:
     def __init__(self, request):
         self.request = request
         self.session = request.session
-        self.session_key = settings.CART_SESSION_ID
+        self.storage = get_storage(request)
 
-        if request.user.is_authenticated:
-            cart, created = Cart.objects.get_or_create(user=request.user)
-            self.cart_obj = cart
-        else:
-            self.cart_obj = None
-            if self.session_key not in self.session:
-                self.session[self.session_key] = {}
-            self.cart = self.session[self.session_key]
+    def add(self, product, quantity=1, override_quantity=False):
+        self.storage.add(product, quantity=quantity, override_quantity=override_quantity)
+        self._changed()
 
-    def save_session(self):
-        self.session.modified = True
+    def remove(self, product):
+        self.storage.remove(product.id)
+        self._changed()
 
-    def add(self, product, quantity=1, override_quantity=False):
-        product_id = str(product.id)
-        vendor_id = product.seller.id
-        price = Decimal(product.price)
+    def apply(self, actions, products):
+        """Apply a batch of actions with one write; `products` maps id to Product."""
+        self.storage.apply(actions, products)
+        self._changed()
 
+    def _changed(self):
         if self.request.user.is_authenticated:
-            item, created = CartItem.objects.get_or_create(
-                cart=self.cart_obj,
-                product=product,
-                defaults={"price": price, "quantity": quantity, "vendor_id": vendor_id}
-            )
-            if not created:
-                if override_quantity:
-                    item.quantity = quantity
-                else:
-                    item.quantity += quantity
-                item.save()
-        else:
-            if product_id not in self.cart:
-                self.cart[product_id] = {
-                    "quantity": 0,
-                    "price": str(price),
-                    "vendor_id": str(vendor_id)
-                }
-            if override_quantity:
-                self.cart[product_id]["quantity"] = quantity
-            else:
-                self.cart[product_id]["quantity"] += quantity
-            self.save_session()
+            invalidate_cart(self.request.user.pk)
 
-    def remove(self, product):
-        product_id = str(product.id)
-        if self.request.user.is_authenticated:
-            CartItem.objects.filter(cart=self.cart_obj, product=product).delete()
-        else:
-            if product_id in self.cart:
-                del self.cart[product_id]
-                self.save_session()
+    def summary(self):
+        """
+        ({"count", "total"}, version) for header badges. A signed-in user's
+        summary is cached until the cart changes, and its version is the
+        cart's generation. A guest's is read from the session, and its
+        version is a hash of it.
+        """
+        if not self.request.user.is_authenticated:
+            summary = self.storage.summary()
+            raw = json.dumps(self.storage.cart, sort_keys=True)
+            return summary, hashlib.md5(raw.encode()).hexdigest()
+
+        (generation,) = get_generations([cart_generation_key(self.request.user.pk)])
+        key = f"cart-summary:{self.request.user.pk}:{generation}"
+        summary = cache.get(key)
+        if summary is None:
+            summary = self.storage.summary()
+            cache.set(key, summary, settings.CART_SUMMARY_CACHE_TIMEOUT)
+        return summary, str(generation)
+
+    def snapshot(self):
+        """The whole cart as a CartSnapshot; one query plus the product prefetches."""
+        return CartSnapshot(self._items())
+
+    def _items(self):
+        for product, line in self.storage.products(_product_relations):
+            yield {
+                "product": ProductSerializer(product).data,
+                "quantity": line["quantity"],
+                "price": line["price"],
+                "vendor_id": line["vendor_id"],
+            }
 
     def __iter__(self):
-        if self.request.user.is_authenticated:
-            for item in self.cart_obj.items.select_related("product"):
-                yield {
-                    "product": ProductSerializer(item.product).data,
-                    "quantity": item.quantity,
-                    "price": item.price,
-                    "total_price": item.total_price,
-                    "vendor_id": item.vendor_id
-                }
-        else:
-            product_ids = self.cart.keys()
-            products = Product.objects.filter(id__in=product_ids)
-            cart_copy = self.cart.copy()
-            for product in products:
-                cart_copy[str(product.id)]["product"] = ProductSerializer(product).data
-            for item in cart_copy.values():
-                item["price"] = Decimal(item["price"])
-                item["total_price"] = item["price"] * item["quantity"]
-                yield item
+        return iter(self.snapshot().items)
 
     def __len__(self):
-        if self.request.user.is_authenticated:
-            return sum(item.quantity for item in self.cart_obj.items.all())
-        return sum(item["quantity"] for item in self.cart.values())
+        return sum(line["quantity"] for line in self.storage.lines().values())
 
     def get_total_price(self):
-        if self.request.user.is_authenticated:
-            return self.cart_obj.get_total_price()
-        return sum(Decimal(item["price"]) * item["quantity"] for item in self.cart.values())
+        return sum(line["price"] * line["quantity"] for line in self.storage.lines().values())
 
     def clear(self):
-        if self.request.user.is_authenticated:
-            self.cart_obj.items.all().delete()
-        else:
-            self.session[self.session_key] = {}
-            self.save_session()
+        self.storage.clear()
+        self._changed()
 
     def group_by_vendor(self):
         """
         Returns cart items grouped by vendor for multi-vendor checkout
         """
-        vendor_groups = {}
-        for item in self:
-            vendor_groups.setdefault(item["vendor_id"], []).append(item)
-        return vendor_groups
+        return self.snapshot().by_vendor
 
     def sync_session_to_user_cart(self):
         """
-        Moves session cart items into the user's DB cart after login
+        Moves session cart items into the user's cart after login
         """
         if not self.request.user.is_authenticated:
             return
-        for product_id, data in self.cart.items():
-            product = Product.objects.get(id=product_id)
-            self.add(product, quantity=data["quantity"], override_quantity=False)
-        self.clear()
+        merge_guest_cart(self.request, self.request.user)
+
+
+def merge_guest_cart(request, user):
+    """
+    Move the guest cart in the request's session into `user`'s cart;
+    quantities of products in both are added up. Called on login.
+    """
+    guest = SessionCartStorage(request.session)
+    lines = guest.lines()
+    if not lines:
+        return
+    # Products deleted since they were added are dropped.
+    live = set(Product.objects.filter(id__in=lines).values_list("id", flat=True))
+    get_user_storage(user).merge({product_id: line for product_id, line in lines.items() if product_id in live})
+    invalidate_cart(user.pk)
+    guest.clear()
@@ -0,0 +1,13 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from product.models import Product
+from .models import Cart
+from .service import invalidate_cart
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # The cascade removes the product from carts without going through CartService.
+    for user_id in Cart.objects.filter(items__product=instance).values_list("user_id", flat=True).distinct():
+        invalidate_cart(user_id)
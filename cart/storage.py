@@ -0,0 +1,457 @@
+# carts/storage.py
+"""
+Where cart lines are kept.
+
+CartService talks to one of these backends:
+
+* SessionCartStorage, for guests: the lines live in the Django session.
+* DatabaseCartStorage, for signed-in users: one CartItem row per line,
+  written on every change.
+* CacheCartStorage, for signed-in users: the lines live in a key-value
+  store (the `CART_STORAGE_CACHE` cache alias) and are written back to
+  CartItem in batches by `flush_pending_writes` (the `flush_cart_writes`
+  command). Add-to-cart then costs a few cache round-trips and no
+  database write.
+
+`CART_STORAGE_BACKEND` picks the signed-in backend. Any Django cache
+backend can hold the carts: Redis in production, or the in-process
+local-memory and file-based backends in tests and development. Carts must
+not be evicted before they are flushed, so give the alias a generous
+MAX_ENTRIES (or a Redis instance without an eviction policy).
+
+Every backend returns lines as `{product_id: {"quantity", "price", "vendor_id"}}`
+with an int product id, an int quantity, a Decimal price and an int vendor id.
+"""
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from product.models import Product
+from .models import Cart, CartItem
+
+WRITE_SEQUENCE_KEY = "cart-writes:seq"
+WRITE_CURSOR_KEY = "cart-writes:flushed"
+WRITE_GAP_KEY = "cart-writes:gap"
+FLUSH_LOCK_KEY = "cart-writes:lock"
+FLUSH_LOCK_TIMEOUT = 5 * 60
+# Seconds a change may hold a cart's lock, and how often a waiting one retries.
+CART_LOCK_TIMEOUT = 5
+CART_LOCK_POLL = 0.005
+
+
+def _line(quantity, price, vendor_id):
+    return {"quantity": int(quantity), "price": Decimal(price), "vendor_id": int(vendor_id)}
+
+
+def _applied(lines, actions, products):
+    lines = dict(lines)
+    for action in actions:
+        if action["action"] == "clear":
+            lines = {}
+            continue
+        product = products[action["product_id"]]
+        if action["action"] == "remove":
+            lines.pop(product.id, None)
+            continue
+        line = lines.get(product.id) or _line(0, product.price, product.seller_id)
+        quantity = action["quantity"] if action["override_quantity"] else line["quantity"] + action["quantity"]
+        lines[product.id] = dict(line, quantity=quantity)
+    return lines
+
+
+def _merged(lines, extra):
+    merged = dict(lines)
+    for product_id, line in extra.items():
+        current = merged.get(product_id)
+        merged[product_id] = dict(current, quantity=current["quantity"] + line["quantity"]) if current else line
+    return merged
+
+
+class CartStorage:
+    def lines(self):
+        raise NotImplementedError
+
+    def add(self, product, quantity=1, override_quantity=False):
+        raise NotImplementedError
+
+    def remove(self, product_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def replace(self, lines):
+        """Store `lines` as the whole cart."""
+        raise NotImplementedError
+
+    def summary(self):
+        """{"count": units in the cart, "total": their price}."""
+        lines = self.lines().values()
+        return {
+            "count": sum(line["quantity"] for line in lines),
+            "total": sum((line["price"] * line["quantity"] for line in lines), Decimal("0")),
+        }
+
+    def apply(self, actions, products):
+        """
+        Apply validated CartActionSerializer actions in order and store the
+        result with one write. `products` maps product id to Product.
+        """
+        self.replace(_applied(self.lines(), actions, products))
+
+    def merge(self, lines):
+        """Add `lines` to the cart, summing quantities of products already in it."""
+        if lines:
+            self.replace(_merged(self.lines(), lines))
+
+    def products(self, relations):
+        """
+        (product, line) pairs; products deleted since they were added are left out.
+        `relations(prefix)` gives the select_related/prefetch_related arguments to load.
+        """
+        lines = self.lines()
+        select, prefetch = relations("")
+        products = Product.objects.filter(id__in=lines).select_related(*select).prefetch_related(*prefetch)
+        for product in products:
+            yield product, lines[product.id]
+
+
+class SessionCartStorage(CartStorage):
+    def __init__(self, session):
+        self.session = session
+        self.session_key = settings.CART_SESSION_ID
+        if self.session_key not in self.session:
+            self.session[self.session_key] = {}
+        self.cart = self.session[self.session_key]
+
+    def save(self):
+        self.session.modified = True
+
+    def lines(self):
+        return {
+            int(product_id): _line(data["quantity"], data["price"], data["vendor_id"])
+            for product_id, data in self.cart.items()
+        }
+
+    def add(self, product, quantity=1, override_quantity=False):
+        product_id = str(product.id)
+        if product_id not in self.cart:
+            self.cart[product_id] = {
+                "quantity": 0,
+                "price": str(Decimal(product.price)),
+                "vendor_id": str(product.seller_id)
+            }
+        if override_quantity:
+            self.cart[product_id]["quantity"] = quantity
+        else:
+            self.cart[product_id]["quantity"] += quantity
+        self.save()
+
+    def remove(self, product_id):
+        if str(product_id) in self.cart:
+            del self.cart[str(product_id)]
+            self.save()
+
+    def clear(self):
+        self.replace({})
+
+    def replace(self, lines):
+        self.cart = self.session[self.session_key] = {
+            str(product_id): {
+                "quantity": line["quantity"],
+                "price": str(line["price"]),
+                "vendor_id": str(line["vendor_id"]),
+            }
+            for product_id, line in lines.items()
+        }
+        self.save()
+
+
+class DatabaseCartStorage(CartStorage):
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def cart(self):
+        return Cart.objects.get_or_create(user=self.user)[0]
+
+    def _touch(self):
+        # Items change without saving the cart; the cleanup job goes by last_modified.
+        Cart.objects.filter(pk=self.cart.pk).update(last_modified=timezone.now())
+
+    def lines(self):
+        rows = self.cart.items.values_list("product_id", "quantity", "price", "vendor_id")
+        return {product_id: _line(quantity, price, vendor_id) for product_id, quantity, price, vendor_id in rows}
+
+    def add(self, product, quantity=1, override_quantity=False):
+        item, created = CartItem.objects.get_or_create(
+            cart=self.cart,
+            product=product,
+            defaults={"price": Decimal(product.price), "quantity": quantity, "vendor_id": product.seller_id}
+        )
+        if not created:
+            if override_quantity:
+                item.quantity = quantity
+            else:
+                item.quantity += quantity
+            item.save()
+        self._touch()
+
+    def remove(self, product_id):
+        CartItem.objects.filter(cart=self.cart, product_id=product_id).delete()
+        self._touch()
+
+    def summary(self):
+        # One aggregate; joins through the cart so it isn't fetched first.
+        money = DecimalField(max_digits=12, decimal_places=2)
+        return CartItem.objects.filter(cart__user=self.user).aggregate(
+            count=Coalesce(Sum("quantity"), 0),
+            total=Coalesce(Sum(F("price") * F("quantity"), output_field=money), Decimal("0"), output_field=money),
+        )
+
+    def clear(self):
+        self.cart.items.all().delete()
+        self._touch()
+
+    def replace(self, lines):
+        with transaction.atomic():
+            _write_lines({self.cart.pk: lines})
+            self._touch()
+
+    def merge(self, lines):
+        # One upsert on the (cart, product) constraint; update_conflicts
+        # can only copy the new value, so the sums are worked out first.
+        if not lines:
+            return
+        with transaction.atomic():
+            current = dict(
+                self.cart.items.select_for_update().filter(product_id__in=lines).values_list("product_id", "quantity")
+            )
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(
+                        cart=self.cart, product_id=product_id, price=line["price"], vendor_id=line["vendor_id"],
+                        quantity=current.get(product_id, 0) + line["quantity"],
+                    )
+                    for product_id, line in lines.items()
+                ],
+                batch_size=500, update_conflicts=True, unique_fields=["cart", "product"], update_fields=["quantity"],
+            )
+            self._touch()
+
+    def products(self, relations):
+        # One query over the items with the products joined, instead of two.
+        select, prefetch = relations("product__")
+        for item in self.cart.items.select_related("product", *select).prefetch_related(*prefetch):
+            yield item.product, _line(item.quantity, item.price, item.vendor_id)
+
+
+def get_store():
+    return caches[settings.CART_STORAGE_CACHE]
+
+
+def _cart_key(user_id):
+    return f"cart:{user_id}"
+
+
+def _write_key(sequence):
+    return f"cart-writes:{sequence}"
+
+
+def _lock_key(user_id):
+    return f"cart-lock:{user_id}"
+
+
+class CacheCartStorage(CartStorage):
+    """
+    Every change is a read-modify-write of the whole cart, so it runs under
+    a per-cart lock (a `cache.add` key, like the flush lock) and re-reads
+    the cart inside it: two requests changing the same cart at once are
+    applied one after the other instead of one overwriting the other.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk
+        self.store = get_store()
+        self._lines = None
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = self._read()
+        return self._lines
+
+    def _read(self):
+        lines = self.store.get(_cart_key(self.user_id))
+        if lines is None:
+            # Not cached yet (or evicted after its last flush): the rows are current.
+            rows = CartItem.objects.filter(cart__user_id=self.user_id).values_list(
+                "product_id", "quantity", "price", "vendor_id"
+            )
+            lines = {product_id: _line(quantity, price, vendor_id) for product_id, quantity, price, vendor_id in rows}
+            self.store.add(_cart_key(self.user_id), lines, timeout=None)
+        return lines
+
+    @contextmanager
+    def _locked(self):
+        key = _lock_key(self.user_id)
+        deadline = time.monotonic() + CART_LOCK_TIMEOUT
+        while not self.store.add(key, 1, timeout=CART_LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Cart of user {self.user_id} stayed locked.")
+            time.sleep(CART_LOCK_POLL)
+        try:
+            yield
+        finally:
+            self.store.delete(key)
+
+    def _change(self, change):
+        """Store `change(current lines)` unless it returns None. Runs under the cart's lock."""
+        with self._locked():
+            lines = change(dict(self._read()))
+            if lines is not None:
+                self._lines = lines
+                self.store.set(_cart_key(self.user_id), lines, timeout=None)
+                _record_write(self.store, self.user_id)
+
+    def add(self, product, quantity=1, override_quantity=False):
+        def change(lines):
+            line = lines.get(product.id) or _line(0, product.price, product.seller_id)
+            lines[product.id] = dict(line, quantity=quantity if override_quantity else line["quantity"] + quantity)
+            return lines
+
+        self._change(change)
+
+    def remove(self, product_id):
+        def change(lines):
+            if lines.pop(int(product_id), None) is not None:
+                return lines
+
+        self._change(change)
+
+    def clear(self):
+        self._change(lambda lines: {} if lines else None)
+
+    def replace(self, lines):
+        self._change(lambda current: lines)
+
+    def apply(self, actions, products):
+        self._change(lambda lines: _applied(lines, actions, products))
+
+    def merge(self, lines):
+        if lines:
+            self._change(lambda current: _merged(current, lines))
+
+
+def forget_cached_carts(user_ids):
+    """Drop carts from the cache store, e.g. after their rows were deleted, so they aren't written back."""
+    get_store().delete_many([_cart_key(user_id) for user_id in user_ids])
+
+
+def _record_write(store, user_id):
+    """Append the user to the write-behind log: an incrementing sequence of cache keys."""
+    try:
+        sequence = store.incr(WRITE_SEQUENCE_KEY)
+    except ValueError:
+        store.add(WRITE_SEQUENCE_KEY, 0, timeout=None)
+        sequence = store.incr(WRITE_SEQUENCE_KEY)
+    store.set(_write_key(sequence), user_id, timeout=None)
+
+
+def flush_pending_writes(batch_size=500):
+    """Write carts changed in the cache back to CartItem. Returns the number of carts written."""
+    store = get_store()
+    if not store.add(FLUSH_LOCK_KEY, 1, timeout=FLUSH_LOCK_TIMEOUT):
+        return 0  # another flush is running
+    try:
+        written = 0
+        while True:
+            sequence = store.get(WRITE_SEQUENCE_KEY) or 0
+            cursor = store.get(WRITE_CURSOR_KEY) or 0
+            if cursor > sequence:
+                cursor = 0  # the sequence was evicted and restarted
+            if cursor >= sequence:
+                return written
+
+            last = min(sequence, cursor + batch_size)
+            entries = store.get_many([_write_key(n) for n in range(cursor + 1, last + 1)])
+            done = cursor
+            for n in range(cursor + 1, last + 1):
+                if _write_key(n) not in entries and store.get(WRITE_GAP_KEY) != n:
+                    # The writer has taken the number but not stored the entry
+                    # yet; skip it only if it is still missing on the next run.
+                    store.set(WRITE_GAP_KEY, n, timeout=None)
+                    break
+                done = n
+
+            flushed = [_write_key(n) for n in range(cursor + 1, done + 1)]
+            user_ids = {entries[key] for key in flushed if key in entries}
+            _write_carts(store, user_ids)
+            store.set(WRITE_CURSOR_KEY, done, timeout=None)
+            store.delete_many(flushed)
+            written += len(user_ids)
+            if done < last:
+                return written
+    finally:
+        store.delete(FLUSH_LOCK_KEY)
+
+
+def _write_carts(store, user_ids):
+    cached = store.get_many([_cart_key(user_id) for user_id in user_ids])
+    carts = {user_id: cached[_cart_key(user_id)] for user_id in user_ids if _cart_key(user_id) in cached}
+    if not carts:
+        return
+    with transaction.atomic():
+        cart_ids = dict(Cart.objects.filter(user_id__in=carts).values_list("user_id", "id"))
+        for user_id in carts.keys() - cart_ids.keys():
+            cart_ids[user_id] = Cart.objects.get_or_create(user_id=user_id)[0].id
+        _write_lines({cart_ids[user_id]: lines for user_id, lines in carts.items()})
+        Cart.objects.filter(pk__in=cart_ids.values()).update(last_modified=timezone.now())
+
+
+def _write_lines(carts):
+    """Bulk-write CartItem rows so each cart matches its lines ({cart_id: lines}). Call inside a transaction."""
+    live = set(Product.objects.filter(id__in={pk for lines in carts.values() for pk in lines}).values_list("id", flat=True))
+    existing = {}
+    for item in CartItem.objects.filter(cart_id__in=carts):
+        existing.setdefault(item.cart_id, {}).setdefault(item.product_id, []).append(item)
+
+    to_create, to_update, to_delete = [], [], []
+    for cart_id, lines in carts.items():
+        current = existing.get(cart_id, {})
+        for product_id, items in current.items():
+            line = lines.get(product_id) if product_id in live else None
+            to_delete.extend(item.pk for item in (items if line is None else items[1:]))
+        for product_id, line in lines.items():
+            if product_id not in live:
+                continue
+            item = current.get(product_id, [None])[0]
+            if item is None:
+                to_create.append(CartItem(cart_id=cart_id, product_id=product_id, **line))
+            elif (item.quantity, item.price, item.vendor_id) != (line["quantity"], line["price"], line["vendor_id"]):
+                item.quantity, item.price, item.vendor_id = line["quantity"], line["price"], line["vendor_id"]
+                to_update.append(item)
+
+    if to_delete:
+        CartItem.objects.filter(pk__in=to_delete).delete()
+    CartItem.objects.bulk_update(to_update, ["quantity", "price", "vendor_id"], batch_size=500)
+    CartItem.objects.bulk_create(to_create, batch_size=500)
+
+
+def get_user_storage(user):
+    return import_string(settings.CART_STORAGE_BACKEND)(user)
+
+
+def get_storage(request):
+    """The storage for this request: the session for guests, CART_STORAGE_BACKEND for users."""
+    if request.user.is_authenticated:
+        return get_user_storage(request.user)
+    return SessionCartStorage(request.session)
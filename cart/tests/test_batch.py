@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+class CartBatchTestCase(APITestCase):
+    def setUp(self):
+        caches["carts"].clear()
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Toys")
+        self.products = [
+            Product.objects.create(name=f"Kite {i}", price=Decimal("3.00"), qty=10, seller=seller, category=category)
+            for i in range(4)
+        ]
+        self.url = reverse("cart")
+
+    def _batch(self, *actions):
+        return self.client.post(self.url, {"actions": list(actions)}, format="json")
+
+    def _apply_batch(self):
+        first, second, third, fourth = self.products
+        return self._batch(
+            {"action": "add", "product_id": first.id, "quantity": 2},
+            {"action": "add", "product_id": first.id},
+            {"action": "add", "product_id": second.id, "quantity": 5},
+            {"action": "add", "product_id": second.id, "quantity": 1, "override_quantity": True},
+            {"action": "add", "product_id": third.id},
+            {"action": "remove", "product_id": fourth.id},
+        )
+
+    def _quantities(self, response):
+        return {item["product"]["id"]: item["quantity"] for item in response.data["data"]}
+
+    def test_batch_for_signed_in_user(self):
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[3], vendor_id=1, quantity=1, price=Decimal("3.00"))
+
+        # products, cart, current lines, live products, savepoint, rows,
+        # delete, insert, touch the cart, release, then the snapshot:
+        # items + attribute values + images
+        with self.assertNumQueries(13):
+            response = self._apply_batch()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second, third, _ = self.products
+        expected = {first.id: 3, second.id: 1, third.id: 1}
+        self.assertEqual(self._quantities(response), expected)
+        self.assertEqual(dict(CartItem.objects.values_list("product_id", "quantity")), expected)
+        self.assertEqual(response.data["cart_total_price"], Decimal("15.00"))
+
+    def test_batch_for_guest(self):
+        response = self._apply_batch()
+        first, second, third, _ = self.products
+        self.assertEqual(self._quantities(response), {first.id: 3, second.id: 1, third.id: 1})
+
+    @override_settings(CART_STORAGE_BACKEND="cart.storage.CacheCartStorage")
+    def test_batch_with_cache_storage(self):
+        self.client.force_authenticate(self.user)
+        response = self._apply_batch()
+        self.assertEqual(len(response.data["data"]), 3)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_unknown_product_rejects_the_whole_batch(self):
+        response = self._batch(
+            {"action": "add", "product_id": self.products[0].id},
+            {"action": "add", "product_id": 999999},
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.url).data["data"], [])
+
+    def test_product_id_is_required(self):
+        response = self._batch({"action": "clear"}, {"action": "add"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from cart.cleanup import delete_abandoned_carts
+from cart.models import Cart, CartItem
+from cart.service import cart_generation_key
+from cart.storage import DatabaseCartStorage
+from product.cache import get_generations
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+class CartCleanupTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        product = Product.objects.create(
+            name="Mug", price=Decimal("6.00"), qty=5, seller=seller, category=Category.objects.create(name="Home")
+        )
+        long_ago = timezone.now() - timedelta(days=90)
+        self.carts = []
+        for i in range(5):
+            user = User.objects.create_user(email=f"buyer{i}@example.com", full_name="Buyer", password="testpass")
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, vendor_id=seller.id, quantity=1, price=product.price)
+            self.carts.append(cart)
+        Cart.objects.filter(pk__in=[c.pk for c in self.carts[:3]]).update(last_modified=long_ago)
+
+    def test_abandoned_carts_are_deleted_in_batches(self):
+        before = timezone.now() - timedelta(days=60)
+        deleted = delete_abandoned_carts(before, batch_size=2)
+        self.assertEqual(deleted, {"carts": 3, "items": 3})
+        self.assertEqual(set(Cart.objects.values_list("pk", flat=True)), {c.pk for c in self.carts[3:]})
+
+    def test_deleted_carts_drop_their_cached_summary(self):
+        keys = [cart_generation_key(cart.user_id) for cart in self.carts]
+        before = get_generations(keys)
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_abandoned_carts(timezone.now() - timedelta(days=60))
+        after = get_generations(keys)
+        self.assertEqual([b != a for b, a in zip(before, after)], [True, True, True, False, False])
+
+    def test_command_purges_expired_sessions(self):
+        for i in range(3):
+            session = SessionStore()
+            session["cart"] = {"1": {"quantity": i, "price": "6.00", "vendor_id": "1"}}
+            session.create()
+        Session.objects.filter(pk__in=Session.objects.values("pk")[:2]).update(
+            expire_date=timezone.now() - timedelta(days=1)
+        )
+        expired_bytes = sum(
+            len(data) for data in Session.objects.filter(expire_date__lt=timezone.now()).values_list("session_data", flat=True)
+        )
+
+        out = StringIO()
+        call_command("cleanup_carts", "--batch-size", "1", stdout=out)
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(Cart.objects.count(), 2)
+        self.assertIn("Deleted 3 carts with 3 items and 2 expired sessions.", out.getvalue())
+        self.assertIn(f"Freed {expired_bytes} bytes of session data (deleted cart rows are not included", out.getvalue())
+
+    def test_changing_items_keeps_a_cart(self):
+        DatabaseCartStorage(self.carts[0].user).remove(0)
+        delete_abandoned_carts(timezone.now() - timedelta(days=60))
+        self.assertTrue(Cart.objects.filter(pk=self.carts[0].pk).exists())
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+class GuestCartMergeTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Music")
+        self.products = [
+            Product.objects.create(name=f"Record {i}", price=Decimal("9.00"), qty=50, seller=seller, category=category)
+            for i in range(25)
+        ]
+        self.cart_url = reverse("cart")
+        self.login_url = reverse("login-user")
+
+    def _fill_guest_cart(self, products, quantity=2):
+        self.client.post(
+            self.cart_url,
+            {"actions": [{"action": "add", "product_id": p.id, "quantity": quantity} for p in products]},
+            format="json",
+        )
+
+    def _login(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.login_url, {"email": "buyer@example.com", "password": "testpass"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_login_merges_the_guest_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], vendor_id=1, quantity=3, price=Decimal("9.00"))
+        self._fill_guest_cart(self.products[:3])
+        self.products[2].delete()
+
+        self._login()
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart=cart).values_list("product_id", "quantity")),
+            {self.products[0].id: 5, self.products[1].id: 2},
+        )
+        self.assertEqual(self.client.session["cart"], {})
+
+    def test_merge_cost_does_not_grow_with_the_cart(self):
+        Cart.objects.create(user=self.user)
+        self._fill_guest_cart(self.products[:2])
+        small = self._login()
+
+        self.client.logout()
+        CartItem.objects.all().delete()
+        self._fill_guest_cart(self.products)
+        self.assertEqual(self._login(), small)
+        self.assertEqual(CartItem.objects.count(), 25)
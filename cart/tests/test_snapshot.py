@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from product.models import Attribute, AttributeValue, Brand, Category, Product
+
+User = get_user_model()
+
+
+class CartSnapshotTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        self.sellers = [
+            User.objects.create_user(email=f"seller{i}@example.com", full_name=f"Seller {i}", password="testpass")
+            for i in range(2)
+        ]
+        self.category = Category.objects.create(name="Garden")
+        self.brand = Brand.objects.create(name="Green")
+        self.value = AttributeValue.objects.create(attribute=Attribute.objects.create(name="Color"), value="Green")
+        self.cart = Cart.objects.create(user=self.user)
+        self.url = reverse("cart")
+
+    def _add_items(self, count):
+        for i in range(count):
+            seller = self.sellers[i % 2]
+            product = Product.objects.create(
+                name=f"Tool {i}", price=Decimal("4.00"), qty=10,
+                seller=seller, category=self.category, brand=self.brand,
+            )
+            product.attributes.add(self.value)
+            CartItem.objects.create(cart=self.cart, product=product, vendor_id=seller.id, quantity=2, price=product.price)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        self.client.force_authenticate(self.user)
+        # cart get_or_create + items joined to product/category/brand/seller
+        # + attribute values + images
+        self._add_items(2)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        self._add_items(28)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]), 30)
+        self.assertEqual(response.data["cart_total_price"], Decimal("240.00"))
+        self.assertEqual(
+            {vendor: len(items) for vendor, items in response.data["cart_grouped_by_vendor"].items()},
+            {self.sellers[0].id: 15, self.sellers[1].id: 15},
+        )
+        self.assertEqual(response.data["data"][0]["product"]["attributes"][0]["value"], "Green")
+
+    def test_guest_cart_snapshot(self):
+        self._add_items(3)
+        products = list(Product.objects.order_by("id"))
+        for product in products:
+            self.client.post(self.url, {"action": "add", "product_id": product.id, "quantity": 3}, format="json")
+        products[0].delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.data["data"]), 2)
+        self.assertEqual(response.data["cart_total_price"], Decimal("24.00"))
+        self.assertEqual(set(response.data["cart_grouped_by_vendor"]), {self.sellers[0].id, self.sellers[1].id})
+        # Rendering the cart doesn't write serialized products into the session.
+        stored = self.client.session["cart"][str(products[1].id)]
+        self.assertEqual(set(stored), {"quantity", "price", "vendor_id"})
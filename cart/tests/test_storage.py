@@ -0,0 +1,129 @@
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from cart.storage import CacheCartStorage, flush_pending_writes, get_store
+from product.models import Category, Product
+
+User = get_user_model()
+
+CACHE_STORAGE = "cart.storage.CacheCartStorage"
+
+
+@override_settings(CART_STORAGE_BACKEND=CACHE_STORAGE)
+class CacheCartStorageTestCase(APITestCase):
+    def setUp(self):
+        caches["carts"].clear()
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Kitchen")
+        self.products = [
+            Product.objects.create(
+                name=f"Pan {i}", price=Decimal("12.50"), qty=10, seller=self.seller, category=category
+            )
+            for i in range(3)
+        ]
+        self.url = reverse("cart")
+        self.client.force_authenticate(self.user)
+
+    def _add(self, product, quantity=1, **extra):
+        return self.client.post(
+            self.url, {"action": "add", "product_id": product.id, "quantity": quantity, **extra}, format="json"
+        )
+
+    def test_changes_are_written_back_in_batches(self):
+        self._add(self.products[0], 2)
+        with self.assertNumQueries(1):  # the product lookup; nothing is written
+            self._add(self.products[1])
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["cart_total_price"], Decimal("37.50"))
+
+        self.assertEqual(flush_pending_writes(), 1)
+        self.assertEqual(
+            dict(CartItem.objects.values_list("product_id", "quantity")),
+            {self.products[0].id: 2, self.products[1].id: 1},
+        )
+
+        self._add(self.products[0], 5, override_quantity=True)
+        self.client.post(self.url, {"action": "remove", "product_id": self.products[1].id}, format="json")
+        self._add(self.products[2])
+        self.assertEqual(flush_pending_writes(), 1)
+        self.assertEqual(
+            dict(CartItem.objects.values_list("product_id", "quantity")),
+            {self.products[0].id: 5, self.products[2].id: 1},
+        )
+        self.assertEqual(flush_pending_writes(), 0)
+
+    def test_cold_cache_reads_the_rows(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], vendor_id=self.seller.id, quantity=3, price=Decimal("12.50"))
+
+        self._add(self.products[0])
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["data"][0]["quantity"], 4)
+
+    def test_deleted_products_are_not_written_back(self):
+        self._add(self.products[0])
+        self._add(self.products[1])
+        self.products[1].delete()
+        flush_pending_writes()
+        self.assertEqual(list(CartItem.objects.values_list("product_id", flat=True)), [self.products[0].id])
+
+    def test_missing_log_entry_is_skipped_on_the_next_run(self):
+        self._add(self.products[0])
+        store = get_store()
+        store.incr("cart-writes:seq")  # a writer that never stored its entry
+        self._add(self.products[1])
+
+        flush_pending_writes()
+        self.assertEqual(store.get("cart-writes:flushed"), 1)
+        call_command("flush_cart_writes", stdout=StringIO())
+        self.assertEqual(store.get("cart-writes:flushed"), 3)
+        self.assertEqual(CartItem.objects.count(), 2)
+
+
+    def test_concurrent_changes_are_not_lost(self):
+        first, second = CacheCartStorage(self.user), CacheCartStorage(self.user)
+        first.add(self.products[0])
+        second.lines()  # read before the other request's change
+        first.add(self.products[1])
+        second.add(self.products[0])
+        self.assertEqual(
+            {pk: line["quantity"] for pk, line in CacheCartStorage(self.user).lines().items()},
+            {self.products[0].id: 2, self.products[1].id: 1},
+        )
+
+        CacheCartStorage(self.user).clear()
+        product = self.products[2]
+
+        def buyer():
+            storage = CacheCartStorage(self.user)
+            for _ in range(20):
+                storage.add(product)
+
+        threads = [threading.Thread(target=buyer) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(CacheCartStorage(self.user).lines()[product.id]["quantity"], 120)
+
+
+class DatabaseCartStorageTestCase(APITestCase):
+    def test_default_backend_writes_rows(self):
+        user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        category = Category.objects.create(name="Kitchen")
+        product = Product.objects.create(name="Pot", price=Decimal("8.00"), qty=4, seller=user, category=category)
+        self.client.force_authenticate(user)
+        self.client.post(reverse("cart"), {"action": "add", "product_id": product.id, "quantity": 2}, format="json")
+        self.assertEqual(CartItem.objects.get().quantity, 2)
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+class CartSummaryTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Tea")
+        self.products = [
+            Product.objects.create(name=f"Tea {i}", price=Decimal("2.50"), qty=20, seller=seller, category=category)
+            for i in range(2)
+        ]
+        self.url = reverse("cart-summary")
+        self.cart_url = reverse("cart")
+
+    def _add(self, product, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.cart_url, {"action": "add", "product_id": product.id, "quantity": quantity}, format="json")
+
+    def test_signed_in_summary_is_cached_until_the_cart_changes(self):
+        self.client.force_authenticate(self.user)
+        self._add(self.products[0], 2)
+        self._add(self.products[1], 1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, {"count": 3, "total": "7.50"})
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data["count"], 3)
+            unchanged = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self._add(self.products[1], 1)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"count": 4, "total": "10.00"})
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_deleting_a_product_invalidates_the_summary(self):
+        self.client.force_authenticate(self.user)
+        self._add(self.products[0], 2)
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].delete()
+        self.assertEqual(self.client.get(self.url).data, {"count": 0, "total": "0.00"})
+
+    def test_guest_summary_comes_from_the_session(self):
+        self.assertEqual(self.client.get(self.url).data, {"count": 0, "total": "0.00"})
+        self._add(self.products[0], 3)
+        with self.assertNumQueries(1):  # loading the session; no cart or product queries
+            response = self.client.get(self.url)
+        self.assertEqual(response.data, {"count": 3, "total": "7.50"})
+        unchanged = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
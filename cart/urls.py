@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import CartAPI
+from .views import CartAPI, CartSummaryAPI
 
 urlpatterns = [
     
     
     path('cart', CartAPI.as_view(), name='cart'),
+    path('cart/summary', CartSummaryAPI.as_view(), name='cart-summary'),
 
 ]
\ No newline at end of file
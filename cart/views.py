@@ -1,11 +1,12 @@
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse, PolymorphicProxySerializer
 
-from .serializers import ProductSerializer, CartActionSerializer
+from .serializers import ProductSerializer, CartActionSerializer, CartBatchSerializer, CartSummarySerializer
 from .models import Product
 from .service import CartService
 
@@ -49,21 +50,34 @@ class CartAPI(APIView):
        
     )
     def get(self, request, format=None):
-        cart = CartService(request)
+        return self._cart_response(CartService(request))
+
+    def _cart_response(self, cart):
+        snapshot = cart.snapshot()
         return Response(
             {
-                "data": list(cart),
-                "cart_total_price": cart.get_total_price(),
-                "cart_grouped_by_vendor": cart.group_by_vendor()
+                "data": snapshot.items,
+                "cart_total_price": snapshot.total_price,
+                "cart_grouped_by_vendor": snapshot.by_vendor
             },
             status=status.HTTP_200_OK
         )
 
     @extend_schema(
         summary="Modify cart items",
-        description="Add, remove, or clear items in the cart.",
-        request=CartActionSerializer,
-        responses={202: OpenApiResponse(description="Cart updated successfully")},
+        description=(
+            "Add, remove, or clear items in the cart. Send a list under `actions` to apply "
+            "several in order at once; the batch form returns the resulting cart."
+        ),
+        request=PolymorphicProxySerializer(
+            component_name="CartUpdate",
+            serializers=[CartActionSerializer, CartBatchSerializer],
+            resource_type_field_name=None,
+        ),
+        responses={
+            200: OpenApiResponse(description="Batch applied; the updated cart is returned"),
+            202: OpenApiResponse(description="Cart updated successfully"),
+        },
         examples=[
             OpenApiExample(
                 name="Add Item (Guest or Logged in)",
@@ -77,9 +91,20 @@ class CartAPI(APIView):
                 name="Clear Cart",
                 value={"action": "clear"}
             ),
+            OpenApiExample(
+                name="Batch",
+                value={"actions": [
+                    {"action": "add", "product_id": 1, "quantity": 2},
+                    {"action": "add", "product_id": 3, "quantity": 1, "override_quantity": True},
+                    {"action": "remove", "product_id": 2},
+                ]}
+            ),
         ]
     )
     def post(self, request, **kwargs):
+        if "actions" in request.data:
+            return self._post_batch(request)
+
         serializer = CartActionSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
@@ -102,4 +127,43 @@ class CartAPI(APIView):
                 override_quantity=data.get("override_quantity", False)
             )
 
-        return Response({"message": "Cart updated successfully"}, status=status.HTTP_202_ACCEPTED)
\ No newline at end of file
+        return Response({"message": "Cart updated successfully"}, status=status.HTTP_202_ACCEPTED)
+
+    def _post_batch(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        actions = serializer.validated_data["actions"]
+
+        ids = {action["product_id"] for action in actions if action["action"] != "clear"}
+        products = Product.objects.only("id", "price", "seller").in_bulk(ids)
+        missing = sorted(ids - products.keys())
+        if missing:
+            raise NotFound(f"No product with id {', '.join(map(str, missing))}.")
+
+        cart = CartService(request)
+        cart.apply(actions, products)
+        return self._cart_response(cart)
+
+
+@extend_schema(tags=["Cart"])
+class CartSummaryAPI(APIView):
+    """
+    Item count and total of the current cart, for header badges. Send the
+    returned ETag back in If-None-Match to get 304 while the cart is unchanged.
+    """
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        summary="Cart item count and total",
+        responses={
+            200: CartSummarySerializer,
+            304: OpenApiResponse(description="Cart unchanged since the ETag sent in If-None-Match"),
+        },
+    )
+    def get(self, request, format=None):
+        summary, version = CartService(request).summary()
+        etag = f'W/"{version}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(CartSummarySerializer(summary).data, headers=headers)
@@ -155,11 +155,100 @@ SPECTACULAR_SETTINGS = {
 
 CART_SESSION_ID = 'cart'
 
+# The default cache holds the catalog generation counters, the response recompute
+# lock and the counters that tell workers to reload their attribute bitmap and
+# autocomplete indexes. All worker processes must share it, or a write invalidates
+# only the worker that made it: set REDIS_URL in production. Without it each process
+# gets its own LocMemCache, which is only right for a single worker and for tests.
+REDIS_URL = os.getenv('REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Holds signed-in carts when CART_STORAGE_BACKEND is CacheCartStorage. Point it at
+    # Redis (django.core.cache.backends.redis.RedisCache) in production; entries must
+    # not be evicted before flush_cart_writes has written them back.
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'carts',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Storage for signed-in carts: cart.storage.DatabaseCartStorage writes CartItem rows on
+# every change; cart.storage.CacheCartStorage keeps carts in CART_STORAGE_CACHE and
+# writes them back in batches (run `manage.py flush_cart_writes --interval 5`)
+CART_STORAGE_BACKEND = os.getenv('CART_STORAGE_BACKEND', 'cart.storage.DatabaseCartStorage')
+CART_STORAGE_CACHE = 'carts'
+
+# Carts read per pass by flush_cart_writes
+CART_WRITE_BEHIND_BATCH_SIZE = 500
+
+# Seconds a signed-in user's cart summary is cached; cart changes invalidate it earlier
+CART_SUMMARY_CACHE_TIMEOUT = 60 * 60
+
+# Most actions accepted by one batch POST /api/cart
+CART_BATCH_MAX_ACTIONS = 100
+
+# Days after its last change a signed-in cart counts as abandoned and cleanup_carts deletes it
+CART_ABANDONED_AFTER_DAYS = 60
+
+# Seconds checkout holds stock before release_expired_holds returns it. The Stripe
+# Checkout Session expires a minute earlier and Stripe requires 30 minutes to 24
+# hours, so keep this between 32 minutes and 24 hours (checked at startup)
+STOCK_RESERVATION_TTL = 60 * 35
+# Seconds the holds of an authorized (not yet captured) payment are kept: Stripe's
+# card authorizations stay capturable for 7 days
+STOCK_RESERVATION_AUTHORIZED_TTL = 60 * 60 * 24 * 7
+
+# Seconds a facet-count result is cached per filter selection
+PRODUCT_FACETS_CACHE_TIMEOUT = 60 * 5
+
+# Seconds the category navigation tree is cached; category changes invalidate it earlier
+PRODUCT_CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a cached product list/detail response is kept; signals invalidate it earlier
+PRODUCT_RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+# Worker processes that resize product image uploads; 0 resizes inline (tests/dev)
+PRODUCT_IMAGE_PROCESS_WORKERS = int(os.getenv('PRODUCT_IMAGE_PROCESS_WORKERS', 2))
+
+# Rows written per bulk_create batch by product imports
+PRODUCT_IMPORT_BATCH_SIZE = 500
+
+# Products updated per UPDATE statement/transaction by PATCH /api/products/bulk/
+PRODUCT_BULK_UPDATE_BATCH_SIZE = 500
+
+# Answer attribute filters and facet counts from an in-process bitmap index
+PRODUCT_ATTRIBUTE_BITMAP_INDEX = os.getenv('PRODUCT_ATTRIBUTE_BITMAP_INDEX', 'false').lower() == 'true'
+# Most product ids the index passes to the database as id IN (...); broader selections use subqueries
+PRODUCT_ATTRIBUTE_BITMAP_MAX_IDS = 500
+
+# Most suggestions returned by GET /api/products/autocomplete/
+PRODUCT_AUTOCOMPLETE_MAX_RESULTS = 10
+
+# Products kept per product by the build_recommendations job
+PRODUCT_RECOMMENDATIONS_TOP_K = 10
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY')
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+
+# Threads process_webhook_events uses for stored Stripe events; 0 processes them inline.
+# SQLite allows one writer at a time, so it defaults to inline there.
+STRIPE_WEBHOOK_WORKERS = int(os.getenv(
+    'STRIPE_WEBHOOK_WORKERS', 0 if DATABASES['default']['ENGINE'].endswith('sqlite3') else 4
+))
+# Attempts before a failing event is marked failed; the wait doubles from the backoff (seconds)
+STRIPE_WEBHOOK_MAX_ATTEMPTS = 8
+STRIPE_WEBHOOK_RETRY_BACKOFF = 30
 
 SITE_URL = os.getenv('SITE_URL')
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'e_commerce.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory autocomplete index while the worker starts.
+from product.autocomplete import warm_up  # noqa: E402
+
+warm_up()
@@ -0,0 +1,18 @@
+# payments/checks.py
+from django.core.checks import Error, register
+
+from .reservations import SESSION_EXPIRY_MARGIN, STRIPE_SESSION_MAX_TTL, STRIPE_SESSION_MIN_TTL, checkout_session_ttl
+
+
+@register()
+def check_reservation_ttl(app_configs, **kwargs):
+    """Checkout sessions live a margin less than STOCK_RESERVATION_TTL and must fit Stripe's range."""
+    if STRIPE_SESSION_MIN_TTL + SESSION_EXPIRY_MARGIN <= checkout_session_ttl() <= STRIPE_SESSION_MAX_TTL:
+        return []
+    low = STRIPE_SESSION_MIN_TTL + 2 * SESSION_EXPIRY_MARGIN
+    high = STRIPE_SESSION_MAX_TTL + SESSION_EXPIRY_MARGIN
+    return [Error(
+        "STOCK_RESERVATION_TTL is out of range for Stripe Checkout Sessions.",
+        hint=f"Set it between {low} and {high} seconds.",
+        id="payments.E001",
+    )]
@@ -0,0 +1,142 @@
+# payments/inbox.py
+"""
+Inbox for Stripe webhook events.
+
+The webhook view only verifies the signature and stores the event, keyed
+by Stripe's event id so retried deliveries are stored once, then answers
+200. `process_due_events` (the `process_webhook_events` command) hands
+the stored events to `webhooks.handle_event` later:
+
+* Events about the same Stripe object (the `data.object.id`) run one at
+  a time, oldest first. Different objects run in parallel on a thread
+  pool.
+* A claimed event gets a lease in `next_attempt_at`. If its worker dies,
+  the lease runs out and the event is picked up again.
+* A failing event is retried with exponential backoff. Later events for
+  its object wait behind it. After STRIPE_WEBHOOK_MAX_ATTEMPTS it is
+  marked failed and its object's queue moves on. Failed events can be
+  replayed with `replay_webhook_events`.
+
+The handlers are idempotent, so running an event twice is harmless. The
+work that follows a payment (sales rollup, confirming stock holds) runs
+in the handler's transaction, not after its commit, so a failure there
+fails the event and its retry redoes that work.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=6)
+
+
+def record_event(event):
+    """Store a verified event unless it was received before. One INSERT."""
+    obj = event.get("data", {}).get("object", {})
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(
+            event_id=event["id"],
+            type=event.get("type", ""),
+            object_id=obj.get("id") or "",
+            payload=event,
+            next_attempt_at=timezone.now(),
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def process_due_events(batch_size=100, workers=None):
+    """Process the events that are due, per object in order. Returns the number processed successfully."""
+    workers = settings.STRIPE_WEBHOOK_WORKERS if workers is None else workers
+    now = timezone.now()
+    open_events = WebhookEvent.objects.filter(status__in=[WebhookEvent.PENDING, WebhookEvent.PROCESSING])
+    # An object whose oldest open event is waiting (backoff or lease) waits as a whole.
+    waiting = open_events.filter(next_attempt_at__gt=now).values("object_id")
+    due = list(
+        open_events.filter(next_attempt_at__lte=now)
+        .exclude(object_id__in=waiting)
+        .order_by("pk")
+        .values_list("pk", "object_id")[:batch_size]
+    )
+    queues = {}
+    for pk, object_id in due:
+        queues.setdefault(object_id, []).append(pk)
+
+    if not workers:
+        return sum(_run_queue(ids) for ids in queues.values())
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook-events") as pool:
+        return sum(pool.map(_run_queue_in_thread, queues.values()))
+
+
+def _run_queue_in_thread(ids):
+    try:
+        return _run_queue(ids)
+    finally:
+        connection.close()
+
+
+def _run_queue(ids):
+    """
+    Process one object's events in order; stop at the first one that fails.
+    A database error in the bookkeeping is logged and ends only this queue:
+    its events are picked up again by a later pass (once the lease runs out
+    for one that was claimed).
+    """
+    done = 0
+    try:
+        for pk in ids:
+            if not _process(pk):
+                break
+            done += 1
+    except Exception:
+        logger.exception("Processing Stripe events %s stopped; they are left for a later pass.", ids[done:])
+    return done
+
+
+def _process(pk):
+    from .webhooks import handle_event
+
+    if not _claim(pk):
+        return False
+    event = WebhookEvent.objects.get(pk=pk)
+    try:
+        # handle_event opens its own transactions, around database work only.
+        handle_event(event.payload)
+    except Exception as exc:
+        logger.exception("Processing Stripe event %s failed.", event.event_id)
+        _failed(event, exc)
+        return False
+    WebhookEvent.objects.filter(pk=pk).update(status=WebhookEvent.DONE, processed_at=timezone.now(), last_error="")
+    return True
+
+
+def _claim(pk):
+    now = timezone.now()
+    return WebhookEvent.objects.filter(
+        pk=pk, status__in=[WebhookEvent.PENDING, WebhookEvent.PROCESSING], next_attempt_at__lte=now,
+    ).update(status=WebhookEvent.PROCESSING, next_attempt_at=now + LEASE)
+
+
+def _failed(event, exc):
+    attempts = event.attempts + 1
+    if attempts >= settings.STRIPE_WEBHOOK_MAX_ATTEMPTS:
+        status, retry_at = WebhookEvent.FAILED, timezone.now()
+    else:
+        delay = timedelta(seconds=settings.STRIPE_WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1))
+        status, retry_at = WebhookEvent.PENDING, timezone.now() + min(delay, MAX_BACKOFF)
+    WebhookEvent.objects.filter(pk=event.pk).update(
+        status=status, attempts=attempts, next_attempt_at=retry_at, last_error=repr(exc)[:2000],
+    )
+
+
+def replay(events):
+    """Queue the given events to run again now, from their stored payload. Returns how many."""
+    return events.update(status=WebhookEvent.PENDING, attempts=0, next_attempt_at=timezone.now(), last_error="")
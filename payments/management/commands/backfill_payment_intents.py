@@ -0,0 +1,37 @@
+import stripe
+from django.core.management.base import BaseCommand
+
+from payments.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the PaymentIntent id of pending orders created before Order.payment_intent_id "
+        "existed, so their capture webhooks find them. Calls Stripe once per order; run it once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many orders.")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(status="Pending", payment_intent_id="").order_by("pk")
+        if options["limit"]:
+            orders = orders[:options["limit"]]
+
+        stored = unpaid = failed = 0
+        for order in orders.iterator(chunk_size=500):
+            try:
+                session = stripe.checkout.Session.retrieve(order.stripe_checkout_id)
+            except stripe.error.StripeError as exc:
+                failed += 1
+                self.stderr.write(f"Order {order.pk}: {exc}")
+                continue
+            if not session.payment_intent:
+                unpaid += 1  # the customer never completed the checkout
+                continue
+            Order.objects.filter(pk=order.pk).update(payment_intent_id=session.payment_intent)
+            stored += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {stored} PaymentIntent ids; {unpaid} orders have none yet, {failed} lookups failed."
+        ))
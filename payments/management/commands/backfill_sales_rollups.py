@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from payments.sales import backfill
+
+
+class Command(BaseCommand):
+    help = "Add every Paid order not counted yet to the seller sales rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Orders per transaction.")
+        parser.add_argument("--rebuild", action="store_true", help="Empty the rollups and recount every Paid order.")
+
+    def handle(self, *args, **options):
+        total = backfill(batch_size=options["batch_size"], rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} orders."))
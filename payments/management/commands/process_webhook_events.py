@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.inbox import process_due_events
+
+
+class Command(BaseCommand):
+    help = "Process stored Stripe webhook events that are due, in order per Stripe object."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Events read per pass.")
+        parser.add_argument("--workers", type=int, default=settings.STRIPE_WEBHOOK_WORKERS)
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep running, polling every N seconds when idle. By default process once and exit.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_due_events(batch_size=options["batch_size"], workers=options["workers"])
+            if options["verbosity"] > 1 or not options["interval"]:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} events."))
+            if not options["interval"]:
+                return
+            if not processed:
+                close_old_connections()
+                time.sleep(options["interval"])
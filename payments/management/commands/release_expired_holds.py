@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from payments.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Return the stock of checkout holds past their expiry. Run it every minute or so."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Holds per transaction.")
+
+    def handle(self, *args, **options):
+        total = release_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {total} expired holds."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from payments.inbox import replay
+from payments.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = "Queue stored Stripe events to be processed again by process_webhook_events."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_ids", nargs="*", help="Stripe event ids (evt_...).")
+        parser.add_argument("--failed", action="store_true", help="Every event marked failed.")
+        parser.add_argument("--since", help="Every event received at or after this ISO datetime.")
+
+    def handle(self, *args, **options):
+        if not (options["event_ids"] or options["failed"] or options["since"]):
+            raise CommandError("Pass event ids, --failed or --since.")
+        events = WebhookEvent.objects.all()
+        if options["event_ids"]:
+            events = events.filter(event_id__in=options["event_ids"])
+        if options["failed"]:
+            events = events.filter(status=WebhookEvent.FAILED)
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError(f"Not an ISO datetime: {options['since']}")
+            events = events.filter(received_at__gte=since)
+        self.stdout.write(self.style.SUCCESS(f"Queued {replay(events)} events."))
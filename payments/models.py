@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 from product.models import Product
@@ -5,11 +6,17 @@ from product.models import Product
 # Create your models here.
 class Order(models.Model):
     stripe_checkout_id = models.CharField(max_length=255, unique=True)
+    # Stored from checkout.session.completed so capture events find the order by index.
+    payment_intent_id = models.CharField(max_length=255, blank=True, default="", db_index=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10)
     customer_email = models.EmailField()
     status = models.CharField(max_length=20, choices=[("Pending", "Pending"), ("Paid", "Paid")])
     created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the order's items are counted in the seller sales rollups.
+    sales_rolled_up = models.BooleanField(default=False, editable=False)
+    # Set once the order's items are counted in the product recommendations.
+    recommendations_counted = models.BooleanField(default=False, editable=False, db_index=True)
 
     def __str__(self):
         return f"Order {self.stripe_checkout_id} - {self.status}"
@@ -19,7 +26,99 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    # Price per unit when the order was placed; older rows fall back to Product.price.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def __str__(self):
         return f"Order {self.product.name} - {self.order.stripe_checkout_id}"
-    
\ No newline at end of file
+    
+
+
+class StockReservation(models.Model):
+    """Units of a product held for a checkout; see `reservations.py`."""
+    HELD, CONFIRMED, RELEASED = "held", "confirmed", "released"
+    STATUS_CHOICES = [(HELD, "Held"), (CONFIRMED, "Confirmed"), (RELEASED, "Released")]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.status})"
+
+
+class WebhookEvent(models.Model):
+    """A Stripe webhook event as received, processed later by `inbox.py`."""
+    PENDING, PROCESSING, DONE, FAILED = "pending", "processing", "done", "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (PROCESSING, "Processing"), (DONE, "Done"), (FAILED, "Failed")]
+
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    # The Stripe object the event is about; its events are processed in order.
+    object_id = models.CharField(max_length=255, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # When a pending event is retried, or a processing event's lease runs out.
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["object_id", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} {self.type} ({self.status})"
+
+
+class SellerDailyProductSales(models.Model):
+    """Paid sales of one product on one day (by order date), maintained by `sales.py`."""
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="uniq_product_sales_day"),
+        ]
+        indexes = [
+            models.Index(fields=["seller", "day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.revenue}"
+
+
+class SellerDailySales(models.Model):
+    """
+    Paid sales of one seller on one day. Kept apart from the per-product
+    rows because an order with several of the seller's products counts once.
+    """
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["seller", "day"], name="uniq_seller_sales_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.seller_id} on {self.day}: {self.revenue}"
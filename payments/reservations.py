@@ -0,0 +1,140 @@
+# payments/reservations.py
+"""
+Stock holds for checkouts.
+
+`reserve` takes stock off `Product.qty` with a conditional
+`UPDATE ... SET qty = qty - n WHERE qty >= n` and records a
+StockReservation for it. The update either succeeds or matches no row, so
+concurrent checkouts can't oversell and never wait on a `SELECT ... FOR
+UPDATE` of a hot product: each product row is locked only for the one
+statement.
+
+Product cards are refreshed inside the same transaction, and the cache is
+invalidated by a robust on_commit hook, so nothing can fail after a hold
+has committed and leave it unreported.
+
+A hold lives until one of:
+
+* the payment is authorized (checkout.session.completed): `extend_order`
+  keeps it for STOCK_RESERVATION_AUTHORIZED_TTL, the time a card
+  authorization stays capturable, so the stock isn't resold while the
+  capture is pending;
+* the order is paid: `confirm_order` marks it confirmed, the stock stays sold;
+* the Stripe session expires, the authorization is canceled or the
+  checkout fails: `release_order` / `release` put the stock back;
+* its TTL passes: `release_expired` (the `release_expired_holds` command)
+  puts the stock back in bulk.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from product.cache import invalidate_products
+from product.cards import refresh_cards
+from product.models import Product
+from .models import StockReservation
+
+logger = logging.getLogger(__name__)
+
+# Stripe accepts a Checkout Session expiry 30 minutes to 24 hours ahead.
+STRIPE_SESSION_MIN_TTL = 30 * 60
+STRIPE_SESSION_MAX_TTL = 24 * 60 * 60
+# The session expires this long before its holds, and at least this long
+# after Stripe's minimum, so latency or clock skew can't push it out of range.
+SESSION_EXPIRY_MARGIN = 60
+
+
+def checkout_session_ttl():
+    """Seconds a Checkout Session may stay open: a margin short of the hold TTL."""
+    return settings.STOCK_RESERVATION_TTL - SESSION_EXPIRY_MARGIN
+
+
+def reserve(product_id, quantity, ttl=None):
+    """Hold `quantity` units of the product. Returns the StockReservation, or None when there isn't enough stock."""
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+    with transaction.atomic():
+        if not _take(product_id, quantity):
+            return None
+        return StockReservation.objects.create(
+            product_id=product_id, quantity=quantity, expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+
+
+def _take(product_id, quantity):
+    products = Product.objects.filter(pk=product_id)
+    if products.filter(qty__gt=quantity).update(qty=F("qty") - quantity):
+        invalidate_products([product_id])
+        return True
+    # Taking the last units: the product goes out of stock, so its card changes too.
+    if products.filter(qty=quantity).update(qty=0):
+        invalidate_products([product_id])
+        refresh_cards([product_id])
+        return True
+    return False
+
+
+def release(reservations):
+    """Put the stock of the still-held reservations in the queryset back. Returns how many were released."""
+    with transaction.atomic():
+        held = list(
+            reservations.select_for_update()
+            .filter(status=StockReservation.HELD)
+            .values_list("pk", "product_id", "quantity")
+        )
+        if not held:
+            return 0
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in held]).update(status=StockReservation.RELEASED)
+        returned = Counter()
+        for _, product_id, quantity in held:
+            returned[product_id] += quantity
+        for product_id, quantity in returned.items():
+            Product.objects.filter(pk=product_id).update(qty=F("qty") + quantity)
+        invalidate_products(returned)
+        refresh_cards(returned)
+    return len(held)
+
+
+def release_order(order_id):
+    return release(StockReservation.objects.filter(order_id=order_id))
+
+
+def extend_order(order_id, ttl=None):
+    """Keep the order's held stock for `ttl` more seconds (default STOCK_RESERVATION_AUTHORIZED_TTL). Returns how many."""
+    ttl = settings.STOCK_RESERVATION_AUTHORIZED_TTL if ttl is None else ttl
+    return StockReservation.objects.filter(order_id=order_id, status=StockReservation.HELD).update(
+        expires_at=timezone.now() + timedelta(seconds=ttl)
+    )
+
+
+def release_expired(batch_size=1000):
+    """Release every hold past its expiry, `batch_size` at a time. Returns the number released."""
+    total = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(status=StockReservation.HELD, expires_at__lte=timezone.now())
+            .order_by("expires_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        total += release(StockReservation.objects.filter(pk__in=ids))
+
+
+def confirm_order(order_id):
+    """Turn the order's holds into sales. Holds released in the meantime are taken again if stock allows."""
+    with transaction.atomic():
+        reservations = StockReservation.objects.filter(order_id=order_id)
+        reservations.filter(status=StockReservation.HELD).update(status=StockReservation.CONFIRMED)
+        for reservation in reservations.filter(status=StockReservation.RELEASED):
+            if not _take(reservation.product_id, reservation.quantity):
+                logger.warning(
+                    "Order %s was paid after its hold on product %s expired and the stock is gone.",
+                    order_id, reservation.product_id,
+                )
+            reservation.status = StockReservation.CONFIRMED
+            reservation.save(update_fields=["status"])
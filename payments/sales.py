@@ -0,0 +1,110 @@
+# payments/sales.py
+"""
+Seller sales rollups.
+
+When an order becomes Paid, its items are added to two pre-aggregated
+tables, keyed by the day the order was placed:
+
+* SellerDailyProductSales, one row per product per day;
+* SellerDailySales, one row per seller per day.
+
+Each order is claimed once through `Order.sales_rolled_up`, so repeated
+webhook deliveries or an overlapping backfill can't count it twice.
+Counters are bumped with `F()` updates, so concurrent orders for the same
+product and day don't lose increments.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from .models import Order, OrderItem, SellerDailyProductSales, SellerDailySales
+
+
+def roll_up_orders(order_ids):
+    """Add the given Paid orders to the rollups, skipping ones already counted. Returns how many were added."""
+    with transaction.atomic():
+        claimed = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids, status="Paid", sales_rolled_up=False, items__isnull=False)
+            .distinct()
+            .values_list("pk", flat=True)
+        )
+        if not claimed:
+            return 0
+        Order.objects.filter(pk__in=claimed).update(sales_rolled_up=True)
+
+        products = defaultdict(lambda: {"revenue": Decimal("0"), "units": 0, "orders": set()})
+        sellers = defaultdict(lambda: {"revenue": Decimal("0"), "units": 0, "orders": set()})
+        for row in _item_totals(claimed):
+            keys = (
+                (products, (row["seller_id"], row["product_id"], row["day"])),
+                (sellers, (row["seller_id"], row["day"])),
+            )
+            for rollup, key in keys:
+                rollup[key]["revenue"] += row["revenue"]
+                rollup[key]["units"] += row["units"]
+                rollup[key]["orders"].add(row["order_id"])
+
+        for (seller_id, product_id, day), totals in products.items():
+            _increment(
+                SellerDailyProductSales,
+                {"product_id": product_id, "day": day},
+                {"seller_id": seller_id},
+                totals,
+            )
+        for (seller_id, day), totals in sellers.items():
+            _increment(SellerDailySales, {"seller_id": seller_id, "day": day}, {}, totals)
+    return len(claimed)
+
+
+def _item_totals(order_ids):
+    """Units and revenue per (order, product) with the order day and the product's seller."""
+    return (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values("order_id", "product_id", seller_id=F("product__seller_id"), day=TruncDate("order__created_at"))
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(
+                F("quantity") * Coalesce("unit_price", "product__price"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+        .order_by()
+    )
+
+
+def _increment(model, lookup, defaults, totals):
+    deltas = {"revenue": totals["revenue"], "units": totals["units"], "orders": len(totals["orders"])}
+    changes = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **defaults, **deltas)
+    except IntegrityError:
+        # Another transaction created the row first.
+        model.objects.filter(**lookup).update(**changes)
+
+
+def backfill(batch_size=500, rebuild=False):
+    """Roll up every Paid order not counted yet, oldest first. Returns the number of orders added."""
+    if rebuild:
+        with transaction.atomic():
+            SellerDailyProductSales.objects.all().delete()
+            SellerDailySales.objects.all().delete()
+            Order.objects.filter(sales_rolled_up=True).update(sales_rolled_up=False)
+
+    total, last_id = 0, 0
+    while True:
+        ids = list(
+            Order.objects.filter(pk__gt=last_id, status="Paid", sales_rolled_up=False)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        total += roll_up_orders(ids)
+        last_id = ids[-1]
@@ -14,3 +14,37 @@ class CreatedSessionSerializer(serializers.Serializer):
 
 class CreateCheckoutResponseSerializer(serializers.Serializer):
     sessions = CreatedSessionSerializer(many=True)
+
+
+class SellerDashboardQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    product = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get("start") and attrs.get("end") and attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class SalesTotalsSerializer(serializers.Serializer):
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    units = serializers.IntegerField()
+    orders = serializers.IntegerField()
+
+
+class SalesDaySerializer(SalesTotalsSerializer):
+    day = serializers.DateField()
+
+
+class SalesProductSerializer(SalesTotalsSerializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+
+
+class SellerDashboardSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    totals = SalesTotalsSerializer()
+    daily = SalesDaySerializer(many=True)
+    products = SalesProductSerializer(many=True)
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Order
+from .reservations import confirm_order
+from .sales import roll_up_orders
+
+
+@receiver(post_save, sender=Order)
+def order_paid(sender, instance, raw=False, **kwargs):
+    if not raw and instance.status == "Paid":
+        # After commit, so items created in the same transaction are counted too.
+        if not instance.sales_rolled_up:
+            transaction.on_commit(lambda: roll_up_orders([instance.pk]))
+        transaction.on_commit(lambda: confirm_order(instance.pk))
@@ -0,0 +1,140 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from payments import inbox
+from payments.inbox import process_due_events, record_event
+from payments.models import Order, WebhookEvent
+
+
+def _event(event_id, etype, object_id, **fields):
+    return {"id": event_id, "type": etype, "data": {"object": {"id": object_id, **fields}}}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test", STRIPE_WEBHOOK_MAX_ATTEMPTS=3)
+class WebhookInboxTestCase(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            stripe_checkout_id="cs_1", amount=Decimal("10.00"), currency="usd",
+            customer_email="buyer@example.com", status="Pending",
+        )
+
+    def _due_now(self):
+        WebhookEvent.objects.exclude(status=WebhookEvent.DONE).update(next_attempt_at=timezone.now())
+
+    def test_delivery_is_stored_once_and_processed_later(self):
+        event = _event("evt_1", "checkout.session.completed", "cs_1", payment_intent="pi_1")
+        for _ in range(2):  # Stripe retries the delivery
+            with mock.patch("payments.webhooks.stripe.Webhook.construct_event", return_value=event):
+                response = self.client.post(
+                    reverse("stripe-webhook"), data=event, content_type="application/json", HTTP_STRIPE_SIGNATURE="t=1"
+                )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.get().payload, event)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_intent_id, "")
+
+        self.assertEqual(process_due_events(workers=0), 1)
+        self.assertEqual(process_due_events(workers=0), 0)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_intent_id, "pi_1")
+
+    def test_failure_backs_off_and_holds_back_the_object(self):
+        record_event(_event("evt_1", "checkout.session.completed", "cs_1", payment_intent="pi_1"))
+        record_event(_event("evt_2", "checkout.session.expired", "cs_1"))
+        record_event(_event("evt_3", "checkout.session.expired", "cs_other"))
+
+        calls = []
+
+        def flaky(event):
+            calls.append(event["id"])
+            if event["id"] == "evt_1" and calls.count("evt_1") == 1:
+                raise RuntimeError("database hiccup")
+
+        with mock.patch("payments.webhooks.handle_event", side_effect=flaky):
+            self.assertEqual(process_due_events(workers=0), 1)
+            first = WebhookEvent.objects.get(event_id="evt_1")
+            self.assertEqual((first.status, first.attempts), (WebhookEvent.PENDING, 1))
+            self.assertGreater(first.next_attempt_at, timezone.now())
+            self.assertIn("database hiccup", first.last_error)
+            # Not due yet, and evt_2 waits behind it.
+            self.assertEqual(process_due_events(workers=0), 0)
+
+            self._due_now()
+            self.assertEqual(process_due_events(workers=0), 2)
+        self.assertEqual(calls, ["evt_1", "evt_3", "evt_1", "evt_2"])
+
+    def test_failed_events_can_be_replayed(self):
+        record_event(_event("evt_1", "payment_intent.succeeded", "pi_1"))
+        with mock.patch("payments.webhooks.handle_event", side_effect=RuntimeError("bug")):
+            for _ in range(3):
+                process_due_events(workers=0)
+                self._due_now()
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.FAILED)
+
+        out = StringIO()
+        call_command("replay_webhook_events", "--failed", stdout=out)
+        self.assertIn("Queued 1 events", out.getvalue())
+        with mock.patch("payments.webhooks.handle_event") as handle:
+            self.assertEqual(process_due_events(workers=0), 1)
+        handle.assert_called_once()
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.DONE)
+
+    def test_database_error_ends_only_its_queue(self):
+        for i in range(3):
+            record_event(_event(f"evt_{i}", "checkout.session.expired", f"cs_{i}"))
+        claim = inbox._claim
+
+        def flaky_claim(pk):
+            if WebhookEvent.objects.get(pk=pk).event_id == "evt_1":
+                raise OperationalError("database is locked")
+            return claim(pk)
+
+        with mock.patch("payments.inbox._claim", side_effect=flaky_claim):
+            self.assertEqual(process_due_events(workers=0), 2)
+        self.assertEqual(WebhookEvent.objects.get(event_id="evt_1").status, WebhookEvent.PENDING)
+        self.assertEqual(process_due_events(workers=0), 1)
+
+
+class WebhookWorkerPoolTestCase(TransactionTestCase):
+    def _record(self, count):
+        for i in range(count):
+            Order.objects.create(
+                stripe_checkout_id=f"cs_{i}", amount=Decimal("10.00"), currency="usd",
+                customer_email="buyer@example.com", status="Pending",
+            )
+            record_event(_event(f"evt_{i}", "checkout.session.completed", f"cs_{i}", payment_intent=f"pi_{i}"))
+
+    def test_one_pass_processes_every_queue(self):
+        self._record(6)
+        self.assertEqual(process_due_events(workers=0), 6)
+        self.assertFalse(Order.objects.filter(payment_intent_id="").exists())
+        self.assertFalse(WebhookEvent.objects.exclude(status=WebhookEvent.DONE).exists())
+
+    def test_failing_queue_does_not_stop_the_thread_pool(self):
+        self._record(6)
+        claim = inbox._claim
+
+        def flaky_claim(pk):
+            if WebhookEvent.objects.get(pk=pk).event_id == "evt_0":
+                raise OperationalError("database is locked")
+            return claim(pk)
+
+        # SQLite may also refuse some concurrent writes here; whatever a
+        # pass reports done must be done, and the pass itself must not raise.
+        with mock.patch("payments.inbox._claim", side_effect=flaky_claim):
+            processed = process_due_events(workers=3)
+        done = WebhookEvent.objects.filter(status=WebhookEvent.DONE)
+        self.assertEqual(processed, done.count())
+        self.assertGreater(processed, 0)
+        self.assertFalse(done.filter(event_id="evt_0").exists())
+        self.assertFalse(
+            Order.objects.filter(stripe_checkout_id__in=done.values("object_id"), payment_intent_id="").exists()
+        )
@@ -0,0 +1,232 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from cart.models import Cart, CartItem
+from payments.checks import check_reservation_ttl
+from payments.models import Order, StockReservation
+from payments.reservations import release_expired, release_order, reserve
+from payments.webhooks import handle_event
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+def _product(qty, name="Lamp"):
+    seller = User.objects.create_user(email=f"seller-{name.lower()}@example.com", full_name="Seller", password="testpass")
+    category = Category.objects.create(name=f"Lighting {name}")
+    return Product.objects.create(name=name, price=Decimal("20.00"), qty=qty, seller=seller, category=category)
+
+
+def _stripe_event(etype, **obj):
+    return {"id": f"evt_{etype}", "type": etype, "data": {"object": obj}}
+
+
+class StockReservationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = _product(qty=5)
+
+    def _qty(self):
+        self.product.refresh_from_db()
+        return self.product.qty
+
+    def test_reserve_takes_stock_or_refuses(self):
+        self.assertIsNotNone(reserve(self.product.pk, 3))
+        self.assertIsNone(reserve(self.product.pk, 3))
+        self.assertIsNotNone(reserve(self.product.pk, 2))
+        self.assertEqual(self._qty(), 0)
+        self.assertEqual(StockReservation.objects.filter(status=StockReservation.HELD).count(), 2)
+
+    def test_expired_holds_are_released_once(self):
+        expired = reserve(self.product.pk, 2, ttl=-1)
+        reserve(self.product.pk, 1)
+        self.assertEqual(release_expired(), 1)
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(self._qty(), 4)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, StockReservation.RELEASED)
+
+    def test_payment_confirms_holds(self):
+        order = Order.objects.create(
+            stripe_checkout_id="cs_1", amount=Decimal("40.00"), currency="usd",
+            customer_email="buyer@example.com", status="Pending",
+        )
+        StockReservation.objects.filter(pk=reserve(self.product.pk, 2).pk).update(order=order)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = "Paid"
+            order.save(update_fields=["status"])
+
+        self.assertEqual(release_order(order.pk), 0)
+        self.assertEqual(order.reservations.get().status, StockReservation.CONFIRMED)
+        self.assertEqual(self._qty(), 3)
+
+    def test_paid_after_expiry_takes_the_stock_again(self):
+        order = Order.objects.create(
+            stripe_checkout_id="cs_2", amount=Decimal("40.00"), currency="usd",
+            customer_email="buyer@example.com", status="Pending",
+        )
+        StockReservation.objects.filter(pk=reserve(self.product.pk, 2, ttl=-1).pk).update(order=order)
+        release_expired()
+        self.assertEqual(self._qty(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = "Paid"
+            order.save(update_fields=["status"])
+        self.assertEqual(self._qty(), 3)
+
+
+    def _authorize(self, checkout_id, quantity):
+        order = Order.objects.create(
+            stripe_checkout_id=checkout_id, amount=Decimal("40.00"), currency="usd",
+            customer_email="buyer@example.com", status="Pending",
+        )
+        StockReservation.objects.filter(pk=reserve(self.product.pk, quantity).pk).update(order=order)
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_event(_stripe_event("checkout.session.completed", id=checkout_id, payment_intent=f"pi_{checkout_id}"))
+        return order
+
+    def test_authorized_payment_keeps_its_holds_until_capture(self):
+        order = self._authorize("cs_3", 2)
+        later = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL + 60)
+        with mock.patch("payments.reservations.timezone.now", return_value=later):
+            self.assertEqual(release_expired(), 0)
+        self.assertEqual(self._qty(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_event(_stripe_event("payment_intent.succeeded", id="pi_cs_3"))
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Paid")
+        self.assertEqual(order.reservations.get().status, StockReservation.CONFIRMED)
+        self.assertEqual(self._qty(), 3)
+
+    def test_canceled_authorization_releases_holds(self):
+        self._authorize("cs_4", 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_event(_stripe_event("payment_intent.canceled", id="pi_cs_4"))
+        self.assertEqual(self._qty(), 5)
+
+
+@override_settings(SITE_URL="https://shop.example/")
+class CheckoutHoldsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        self.product = _product(qty=4)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, vendor_id=1, quantity=3, price=self.product.price)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("create-checkout-session")
+
+    @mock.patch("payments.views.stripe.checkout.Session.create")
+    def test_checkout_holds_stock_for_the_order(self, create_session):
+        create_session.return_value = mock.Mock(id="cs_test", url="https://checkout.example/cs_test")
+        response = self.client.post(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        hold = StockReservation.objects.get()
+        self.assertEqual((hold.order.stripe_checkout_id, hold.quantity), ("cs_test", 3))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.qty, 1)
+        # A second checkout of the same cart finds too little stock.
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Stripe wants the session open 30+ minutes; it closes before the hold expires.
+        expires_in = create_session.call_args.kwargs["expires_at"] - time.time()
+        self.assertGreater(expires_in, 31 * 60 - 5)
+        self.assertGreater((hold.expires_at - timezone.now()).total_seconds(), expires_in)
+
+    def test_reservation_ttl_is_checked_at_startup(self):
+        self.assertEqual(check_reservation_ttl(None), [])
+        with override_settings(STOCK_RESERVATION_TTL=30 * 60):
+            self.assertEqual([e.id for e in check_reservation_ttl(None)], ["payments.E001"])
+
+    @mock.patch("payments.views.stripe.checkout.Session.create", side_effect=RuntimeError("Stripe is down"))
+    def test_failed_checkout_releases_holds(self, create_session):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.qty, 4)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.RELEASED)
+
+
+    @mock.patch("payments.views.stripe.checkout.Session.create")
+    def test_cache_errors_after_commit_do_not_fail_checkout(self, create_session):
+        create_session.return_value = mock.Mock(id="cs_test", url="https://checkout.example/cs_test")
+        with mock.patch("product.cache.bump_generations", side_effect=ConnectionError("cache down")), \
+                self.assertLogs("django.test", "ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.HELD)
+
+    def test_error_on_a_later_item_releases_earlier_holds(self):
+        other = _product(qty=2, name="Shade")
+        CartItem.objects.create(cart=self.user.cart, product=other, vendor_id=1, quantity=1, price=other.price)
+        calls = []
+
+        def reserve_or_fail(product_id, quantity):
+            calls.append(product_id)
+            if len(calls) == 2:
+                raise OperationalError("database is locked")
+            return reserve(product_id, quantity)
+
+        with mock.patch("payments.views.reserve", side_effect=reserve_or_fail):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(Product.objects.get(pk=calls[0]).qty, {self.product.pk: 4, other.pk: 2}[calls[0]])
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.RELEASED)
+
+class ConcurrentReservationTestCase(TransactionTestCase):
+    """Many threads buying the same product at once must never sell more than its stock."""
+
+    STOCK = 40
+    THREADS = 8
+    ATTEMPTS = 15
+
+    def test_no_overselling_under_concurrent_checkouts(self):
+        product = _product(qty=self.STOCK, name="Flash")
+        start = threading.Barrier(self.THREADS)
+        results, errors = [], []
+
+        def buyer():
+            try:
+                start.wait()
+                for _ in range(self.ATTEMPTS):
+                    while True:
+                        try:
+                            results.append(reserve(product.pk, 1) is not None)
+                            break
+                        except OperationalError:
+                            # SQLite allows one writer and reports "database is
+                            # locked" instead of waiting; retry like a client would.
+                            continue
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.THREADS * self.ATTEMPTS)
+        self.assertEqual(sum(results), self.STOCK)
+        product.refresh_from_db()
+        self.assertEqual(product.qty, 0)
+        self.assertEqual(StockReservation.objects.count(), self.STOCK)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from payments.models import Order, OrderItem, SellerDailyProductSales, SellerDailySales
+from product.models import Category, Product
+
+User = get_user_model()
+
+
+class SellerSalesRollupTestCase(APITestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass", role="seller")
+        self.other_seller = User.objects.create_user(email="other@example.com", full_name="Other", password="testpass", role="seller")
+        category = Category.objects.create(name="Tools")
+        self.hammer = Product.objects.create(name="Hammer", price=Decimal("10.00"), qty=9, seller=self.seller, category=category)
+        self.nails = Product.objects.create(name="Nails", price=Decimal("5.00"), qty=9, seller=self.seller, category=category)
+        self.saw = Product.objects.create(name="Saw", price=Decimal("30.00"), qty=9, seller=self.other_seller, category=category)
+        self.url = reverse("seller-dashboard")
+
+    def _order(self, items, status="Pending"):
+        order = Order.objects.create(
+            stripe_checkout_id=f"cs_{Order.objects.count()}", amount=Decimal("1.00"),
+            currency="usd", customer_email="buyer@example.com", status=status,
+        )
+        for product, quantity, unit_price in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=unit_price)
+        return order
+
+    def _pay(self, order):
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = "Paid"
+            order.save(update_fields=["status"])
+
+    def test_paid_order_is_rolled_up_once(self):
+        order = self._order([(self.hammer, 2, Decimal("9.00")), (self.nails, 1, None), (self.saw, 1, None)])
+        self._pay(order)
+        self._pay(order)  # repeated webhook delivery
+
+        day = timezone.localdate()
+        seller_day = SellerDailySales.objects.get(seller=self.seller, day=day)
+        self.assertEqual((seller_day.revenue, seller_day.units, seller_day.orders), (Decimal("23.00"), 3, 1))
+        hammer = SellerDailyProductSales.objects.get(product=self.hammer, day=day)
+        self.assertEqual((hammer.revenue, hammer.units, hammer.orders), (Decimal("18.00"), 2, 1))
+        self.assertEqual(SellerDailySales.objects.get(seller=self.other_seller).revenue, Decimal("30.00"))
+
+    def test_pending_orders_are_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._order([(self.hammer, 1, None)])
+        self.assertFalse(SellerDailySales.objects.exists())
+
+    def test_backfill_counts_history_once(self):
+        self._order([(self.hammer, 1, None)], status="Paid")
+        self._order([(self.hammer, 3, None), (self.nails, 2, None)], status="Paid")
+        self._order([(self.nails, 1, None)])
+        out = StringIO()
+        call_command("backfill_sales_rollups", batch_size=1, stdout=out)
+        self.assertIn("Rolled up 2 orders.", out.getvalue())
+        call_command("backfill_sales_rollups", stdout=StringIO())
+        call_command("backfill_sales_rollups", rebuild=True, stdout=StringIO())
+
+        seller_day = SellerDailySales.objects.get(seller=self.seller)
+        self.assertEqual((seller_day.revenue, seller_day.units, seller_day.orders), (Decimal("50.00"), 6, 2))
+        self.assertEqual(SellerDailyProductSales.objects.get(product=self.hammer).orders, 2)
+
+    def test_dashboard_reads_rollups(self):
+        self._pay(self._order([(self.hammer, 2, None), (self.nails, 4, None)]))
+        self._pay(self._order([(self.hammer, 1, None)]))
+        self.client.force_authenticate(self.seller)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data["totals"], {"revenue": "50.00", "units": 7, "orders": 2})
+        self.assertEqual(len(data["daily"]), 1)
+        self.assertEqual(
+            [(p["name"], p["revenue"], p["orders"]) for p in data["products"]],
+            [("Hammer", "30.00", 2), ("Nails", "20.00", 1)],
+        )
+
+        data = self.client.get(self.url, {"product": self.nails.id}).data
+        self.assertEqual(data["totals"], {"revenue": "20.00", "units": 4, "orders": 1})
+
+        yesterday = timezone.localdate() - timedelta(days=1)
+        data = self.client.get(self.url, {"end": yesterday.isoformat()}).data
+        self.assertEqual(data["daily"], [])
+
+    def test_dashboard_is_for_sellers_only(self):
+        client_user = User.objects.create_user(email="client@example.com", full_name="Client", password="testpass")
+        self.client.force_authenticate(client_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,98 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from payments.inbox import process_due_events
+from payments.models import Order, WebhookEvent
+
+
+def _event(etype, obj):
+    return {"id": f"evt_{etype}", "type": etype, "data": {"object": obj}}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTestCase(TestCase):
+    def setUp(self):
+        self.url = reverse("stripe-webhook")
+        self.orders = [
+            Order.objects.create(
+                stripe_checkout_id=f"cs_{i}", amount=Decimal("10.00"), currency="usd",
+                customer_email="buyer@example.com", status="Pending",
+            )
+            for i in range(3)
+        ]
+
+    def _deliver(self, event):
+        with mock.patch("payments.webhooks.stripe.Webhook.construct_event", return_value=event):
+            response = self.client.post(self.url, data=event, content_type="application/json", HTTP_STRIPE_SIGNATURE="t=1")
+        self.assertEqual(response.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_due_events(workers=0)
+
+    @mock.patch("payments.webhooks.stripe.checkout.Session")
+    def test_capture_finds_the_order_by_payment_intent(self, session_api):
+        self._deliver(_event("checkout.session.completed", {"id": "cs_1", "payment_intent": "pi_1"}))
+        self.orders[1].refresh_from_db()
+        self.assertEqual(self.orders[1].payment_intent_id, "pi_1")
+
+        self._deliver(_event("payment_intent.succeeded", {"id": "pi_1"}))
+        self.assertEqual(
+            dict(Order.objects.values_list("stripe_checkout_id", "status")),
+            {"cs_0": "Pending", "cs_1": "Paid", "cs_2": "Pending"},
+        )
+        session_api.retrieve.assert_not_called()
+        session_api.list.assert_not_called()
+
+    @mock.patch("payments.webhooks.stripe.checkout.Session")
+    def test_capture_before_completed_asks_stripe_once(self, session_api):
+        depth = len(connection.savepoint_ids)
+        open_transactions = []
+
+        def list_sessions(**params):
+            open_transactions.append(len(connection.savepoint_ids) - depth)
+            return mock.Mock(data=[mock.Mock(id="cs_2")])
+
+        session_api.list.side_effect = list_sessions
+        self._deliver(_event("charge.captured", {"id": "ch_1", "payment_intent": "pi_2"}))
+        self.assertEqual(open_transactions, [0])  # Stripe isn't called inside a transaction
+
+        session_api.list.assert_called_once_with(payment_intent="pi_2", limit=1)
+        self.orders[2].refresh_from_db()
+        self.assertEqual((self.orders[2].status, self.orders[2].payment_intent_id), ("Paid", "pi_2"))
+
+    def test_follow_up_work_is_redone_when_it_fails(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(payment_intent_id="pi_0")
+        with mock.patch(
+            "payments.webhooks.confirm_order", side_effect=[RuntimeError("lock timeout"), None],
+        ) as confirm:
+            self._deliver(_event("payment_intent.succeeded", {"id": "pi_0"}))
+            event = WebhookEvent.objects.get()
+            self.assertEqual((event.status, event.attempts), (WebhookEvent.PENDING, 1))
+            self.orders[0].refresh_from_db()
+            self.assertEqual(self.orders[0].status, "Pending")  # rolled back with the failure
+
+            WebhookEvent.objects.update(next_attempt_at=timezone.now())
+            with self.captureOnCommitCallbacks(execute=True):
+                process_due_events(workers=0)
+        self.assertEqual(confirm.call_count, 2)
+        self.orders[0].refresh_from_db()
+        self.assertEqual(self.orders[0].status, "Paid")
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.DONE)
+
+    @mock.patch("payments.management.commands.backfill_payment_intents.stripe.checkout.Session.retrieve")
+    def test_backfill_command(self, retrieve):
+        retrieve.side_effect = lambda session_id: mock.Mock(payment_intent=None if session_id == "cs_0" else f"pi_{session_id}")
+        out = StringIO()
+        call_command("backfill_payment_intents", stdout=out)
+
+        self.assertEqual(
+            dict(Order.objects.values_list("stripe_checkout_id", "payment_intent_id")),
+            {"cs_0": "", "cs_1": "pi_cs_1", "cs_2": "pi_cs_2"},
+        )
+        self.assertIn("Stored 2 PaymentIntent ids; 1 orders have none yet", out.getvalue())
@@ -1,11 +1,13 @@
 # orders/urls.py
 from django.urls import path
-from .views import CreatePaymentAPIView
+from .views import CreatePaymentAPIView, SellerDashboardAPIView
 from .s_views import payment_success, payment_cancel
+from .webhooks import stripe_webhook
 
 urlpatterns = [
     path("create-checkout-session/", CreatePaymentAPIView.as_view(), name="create-checkout-session"),
-    # path("webhook/stripe/", StripeWebhookAPIView.as_view(), name="stripe-webhook"),
+    path("webhook/stripe/", stripe_webhook, name="stripe-webhook"),
     path('success/', payment_success, name='payment-success'),
     path('cancel/', payment_cancel, name='payment-cancel'),
+    path("seller/dashboard/", SellerDashboardAPIView.as_view(), name="seller-dashboard"),
 ]
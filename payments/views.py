@@ -1,12 +1,20 @@
+import time
+from datetime import timedelta
+
 from django.conf import settings
 from django.db import transaction
+from django.db.models import F, Sum
 from django.shortcuts import render
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import permissions, status
 import stripe
 
-from .models import Order, OrderItem
+from .models import Order, OrderItem, SellerDailyProductSales, SellerDailySales, StockReservation
+from .permissions import IsSeller
+from .reservations import checkout_session_ttl, release, reserve
+from .serializers import SellerDashboardQuerySerializer, SellerDashboardSerializer
 from product.models import Product
 from cart.service import CartService  
 from drf_spectacular.utils import extend_schema
@@ -28,16 +36,23 @@ class CreatePaymentAPIView(APIView):
         if not cart_items:
             return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Each item's stock is held now, with a conditional update, so two
+        # checkouts can't both sell the last units; failed checkouts give it back.
+        products = Product.objects.in_bulk([item["product"]["id"] for item in cart_items])
         line_items = []
         valid_items = []
+        holds = []
 
-        for item in cart_items:
-            try:
-                product_id = item["product"]["id"]
-                product = Product.objects.get(pk=product_id)
+        try:
+            for item in cart_items:
+                product = products.get(item["product"]["id"])
+                if product is None:
+                    continue  # skip missing product
 
-                if item["quantity"] > product.qty:
+                hold = reserve(product.pk, item["quantity"])
+                if hold is None:
                     continue  # skip if not enough qty
+                holds.append(hold.pk)
 
                 line_items.append({
                     "price_data": {
@@ -48,21 +63,19 @@ class CreatePaymentAPIView(APIView):
                     "quantity": item["quantity"],
                 })
 
-                valid_items.append(item)
-
-            except Product.DoesNotExist:
-                continue  # skip missing product
+                valid_items.append((product, item["quantity"]))
 
-        if not line_items:
-            return Response({"error": "No valid products available"}, status=status.HTTP_400_BAD_REQUEST)
+            if not line_items:
+                return Response({"error": "No valid products available"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
             checkout_session = stripe.checkout.Session.create(
                 payment_method_types=["card"],
                 mode="payment",
                 line_items=line_items,
                 success_url=settings.SITE_URL + "api/success?session_id={CHECKOUT_SESSION_ID}",
                 cancel_url=settings.SITE_URL + "api/cancel",
+                # The session closes before its stock holds expire.
+                expires_at=int(time.time()) + checkout_session_ttl(),
 
                 payment_intent_data={
                     "capture_method": "manual"  # hold funds until manually captured
@@ -72,23 +85,63 @@ class CreatePaymentAPIView(APIView):
             with transaction.atomic():
                 order = Order.objects.create(
                     stripe_checkout_id=checkout_session.id,
-                    amount=sum(Product.objects.get(pk=i["product"]["id"]).price * i["quantity"] for i in valid_items),
+                    amount=sum(product.price * quantity for product, quantity in valid_items),
                     currency="usd",
                     customer_email=request.user.email if request.user.is_authenticated else "",
                     status="Pending"
                 )
 
-                for item in valid_items:
-                    product = Product.objects.get(pk=item["product"]["id"])
+                for product, quantity in valid_items:
                     OrderItem.objects.create(
                         order=order,
                         product=product,
-                        quantity=item["quantity"]
+                        quantity=quantity,
+                        unit_price=product.price,
                     )
+                StockReservation.objects.filter(pk__in=holds).update(order=order)
 
             return Response({"checkout_url": checkout_session.url}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
+            release(StockReservation.objects.filter(pk__in=holds))
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@extend_schema(tags=["Seller Dashboard"], parameters=[SellerDashboardQuerySerializer],
+               responses={200: SellerDashboardSerializer})
+class SellerDashboardAPIView(APIView):
+    """
+    GET /api/seller/dashboard/?start=YYYY-MM-DD&end=YYYY-MM-DD&product=<id>
+    Paid sales of the current seller: totals, one row per day and one per
+    product. Defaults to the last 30 days. Reads only the rollup tables.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSeller]
+
+    def get(self, request, *args, **kwargs):
+        query = SellerDashboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        end = query.validated_data.get("end") or timezone.localdate()
+        start = query.validated_data.get("start") or end - timedelta(days=29)
+        product_id = query.validated_data.get("product")
+
+        product_rows = SellerDailyProductSales.objects.filter(seller=request.user, day__range=(start, end))
+        if product_id is not None:
+            product_rows = product_rows.filter(product_id=product_id)
+            day_rows = product_rows
+        else:
+            day_rows = SellerDailySales.objects.filter(seller=request.user, day__range=(start, end))
+
+        daily = list(day_rows.order_by("day").values("day", "revenue", "units", "orders"))
+        products = (
+            product_rows.values("product_id", name=F("product__name"))
+            .annotate(revenue=Sum("revenue"), units=Sum("units"), orders=Sum("orders"))
+            .order_by("-revenue", "product_id")
+        )
+        totals = {
+            "revenue": sum((row["revenue"] for row in daily), 0),
+            "units": sum(row["units"] for row in daily),
+            "orders": sum(row["orders"] for row in daily),
+        }
+        return Response(SellerDashboardSerializer({
+            "start": start, "end": end, "totals": totals, "daily": daily, "products": products,
+        }).data)
@@ -1,8 +1,14 @@
+import json
+
 import stripe
 from django.conf import settings
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
+from .inbox import record_event
 from .models import Order
+from .reservations import confirm_order, extend_order, release_order
+from .sales import roll_up_orders
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -10,39 +16,60 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 def stripe_webhook(request):
     """
     Stripe -> Your API
-    - checkout.session.completed: payment authorized (funds held). Keep Order 'Pending'.
-    - charge.captured or payment_intent.succeeded: mark Order 'Paid' after capture.
+    Verifies and stores the event in the inbox (see inbox.py), then answers at once;
+    `process_webhook_events` runs handle_event on it later.
+    - checkout.session.completed: payment authorized (funds held). Keep Order 'Pending',
+      store its PaymentIntent id and keep its stock holds until the capture.
+    - charge.captured or payment_intent.succeeded: mark Order 'Paid' after capture,
+      count its sales and confirm its stock holds.
+    - checkout.session.expired or payment_intent.canceled: release the Order's stock holds.
     """
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload=payload,
             sig_header=sig_header,
             secret=settings.STRIPE_WEBHOOK_SECRET,
         )
-    except stripe.error.SignatureVerificationError:
+    except (ValueError, stripe.error.SignatureVerificationError):
         return HttpResponse(status=400)
 
+    # Store the body as Stripe sent it; construct_event only checked the signature.
+    record_event(json.loads(payload))
+    return HttpResponse(status=200)
+
+
+def handle_event(event):
+    """
+    Apply one stored event. Every step is idempotent, so a failed event can
+    run again from the start. Transactions are opened here, per order, and
+    never around a call to the Stripe API.
+    """
     etype = event.get("type")
     data = event.get("data", {}).get("object", {})
 
     if etype == "checkout.session.completed":
         # Session completed = authorized, not captured. Keep 'Pending'.
-        session_id = data.get("id")
-        metadata = data.get("metadata") or {}
-        order_id = metadata.get("order_id")
-        if order_id:
-            try:
-                # Ensure the session matches our stored one
-                Order.objects.get(id=order_id, stripe_checkout_id=session_id)
-                # Optionally store PI for later use:
-                # pi_id = data.get("payment_intent")
-                # order.some_field = pi_id
-                # order.save(update_fields=["some_field"])
-            except Order.DoesNotExist:
-                pass
+        orders = Order.objects.filter(stripe_checkout_id=data.get("id"))
+        pi_id = data.get("payment_intent")
+        with transaction.atomic():
+            if pi_id:
+                orders.filter(payment_intent_id="").update(payment_intent_id=pi_id)
+            # Capture can come days later; the holds must not expire meanwhile.
+            for order_id in orders.filter(status="Pending").values_list("pk", flat=True):
+                extend_order(order_id)
+
+    if etype == "checkout.session.expired":
+        # Never paid: give the held stock back.
+        for order in Order.objects.filter(stripe_checkout_id=data.get("id"), status="Pending"):
+            release_order(order.pk)
+
+    if etype == "payment_intent.canceled":
+        # The authorization was canceled or ran out before capture.
+        for order in Order.objects.filter(payment_intent_id=data.get("id"), status="Pending"):
+            release_order(order.pk)
 
     # When captured, Stripe fires payment_intent.succeeded and/or charge.captured
     if etype in ("payment_intent.succeeded", "charge.captured"):
@@ -53,16 +80,39 @@ def stripe_webhook(request):
             pi_id = data.get("payment_intent")
 
         if not pi_id:
-            return HttpResponse(status=200)
-
-        # Find pending orders and match by retrieving their sessions
-        for order in Order.objects.filter(status="Pending"):
-            try:
-                s = stripe.checkout.Session.retrieve(order.stripe_checkout_id)
-                if s and s.payment_intent == pi_id:
-                    order.status = "Paid"
-                    order.save(update_fields=["status"])
-            except Exception:
-                continue
+            return
 
-    return HttpResponse(status=200)
+        for order_id in orders_for_payment_intent(pi_id).values_list("pk", flat=True):
+            mark_paid(order_id)
+
+
+def mark_paid(order_id):
+    """
+    Mark the order Paid, then count its sales and confirm its stock holds in
+    the same transaction. Both skip work already done, so a retry after a
+    failure (or for an order already Paid) completes whatever is missing.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+        if order.status == "Pending":
+            order.status = "Paid"
+            order.save(update_fields=["status"])
+        if order.status == "Paid":
+            roll_up_orders([order.pk])
+            confirm_order(order.pk)
+
+
+def orders_for_payment_intent(pi_id):
+    """
+    Orders paid through this PaymentIntent, by the indexed payment_intent_id.
+    When none is stored yet (the completed event hasn't arrived, or the
+    order predates the column), asks Stripe for the session once and stores it.
+    Call it outside a transaction: it may wait on the Stripe API.
+    """
+    orders = Order.objects.filter(payment_intent_id=pi_id)
+    if orders.exists():
+        return orders
+    sessions = stripe.checkout.Session.list(payment_intent=pi_id, limit=1)
+    for session in sessions.data:
+        Order.objects.filter(stripe_checkout_id=session.id, payment_intent_id="").update(payment_intent_id=pi_id)
+    return orders
@@ -0,0 +1,254 @@
+# products/autocomplete.py
+"""
+In-memory prefix index for search-box suggestions.
+
+Product, brand and category names are indexed in a trie. Each name is
+entered once for every word it contains, starting at that word, so
+"phone" also finds "Smart Phone". Every node keeps its best suggestions
+precomputed, so a lookup is a walk down at most `MAX_DEPTH` nodes and
+never reaches the database.
+
+The index is loaded in the background when a worker starts (see
+`warm_up`); until then lookups return no suggestions rather than build it
+a second time on a request thread. It is patched after commit from the
+model signals. Like the attribute bitmap index, it
+shares a generation counter through the cache. A worker that sees
+another worker's change rebuilds its copy in a background thread and
+serves the old one meanwhile.
+"""
+import heapq
+import logging
+import re
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from .cache import get_counter, incr_counter
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "autocomplete-gen"
+# Deeper prefixes share the node at this depth and are filtered on lookup.
+MAX_DEPTH = 16
+# Suggestion order: categories, then brands, then products; shorter first.
+KIND_WEIGHTS = {"category": 3, "brand": 2, "product": 1}
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text):
+    return " ".join((text or "").casefold().split())
+
+
+def _index_strings(text):
+    """The normalized text from the start of each word, e.g. "smart phone", "phone"."""
+    text = normalize(text)
+    return {text[match.start():] for match in _WORD_RE.finditer(text)}
+
+
+def _trie_paths(text):
+    """The index strings cut to MAX_DEPTH; suffixes that share their first MAX_DEPTH characters share a path."""
+    return {string[:MAX_DEPTH] for string in _index_strings(text)}
+
+
+class _Node:
+    __slots__ = ("children", "keys", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()  # entries whose index string ends here (or is cut off here)
+        self.top = []      # best entries in this subtree, best first
+
+
+class PrefixIndex:
+    def __init__(self, top_size):
+        self.top_size = top_size
+        self.root = _Node()
+        self.entries = {}  # (kind, id) -> (rank, text)
+
+    def _rank(self, key):
+        return self.entries[key][0]
+
+    def add(self, kind, pk, text, recompute=True):
+        key = (kind, pk)
+        if key in self.entries:
+            self.remove(kind, pk)
+        if not normalize(text):
+            return
+        self.entries[key] = ((-KIND_WEIGHTS[kind], len(text), normalize(text), pk), text)
+        for string in _trie_paths(text):
+            path = [self.root]
+            for char in string:
+                path.append(path[-1].children.setdefault(char, _Node()))
+            path[-1].keys.add(key)
+            if recompute:
+                self._recompute_path(path, string)
+
+    def remove(self, kind, pk):
+        key = (kind, pk)
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        for string in _trie_paths(entry[1]):
+            path = [self.root]
+            for char in string:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].keys.discard(key)
+            # Recompute before dropping the entry: ranks of the remaining keys are still needed.
+            self._recompute_path(path, string, removed=key)
+        del self.entries[key]
+
+    def _recompute_path(self, path, string, removed=None):
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth < len(path) - 1:
+                child = path[depth + 1]
+                if not child.keys and not child.children:
+                    del node.children[string[depth]]
+            self._recompute(node, removed)
+
+    def _recompute(self, node, removed=None):
+        candidates = set(node.keys)
+        for child in node.children.values():
+            candidates.update(child.top)
+        candidates.discard(removed)
+        node.top = heapq.nsmallest(self.top_size, candidates, key=self._rank)
+
+    def recompute_all(self):
+        stack, order = [self.root], []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        for node in reversed(order):
+            self._recompute(node)
+
+    def has(self, kind, updated=(), removed=()):
+        """True when the index already reflects these changes."""
+        return (
+            all((kind, pk) in self.entries and self.entries[(kind, pk)][1] == name for pk, name in updated)
+            and not any((kind, pk) in self.entries for pk in removed)
+        )
+
+    def lookup(self, query, limit):
+        query = normalize(query)
+        if not query:
+            return []
+        node = self.root
+        for char in query[:MAX_DEPTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if len(query) <= MAX_DEPTH:
+            keys = node.top
+        else:
+            # Past MAX_DEPTH the node is a leaf holding every longer string.
+            keys = sorted(
+                (key for key in node.keys
+                 if any(s.startswith(query) for s in _index_strings(self.entries[key][1]))),
+                key=self._rank,
+            )
+        results, seen = [], set()
+        for kind, pk in keys:
+            text = self.entries[(kind, pk)][1]
+            if (kind, normalize(text)) in seen:
+                continue
+            seen.add((kind, normalize(text)))
+            results.append({"text": text, "type": kind, "id": pk})
+            if len(results) == limit:
+                break
+        return results
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self._index = None
+        self._generation = None
+        self._lock = threading.Lock()
+        self._reloading = False
+
+    def _build(self):
+        from .models import Brand, Category, Product
+
+        index = PrefixIndex(top_size=settings.PRODUCT_AUTOCOMPLETE_MAX_RESULTS * 2)
+        sources = (
+            ("category", Category.objects.values_list("id", "name")),
+            ("brand", Brand.objects.values_list("id", "name")),
+            ("product", Product.objects.values_list("id", "name")),
+        )
+        for kind, rows in sources:
+            for pk, name in rows.iterator(chunk_size=5000):
+                index.add(kind, pk, name, recompute=False)
+        index.recompute_all()
+        return index
+
+    def load(self):
+        generation = get_counter(GENERATION_KEY)
+        index = self._build()
+        with self._lock:
+            self._index, self._generation = index, generation
+
+    def _reload_in_background(self):
+        def run():
+            try:
+                self.load()
+            except DatabaseError:
+                logger.exception("Building the autocomplete index failed; the next lookup retries.")
+            finally:
+                self._reloading = False
+                connection.close()
+
+        self._reloading = True
+        threading.Thread(target=run, name="autocomplete-reload", daemon=True).start()
+
+    def suggest(self, query, limit):
+        """Suggestions from the in-memory index; empty until the first build finishes."""
+        with self._lock:
+            if not self._reloading and (self._index is None or self._generation != get_counter(GENERATION_KEY)):
+                self._reload_in_background()
+            if self._index is None:
+                return []
+            return self._index.lookup(query, limit)
+
+    def apply(self, kind, updated=(), removed=()):
+        """Record committed changes: `updated` is (id, name) pairs, `removed` ids."""
+        with self._lock:
+            # Most saves (stock, price) leave the name alone: don't make
+            # every worker rebuild for those.
+            if (
+                self._index is not None
+                and self._generation == get_counter(GENERATION_KEY)
+                and self._index.has(kind, updated, removed)
+            ):
+                return
+        generation = incr_counter(GENERATION_KEY)
+        with self._lock:
+            if self._index is None or generation != self._generation + 1:
+                # Another worker changed the data since our copy was built;
+                # leave it to the generation check in suggest() to reload.
+                return
+            for pk in removed:
+                self._index.remove(kind, pk)
+            for pk, name in updated:
+                self._index.add(kind, pk, name)
+            self._generation = generation
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def record_changes_on_commit(kind, updated=(), removed=()):
+    updated, removed = list(updated), list(removed)
+    transaction.on_commit(lambda: autocomplete_index.apply(kind, updated=updated, removed=removed))
+
+
+def warm_up():
+    """Build the index in a background thread; called once per worker from wsgi/asgi."""
+    with autocomplete_index._lock:
+        if not autocomplete_index._reloading:
+            autocomplete_index._reload_in_background()
@@ -0,0 +1,183 @@
+# products/bitmaps.py
+"""
+In-process bitmap index from AttributeValue id to the ids of the products
+that carry it.
+
+Turn it on with `PRODUCT_ATTRIBUTE_BITMAP_INDEX`. `ProductFilter` and the
+facet counts then answer attribute selections with bitmap AND/OR in memory
+and send the database a single `id IN (...)` instead of one join per
+attribute. A selection matching more than `PRODUCT_ATTRIBUTE_BITMAP_MAX_IDS`
+products is filtered with the subqueries instead, to keep the statement
+small. The index is loaded lazily. Signals update it after commit.
+A shared generation counter in the cache tells other worker processes to
+reload their copy when they are next used.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import get_counter, incr_counter
+
+GENERATION_KEY = "attribute-bitmap-gen"
+CHUNK_BITS = 16
+
+
+class Bitmap:
+    """
+    Set of non-negative ints stored as 65536-bit chunks keyed by `id >> 16`.
+    Only non-empty chunks are kept, so rare attribute values stay small.
+    """
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks=None):
+        self.chunks = chunks or {}
+
+    @classmethod
+    def from_ids(cls, ids):
+        bitmap = cls()
+        bitmap.update(ids)
+        return bitmap
+
+    def update(self, ids):
+        grouped = {}
+        for pk in ids:
+            grouped.setdefault(pk >> CHUNK_BITS, []).append(pk & 0xFFFF)
+        for key, lows in grouped.items():
+            bits = bytearray(1 << (CHUNK_BITS - 3))
+            for low in lows:
+                bits[low >> 3] |= 1 << (low & 7)
+            self.chunks[key] = self.chunks.get(key, 0) | int.from_bytes(bits, "little")
+
+    def difference_update(self, ids):
+        for pk in ids:
+            key = pk >> CHUNK_BITS
+            chunk = self.chunks.get(key, 0) & ~(1 << (pk & 0xFFFF))
+            if chunk:
+                self.chunks[key] = chunk
+            else:
+                self.chunks.pop(key, None)
+
+    def __and__(self, other):
+        small, large = sorted((self.chunks, other.chunks), key=len)
+        chunks = {}
+        for key, chunk in small.items():
+            both = chunk & large.get(key, 0)
+            if both:
+                chunks[key] = both
+        return Bitmap(chunks)
+
+    def __or__(self, other):
+        chunks = dict(self.chunks)
+        for key, chunk in other.chunks.items():
+            chunks[key] = chunks.get(key, 0) | chunk
+        return Bitmap(chunks)
+
+    def __len__(self):
+        return sum(chunk.bit_count() for chunk in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            chunk, base = self.chunks[key], key << CHUNK_BITS
+            while chunk:
+                low = chunk & -chunk
+                yield base + low.bit_length() - 1
+                chunk ^= low
+
+
+class AttributeBitmapIndex:
+    def __init__(self):
+        self._bitmaps = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        # Called with the lock held.
+        generation = get_counter(GENERATION_KEY)
+        if generation != self._generation:
+            self._load(generation)
+
+    def _load(self, generation):
+        from .models import Product
+
+        ids_by_value = {}
+        rows = Product.attributes.through.objects.values_list("attributevalue_id", "product_id")
+        for value_id, product_id in rows.iterator(chunk_size=10000):
+            ids_by_value.setdefault(value_id, []).append(product_id)
+        self._bitmaps = {value_id: Bitmap.from_ids(ids) for value_id, ids in ids_by_value.items()}
+        self._generation = generation
+
+    def match(self, groups):
+        """
+        Products carrying at least one value of every group, for groups of
+        AttributeValue ids (OR inside a group, AND across groups).
+        """
+        result = None
+        with self._lock:
+            self._refresh()
+            for group in sorted(groups, key=len):
+                matched = Bitmap()
+                for value_id in group:
+                    matched = matched | self._bitmaps.get(value_id, Bitmap())
+                result = matched if result is None else result & matched
+                if not result:
+                    break
+        return result if result is not None else Bitmap()
+
+    def counts(self, candidates):
+        """{value_id: number of `candidates` carrying it}, leaving out zeros."""
+        counts = {}
+        with self._lock:
+            self._refresh()
+            for value_id, bitmap in self._bitmaps.items():
+                count = len(bitmap & candidates)
+                if count:
+                    counts[value_id] = count
+        return counts
+
+    def apply(self, links=(), unlinks=(), products=(), values=()):
+        """
+        Record committed changes: `links`/`unlinks` are (value_id, product_id)
+        pairs, `products` and `values` are deleted ids.
+        """
+        generation = incr_counter(GENERATION_KEY)
+        with self._lock:
+            if self._generation is None or generation != self._generation + 1:
+                # Never loaded, or another process changed the data since;
+                # reload on next use instead of patching a stale copy.
+                self._generation = None
+                return
+            for value_id, product_ids in _group(links).items():
+                self._bitmaps.setdefault(value_id, Bitmap()).update(product_ids)
+            for value_id, product_ids in _group(unlinks).items():
+                if value_id in self._bitmaps:
+                    self._bitmaps[value_id].difference_update(product_ids)
+            if products:
+                for bitmap in self._bitmaps.values():
+                    bitmap.difference_update(products)
+            for value_id in values:
+                self._bitmaps.pop(value_id, None)
+            self._generation = generation
+
+
+def _group(pairs):
+    grouped = {}
+    for value_id, product_id in pairs:
+        grouped.setdefault(value_id, []).append(product_id)
+    return grouped
+
+
+attribute_index = AttributeBitmapIndex()
+
+
+def is_enabled():
+    return settings.PRODUCT_ATTRIBUTE_BITMAP_INDEX
+
+
+def record_changes_on_commit(**changes):
+    """Update the index with `AttributeBitmapIndex.apply(**changes)` once the transaction commits."""
+    if is_enabled():
+        transaction.on_commit(lambda: attribute_index.apply(**changes))
@@ -0,0 +1,312 @@
+# products/bulk.py
+"""
+Streaming bulk import and export of products (CSV or JSON Lines).
+
+Import reads rows one at a time and validates each with
+`ProductImportRowSerializer`. It resolves category, brand and attribute
+names through `LookupCache` with one query per batch, and writes each
+batch with `bulk_create` for products and their attribute through-rows.
+Because bulk writes send no model signals, the importer updates the search
+index, the attribute bitmap and autocomplete indexes, the response cache
+and the product cards itself.
+"""
+import csv
+import io
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .autocomplete import record_changes_on_commit as record_autocomplete_changes
+from .bitmaps import record_changes_on_commit
+from .cache import invalidate_products
+from .cards import refresh_cards_on_commit
+from .models import AttributeValue, Brand, Category, Product
+from .search import get_search_backend
+from .serializers import ProductImportRowSerializer
+
+FILE_FORMATS = ("csv", "jsonl")
+CSV_COLUMNS = ["name", "description", "price", "qty", "category", "brand", "attributes"]
+ATTRIBUTE_SEPARATOR = "|"
+
+
+def detect_format(filename, default="csv"):
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ("jsonl", "ndjson"):
+        return "jsonl"
+    if extension == "csv":
+        return "csv"
+    return default
+
+
+def iter_rows(stream, file_format):
+    """Yield (row_number, dict) from a binary stream without loading it whole."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {"__error__": "Invalid JSON."}
+            if not isinstance(row, dict):
+                row = {"__error__": "Each line must be a JSON object."}
+            yield number, _normalize_row(row)
+    else:
+        # Row 1 is the header; empty cells count as "not given".
+        for number, row in enumerate(csv.DictReader(text), start=2):
+            yield number, _normalize_row({k: v for k, v in row.items() if k and v != ""})
+
+
+def _normalize_row(row):
+    attributes = row.get("attributes")
+    if isinstance(attributes, str):
+        row["attributes"] = [a.strip() for a in attributes.split(ATTRIBUTE_SEPARATOR) if a.strip()]
+    elif isinstance(attributes, dict):
+        row["attributes"] = [f"{name}:{value}" for name, value in attributes.items()]
+    elif attributes is None:
+        row.pop("attributes", None)
+    if row.get("brand") == "":
+        row["brand"] = None
+    return row
+
+
+def _split_attribute(raw):
+    name, value = raw.split(":", 1)
+    return name.strip(), value.strip()
+
+
+class LookupCache:
+    """
+    Name -> id maps for categories, brands and attribute values, filled
+    with one `__in` query per batch for names not seen yet. Unknown names
+    are cached as None so they are not queried again.
+    """
+
+    def __init__(self):
+        self.categories = {}
+        self.brands = {}
+        self.attribute_values = {}
+
+    def prime(self, rows):
+        categories, brands, attribute_values = set(), set(), set()
+        for row in rows:
+            categories.add(row["category"])
+            if row.get("brand"):
+                brands.add(row["brand"])
+            attribute_values.update(_split_attribute(a) for a in row["attributes"])
+
+        self._fill(self.categories, categories - self.categories.keys(),
+                   lambda names: Category.objects.filter(name__in=names).values_list("name", "id"))
+        self._fill(self.brands, brands - self.brands.keys(),
+                   lambda names: Brand.objects.filter(name__in=names).values_list("name", "id"))
+
+        missing = attribute_values - self.attribute_values.keys()
+        if missing:
+            found = AttributeValue.objects.filter(
+                attribute__name__in={name for name, _ in missing},
+                value__in={value for _, value in missing},
+            ).values_list("attribute__name", "value", "id")
+            for name, value, pk in found:
+                self.attribute_values[(name, value)] = pk
+            for key in missing:
+                self.attribute_values.setdefault(key, None)
+
+    @staticmethod
+    def _fill(cache, missing, query):
+        if not missing:
+            return
+        cache.update(query(missing))
+        for name in missing:
+            cache.setdefault(name, None)
+
+
+class ProductImporter:
+    def __init__(self, seller, batch_size=500, max_errors=1000):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.lookups = LookupCache()
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        """rows: iterable of (row_number, dict). Returns the import report."""
+        batch = []
+        for number, row in rows:
+            if "__error__" in row:
+                self._add_error(number, {"row": [row["__error__"]]})
+                continue
+            serializer = ProductImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self._add_error(number, serializer.errors)
+                continue
+            batch.append((number, serializer.validated_data))
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {"created": self.created, "error_count": self.error_count, "errors": self.errors}
+
+    def _add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": number, "errors": errors})
+
+    def _resolve(self, number, data):
+        errors = {}
+        category_id = self.lookups.categories.get(data["category"])
+        if category_id is None:
+            errors["category"] = [f"Unknown category '{data['category']}'."]
+        brand_id = None
+        if data.get("brand"):
+            brand_id = self.lookups.brands.get(data["brand"])
+            if brand_id is None:
+                errors["brand"] = [f"Unknown brand '{data['brand']}'."]
+        attribute_ids = []
+        for raw in data["attributes"]:
+            pk = self.lookups.attribute_values.get(_split_attribute(raw))
+            if pk is None:
+                errors.setdefault("attributes", []).append(f"Unknown attribute value '{raw}'.")
+            else:
+                attribute_ids.append(pk)
+        if errors:
+            self._add_error(number, errors)
+            return None
+        product = Product(
+            name=data["name"], description=data["description"],
+            price=data["price"], qty=data["qty"],
+            category_id=category_id, brand_id=brand_id, seller=self.seller,
+        )
+        return product, attribute_ids
+
+    def _write_batch(self, batch):
+        self.lookups.prime(data for _, data in batch)
+        resolved = [r for r in (self._resolve(number, data) for number, data in batch) if r]
+        if not resolved:
+            return
+
+        Through = Product.attributes.through
+        with transaction.atomic():
+            products = Product.objects.bulk_create([product for product, _ in resolved])
+            links = [
+                Through(product_id=product.pk, attributevalue_id=pk)
+                for product, attribute_ids in resolved
+                for pk in set(attribute_ids)
+            ]
+            Through.objects.bulk_create(links, batch_size=self.batch_size)
+            sync_bulk_created(products, links)
+        self.created += len(products)
+
+
+def sync_bulk_created(products, links):
+    """
+    Do what the model signals would have done for products and attribute
+    through-rows written with bulk_create: update the search index, the
+    attribute bitmap and autocomplete indexes, the product cards and the
+    response cache. Call it inside the transaction that wrote them.
+    """
+    get_search_backend().index_products((p.pk, p.name, p.description) for p in products)
+    record_changes_on_commit(links=[(link.attributevalue_id, link.product_id) for link in links])
+    record_autocomplete_changes("product", updated=[(p.pk, p.name) for p in products])
+    refresh_cards_on_commit(p.pk for p in products)
+    invalidate_products(p.pk for p in products)
+
+
+def apply_bulk_updates(items, seller, batch_size=500):
+    """
+    Apply validated `{id, qty | qty_delta, price}` items to `seller`'s
+    products with one UPDATE per batch. Each column is a CASE over the ids,
+    deltas are added with F("qty"), and rows not mentioned keep their value.
+    The UPDATE filters on the seller too, so other sellers' ids are left
+    untouched even if the caller skipped its ownership check. A batch that
+    would drive stock below zero is rolled back as a whole and reported.
+    """
+    updated, errors = 0, []
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        ids = [item["id"] for item in batch]
+        qty_cases = [
+            When(id=item["id"], then=Value(item["qty"])) if "qty" in item
+            else When(id=item["id"], then=F("qty") + Value(item["qty_delta"]))
+            for item in batch
+            if "qty" in item or "qty_delta" in item
+        ]
+        price_cases = [When(id=item["id"], then=Value(item["price"])) for item in batch if "price" in item]
+
+        changes = {"updated_at": timezone.now()}
+        if qty_cases:
+            changes["qty"] = Case(*qty_cases, default=F("qty"), output_field=IntegerField())
+        if price_cases:
+            changes["price"] = Case(
+                *price_cases, default=F("price"), output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+        try:
+            with transaction.atomic():
+                updated += Product.objects.filter(id__in=ids, seller=seller).update(**changes)
+                refresh_cards_on_commit(ids)
+                invalidate_products(ids)
+        except IntegrityError:
+            errors.append({"ids": ids, "errors": _negative_stock_errors(batch)})
+    return {"updated": updated, "errors": errors}
+
+
+def _negative_stock_errors(batch):
+    deltas = {item["id"]: item["qty_delta"] for item in batch if item.get("qty_delta", 0) < 0}
+    current = dict(Product.objects.filter(id__in=deltas).values_list("id", "qty"))
+    return {
+        pk: [f"qty_delta {delta} would leave {current[pk] + delta} in stock."]
+        for pk, delta in deltas.items()
+        if pk in current and current[pk] + delta < 0
+    }
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Yield one plain dict per product, reading the catalog in chunks. The
+    columns are exactly what the importer reads; ids are left out because
+    an import always creates new products.
+    """
+    queryset = (
+        queryset.select_related("category", "brand")
+        .prefetch_related("attributes__attribute")
+        .order_by("id")
+    )
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            "name": product.name,
+            "description": product.description,
+            "price": str(product.price),
+            "qty": product.qty,
+            "category": product.category.name,
+            "brand": product.brand.name if product.brand else None,
+            "attributes": [f"{v.attribute.name}:{v.value}" for v in product.attributes.all()],
+        }
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_lines(queryset, file_format, chunk_size=2000):
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    if file_format == "jsonl":
+        for row in rows:
+            yield json.dumps(row) + "\n"
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        row["attributes"] = ATTRIBUTE_SEPARATOR.join(row["attributes"])
+        row["brand"] = row["brand"] or ""
+        yield writer.writerow([row[column] for column in CSV_COLUMNS])
@@ -0,0 +1,148 @@
+# products/cache.py
+"""
+Response cache for catalog reads.
+
+Cached entries are stored as `(generation, data)`. The generation is read
+from small counter keys: one for the whole catalog, used by list responses,
+and one per product, used by detail responses. Signals in `signals.py` bump
+those counters after commit, so invalidation never has to find or delete
+the cached responses themselves. After an invalidation, one worker takes a
+short lock and recomputes the entry. Other workers keep serving the stale
+entry until it is replaced.
+
+The counters and the lock only work across workers when the default cache
+is shared by all of them (Redis via REDIS_URL, see settings.CACHES).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+CATALOG_GENERATION_KEY = "catalog-gen"
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+LOCK_POLLS = 20
+
+
+def product_generation_key(product_id):
+    return f"catalog-gen:product:{product_id}"
+
+
+def wishlist_generation_key(user_id):
+    return f"catalog-gen:wishlist:{user_id}"
+
+
+def get_generations(keys):
+    """Current value of each generation counter, creating missing ones."""
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    for key in missing:
+        cache.add(key, time.time_ns(), timeout=None)
+        values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def bump_generations(keys):
+    if keys:
+        now = time.time_ns()
+        cache.set_many({key: now for key in keys}, timeout=None)
+
+
+def get_counter(key):
+    """Current value of a shared integer counter, seeded from the clock so a flushed cache never repeats a value."""
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def incr_counter(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_counter(key)
+        return cache.incr(key)
+
+
+def invalidate_products(product_ids):
+    """
+    Invalidate the catalog lists and the given products once the current
+    transaction commits. The write has committed by then, so a cache error
+    is logged instead of raised.
+    """
+    keys = [CATALOG_GENERATION_KEY] + [product_generation_key(pk) for pk in set(product_ids)]
+    transaction.on_commit(lambda: bump_generations(keys), robust=True)
+
+
+def invalidate_wishlist(user_id):
+    """Invalidate the user's product lists (they carry is_wishlisted) once the transaction commits."""
+    transaction.on_commit(lambda: bump_generations([wishlist_generation_key(user_id)]))
+
+
+def response_cache_key(request, action, vary=()):
+    fmt = getattr(request.accepted_renderer, "format", "")
+    raw = f"{action}|{fmt}|{'|'.join(vary)}|{request.build_absolute_uri()}"
+    return "product-response:" + hashlib.md5(raw.encode()).hexdigest()
+
+
+class CachedCatalogResponseMixin:
+    """
+    Caches `list` and `retrieve` responses of a catalog viewset. Only
+    successful responses are stored, and writes go through uncached.
+    """
+    response_cache_timeout = settings.PRODUCT_RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        extra_keys = self.list_cache_generation_keys(request)
+        return self._cached_response(
+            request, [CATALOG_GENERATION_KEY] + extra_keys,
+            lambda: super(CachedCatalogResponseMixin, self).list(request, *args, **kwargs),
+            vary=extra_keys,
+        )
+
+    def list_cache_generation_keys(self, request):
+        """
+        Extra generation keys for list responses. Responses are cached
+        separately per set of keys, so return per-user keys for lists
+        whose content depends on the user.
+        """
+        return []
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return self._cached_response(
+            request, [product_generation_key(lookup)],
+            lambda: super(CachedCatalogResponseMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def _cached_response(self, request, generation_keys, compute, vary=()):
+        key = response_cache_key(request, self.action, vary)
+        generation = get_generations(generation_keys)
+        entry = cache.get(key)
+        if entry is not None and entry[0] == generation:
+            return self._from_cache(entry, "HIT")
+
+        lock_key = key + ":lock"
+        if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            try:
+                response = compute()
+                if response.status_code == 200:
+                    cache.set(key, (generation, response.data), self.response_cache_timeout)
+                response["X-Cache"] = "MISS"
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is recomputing this key.
+        if entry is not None:
+            return self._from_cache(entry, "STALE")
+        for _ in range(LOCK_POLLS):
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generation:
+                return self._from_cache(entry, "HIT")
+        return compute()
+
+    def _from_cache(self, entry, state):
+        return Response(entry[1], headers={"X-Cache": state})
@@ -0,0 +1,103 @@
+# products/cards.py
+"""
+Maintenance of the denormalized ProductCard read model.
+
+Signals call `refresh_cards_on_commit` with the ids of products whose card
+may have changed. Category and brand renames go through
+`rename_category`/`rename_brand` instead, which is one UPDATE on the card
+table. The `rebuild_product_cards` command rebuilds every row in batches.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import AttributeValue, Product, ProductCard, ProductImage
+
+CARD_FIELDS = [
+    "name", "price", "in_stock", "category_id", "category_name", "brand_id", "brand_name",
+    "seller_id", "primary_image_path", "attribute_summary", "created_at",
+]
+
+
+def _card_for(product):
+    images = product.primary_images
+    primary_image_path = ""
+    if images:
+        primary_image_path = images[0].derivatives.get("thumbnail", images[0].image.name)
+    summary = defaultdict(list)
+    for value in product.attributes.all():
+        summary[value.attribute.name].append(value.value)
+    return ProductCard(
+        product_id=product.id,
+        name=product.name,
+        price=product.price,
+        in_stock=product.in_stock,
+        category_id=product.category_id,
+        category_name=product.category.name,
+        brand_id=product.brand_id,
+        brand_name=product.brand.name if product.brand else "",
+        seller_id=product.seller_id,
+        primary_image_path=primary_image_path,
+        attribute_summary={name: sorted(values) for name, values in sorted(summary.items())},
+        created_at=product.created_at,
+    )
+
+
+def _card_source(queryset):
+    return queryset.select_related("category", "brand").prefetch_related(
+        Prefetch("images", queryset=ProductImage.objects.filter(is_primary=True), to_attr="primary_images"),
+        Prefetch("attributes", queryset=AttributeValue.objects.select_related("attribute")),
+    )
+
+
+def _upsert(cards, batch_size=None):
+    ProductCard.objects.bulk_create(
+        cards, batch_size=batch_size,
+        update_conflicts=True, unique_fields=["product"], update_fields=CARD_FIELDS,
+    )
+
+
+def refresh_cards(product_ids):
+    """Recompute the cards of the given products; cards of deleted products are dropped."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    cards = [_card_for(p) for p in _card_source(Product.objects.filter(id__in=product_ids))]
+    if cards:
+        _upsert(cards)
+    missing = product_ids - {card.product_id for card in cards}
+    if missing:
+        ProductCard.objects.filter(product_id__in=missing).delete()
+
+
+def refresh_cards_on_commit(product_ids):
+    product_ids = set(product_ids)
+    transaction.on_commit(lambda: refresh_cards(product_ids))
+
+
+def rename_category(category):
+    ProductCard.objects.filter(category_id=category.pk).update(category_name=category.name)
+
+
+def rename_brand(brand):
+    ProductCard.objects.filter(brand_id=brand.pk).update(brand_name=brand.name)
+
+
+def rebuild_cards(batch_size=1000):
+    """Rebuild every card in batches; returns the number of cards written."""
+    total = 0
+    with transaction.atomic():
+        ProductCard.objects.all().delete()
+        batch = []
+        products = _card_source(Product.objects.order_by("id"))
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(_card_for(product))
+            if len(batch) >= batch_size:
+                ProductCard.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            ProductCard.objects.bulk_create(batch)
+            total += len(batch)
+    return total
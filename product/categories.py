@@ -0,0 +1,94 @@
+# products/categories.py
+"""
+Category hierarchy backed by the CategoryClosure table.
+
+Every category has a closure row to itself and to each of its ancestors,
+so a whole subtree is found with one indexed lookup on `ancestor`.
+`sync_closure` runs from the Category post_save signal. A new category
+adds its rows, and a category whose parent changed moves its entire
+subtree. The navigation tree is built from a single query and cached
+until a category changes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache import bump_generations, get_generations
+from .models import Category, CategoryClosure
+
+CATEGORY_TREE_GENERATION_KEY = "category-tree-gen"
+
+
+def sync_closure(category, created=False):
+    links = CategoryClosure.objects
+    with transaction.atomic():
+        if created:
+            links.create(ancestor=category, descendant=category, depth=0)
+        else:
+            current_parent = links.filter(descendant=category, depth=1).values_list("ancestor_id", flat=True).first()
+            if current_parent == category.parent_id:
+                return
+
+        subtree = list(links.filter(ancestor=category).values_list("descendant_id", "depth"))
+        subtree_ids = [pk for pk, _ in subtree]
+        if not created:
+            links.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if category.parent_id:
+            ancestors = links.filter(descendant_id=category.parent_id).values_list("ancestor_id", "depth")
+            links.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=pk, depth=ancestor_depth + 1 + depth)
+                for ancestor_id, ancestor_depth in ancestors
+                for pk, depth in subtree
+            ])
+
+
+def is_descendant(category_id, ancestor_id):
+    return CategoryClosure.objects.filter(ancestor_id=ancestor_id, descendant_id=category_id).exists()
+
+
+def subtree_ids(category_id):
+    """Subquery of the ids of a category and all categories below it."""
+    return CategoryClosure.objects.filter(ancestor_id=category_id).values("descendant_id")
+
+
+def rebuild_closure(batch_size=1000):
+    """Recompute the whole closure table from `Category.parent`. Returns the row count."""
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    rows = []
+    for pk in parents:
+        node, depth, seen = pk, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            rows.append(CategoryClosure(ancestor_id=node, descendant_id=pk, depth=depth))
+            node, depth = parents.get(node), depth + 1
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(rows, batch_size=batch_size)
+    invalidate_tree()
+    return len(rows)
+
+
+def build_tree():
+    """Nested [{id, name, children: [...]}] for the whole catalog, sorted by name."""
+    nodes, roots = {}, []
+    rows = Category.objects.order_by("name").values_list("id", "name", "parent_id")
+    for pk, name, _ in rows:
+        nodes[pk] = {"id": pk, "name": name, "children": []}
+    for pk, _, parent_id in rows:
+        siblings = nodes[parent_id]["children"] if parent_id in nodes else roots
+        siblings.append(nodes[pk])
+    return roots
+
+
+def get_tree():
+    (generation,) = get_generations([CATEGORY_TREE_GENERATION_KEY])
+    key = f"category-tree:{generation}"
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree()
+        cache.set(key, tree, settings.PRODUCT_CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def invalidate_tree():
+    transaction.on_commit(lambda: bump_generations([CATEGORY_TREE_GENERATION_KEY]))
@@ -0,0 +1,128 @@
+# products/facets.py
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils.http import urlencode
+
+from . import bitmaps
+from .cache import CATALOG_GENERATION_KEY, get_generations
+from .models import AttributeValue, Product
+
+# Upper bounds of the price buckets; the last bucket is open-ended.
+PRICE_BUCKETS = [Decimal(b) for b in ("25", "50", "100", "250", "500", "1000")]
+
+# Query params that change paging/sorting but not the matching set.
+NON_FILTER_PARAMS = {"cursor", "page_size", "ordering", "format"}
+
+
+def facets_cache_key(query_params, generation=""):
+    """Stable key for a filter selection: param order and repeated values don't matter."""
+    items = sorted(
+        (key, sorted(v for v in query_params.getlist(key) if v != ""))
+        for key in query_params
+        if key not in NON_FILTER_PARAMS
+    )
+    digest = hashlib.md5(urlencode(items, doseq=True).encode()).hexdigest()
+    return f"product-facets:{generation}:{digest}"
+
+
+def compute_facets(queryset):
+    """
+    Facet counts for the products matched by `queryset`.
+
+    The filtered queryset is used as an id subquery so M2M filters can't
+    double count. Each dimension is one GROUP BY, and the totals, price
+    buckets and stock state share a single conditional aggregate.
+    """
+    matched = Product.objects.filter(pk__in=queryset.order_by().values("pk")).order_by()
+
+    categories = (
+        matched.values("category_id", "category__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category__name")
+    )
+    brands = (
+        matched.filter(brand__isnull=False)
+        .values("brand_id", "brand__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "brand__name")
+    )
+    if bitmaps.is_enabled():
+        attributes = _attribute_counts_from_index(matched)
+    else:
+        attributes = [
+            {
+                "id": row["attributes__id"],
+                "attribute": row["attributes__attribute__name"],
+                "value": row["attributes__value"],
+                "count": row["count"],
+            }
+            for row in (
+                matched.filter(attributes__isnull=False)
+                .values("attributes__id", "attributes__attribute__name", "attributes__value")
+                .annotate(count=Count("id", distinct=True))
+                .order_by("attributes__attribute__name", "-count", "attributes__value")
+            )
+        ]
+
+    bounds = [Decimal("0")] + PRICE_BUCKETS + [None]
+    aggregates = {"total": Count("id")}
+    for i, (low, high) in enumerate(zip(bounds, bounds[1:])):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f"price_{i}"] = Count("id", filter=condition)
+    aggregates["in_stock"] = Count("id", filter=Q(qty__gt=0))
+    totals = matched.aggregate(**aggregates)
+
+    return {
+        "total": totals["total"],
+        "categories": [
+            {"id": row["category_id"], "name": row["category__name"], "count": row["count"]}
+            for row in categories
+        ],
+        "brands": [
+            {"id": row["brand_id"], "name": row["brand__name"], "count": row["count"]}
+            for row in brands
+        ],
+        "attributes": attributes,
+        "price": [
+            {
+                "min": str(low),
+                "max": str(high) if high is not None else None,
+                "count": totals[f"price_{i}"],
+            }
+            for i, (low, high) in enumerate(zip(bounds, bounds[1:]))
+        ],
+        "in_stock": {
+            "true": totals["in_stock"],
+            "false": totals["total"] - totals["in_stock"],
+        },
+    }
+
+
+def _attribute_counts_from_index(matched):
+    """Attribute value counts as bitmap intersections with the matched ids."""
+    candidates = bitmaps.Bitmap.from_ids(matched.values_list("pk", flat=True))
+    counts = bitmaps.attribute_index.counts(candidates)
+    values = AttributeValue.objects.filter(pk__in=counts).values_list("id", "attribute__name", "value")
+    rows = [
+        {"id": pk, "attribute": attribute, "value": value, "count": counts[pk]}
+        for pk, attribute, value in values
+    ]
+    rows.sort(key=lambda row: (row["attribute"], -row["count"], row["value"]))
+    return rows
+
+
+def get_facets(queryset, query_params):
+    # Keyed on the catalog generation so product changes invalidate facets too.
+    (generation,) = get_generations([CATALOG_GENERATION_KEY])
+    key = facets_cache_key(query_params, generation)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    return facets
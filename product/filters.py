@@ -1,15 +1,29 @@
 # products/filters.py
 import django_filters
-from .models import Product
+from django.conf import settings
+from rest_framework import filters
+from . import bitmaps
+from .categories import subtree_ids
+from .models import AttributeValue, Category, Product
+from .search import get_search_backend
 
 class ProductFilter(django_filters.FilterSet):
     price_min = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price_max = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     in_stock = django_filters.BooleanFilter(method="filter_in_stock")
+    # ?category_tree=<id>: products in the category or any of its subcategories.
+    category_tree = django_filters.ModelChoiceFilter(
+        queryset=Category.objects.all(), method="filter_category_tree"
+    )
+    # ?attributes=1&attributes=2: values of the same attribute are alternatives,
+    # different attributes must all match (Red or Blue, and size M).
+    attributes = django_filters.ModelMultipleChoiceFilter(
+        queryset=AttributeValue.objects.all(), method="filter_attributes"
+    )
 
     class Meta:
         model = Product
-        fields = ["category", "brand", "seller", "attributes", "price_min", "price_max", "in_stock"]
+        fields = ["category", "category_tree", "brand", "seller", "attributes", "price_min", "price_max", "in_stock"]
 
     def filter_in_stock(self, queryset, name, value):
         if value is True:
@@ -17,3 +31,48 @@ class ProductFilter(django_filters.FilterSet):
         if value is False:
             return queryset.filter(qty__lte=0)
         return queryset
+
+    def filter_category_tree(self, queryset, name, value):
+        return queryset.filter(category_id__in=subtree_ids(value.pk))
+
+    def filter_attributes(self, queryset, name, value):
+        if not value:
+            return queryset
+        groups = {}
+        for attribute_value in value:
+            groups.setdefault(attribute_value.attribute_id, set()).add(attribute_value.pk)
+        if bitmaps.is_enabled():
+            matched = bitmaps.attribute_index.match(groups.values())
+            # Each id is a bind parameter: past the limit the statement gets huge
+            # (and SQLite refuses it), so broad selections use the subqueries below.
+            if len(matched) <= settings.PRODUCT_ATTRIBUTE_BITMAP_MAX_IDS:
+                return queryset.filter(pk__in=list(matched))
+        # One id subquery per attribute; joins would multiply rows.
+        Through = Product.attributes.through
+        for value_ids in groups.values():
+            queryset = queryset.filter(
+                pk__in=Through.objects.filter(attributevalue_id__in=value_ids).values("product_id")
+            )
+        return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Same `?search=` parameter as DRF's SearchFilter, answered from the
+    full-text index instead of `LIKE '%term%'` scans.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, " ".join(terms))
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """Sort search results by relevance unless `?ordering=` is given explicitly."""
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and "search_rank" in queryset.query.annotations:
+            return ["-search_rank"]
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,146 @@
+# products/images.py
+"""
+Resized derivatives for ProductImage uploads.
+
+Saving an image only queues work. A dispatcher thread reads the original
+and hands the bytes to a process pool for the CPU-heavy resizing. It then
+writes the results next to the original through the default storage and
+records their names in `ProductImage.derivatives`. There is one dispatcher
+thread per pool worker, so every worker has an image to resize.
+
+`render_derivatives` runs in the pool's worker processes. Keep this module
+free of top-level Django model imports so those workers start without
+setting up Django.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+
+# Longest edge in pixels per derivative size.
+DERIVATIVE_SIZES = {"thumbnail": 200, "medium": 800}
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+_process_pool = None
+_dispatcher = None
+
+
+def render_derivatives(data, sizes):
+    """
+    Return {label: (bytes, extension)} with one derivative per size in the
+    source format and one in WebP (`<size>_webp`).
+    """
+    from PIL import Image, ImageOps
+
+    results = {}
+    with Image.open(BytesIO(data)) as source:
+        source_format = (source.format or "JPEG").upper()
+        image = ImageOps.exif_transpose(source)
+        for size_name, edge in sizes.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.LANCZOS)
+            for label, fmt in ((size_name, source_format), (f"{size_name}_webp", "WEBP")):
+                frame = resized
+                if fmt == "JPEG" and frame.mode not in ("RGB", "L"):
+                    frame = frame.convert("RGB")
+                buffer = BytesIO()
+                frame.save(buffer, fmt, quality=85, optimize=True)
+                results[label] = (buffer.getvalue(), EXTENSIONS.get(fmt, fmt.lower()))
+    return results
+
+
+def derivative_name(original_name, label, extension):
+    """products/12-shoe/photo.png -> products/12-shoe/photo_thumbnail.png"""
+    stem, _ = os.path.splitext(original_name)
+    size_name = label.removesuffix("_webp")
+    return f"{stem}_{size_name}.{extension}"
+
+
+def needs_derivatives(image):
+    """True when the stored derivatives don't belong to the current original."""
+    if not image.image:
+        return False
+    stem, _ = os.path.splitext(image.image.name)
+    expected = {label for size in DERIVATIVE_SIZES for label in (size, f"{size}_webp")}
+    names = image.derivatives or {}
+    return set(names) != expected or not all(n.startswith(stem + "_") for n in names.values())
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.PRODUCT_IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def _get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = ThreadPoolExecutor(
+            max_workers=settings.PRODUCT_IMAGE_PROCESS_WORKERS, thread_name_prefix="image-derivatives"
+        )
+    return _dispatcher
+
+
+def generate_derivatives(image_id):
+    """Build and store every derivative for one ProductImage."""
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    from .cache import invalidate_products
+    from .cards import refresh_cards_on_commit
+    from .models import ProductImage
+
+    image = ProductImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return {}
+
+    with image.image.open("rb") as f:
+        data = f.read()
+    if settings.PRODUCT_IMAGE_PROCESS_WORKERS:
+        rendered = _get_process_pool().submit(render_derivatives, data, DERIVATIVE_SIZES).result()
+    else:
+        rendered = render_derivatives(data, DERIVATIVE_SIZES)
+
+    delete_derivatives(image.derivatives)
+    derivatives, saved = {}, {}
+    for label, (content, extension) in rendered.items():
+        name = derivative_name(image.image.name, label, extension)
+        # A WebP original yields the same file name for both variants.
+        if name not in saved:
+            saved[name] = default_storage.save(name, ContentFile(content))
+        derivatives[label] = saved[name]
+
+    ProductImage.objects.filter(pk=image_id).update(derivatives=derivatives)
+    refresh_cards_on_commit([image.product_id])
+    invalidate_products([image.product_id])
+    return derivatives
+
+
+def _generate_in_background(image_id):
+    from django.db import connection
+
+    try:
+        generate_derivatives(image_id)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(image_id):
+    """Queue derivative generation; runs inline when the pool is disabled (0 workers)."""
+    if settings.PRODUCT_IMAGE_PROCESS_WORKERS:
+        _get_dispatcher().submit(_generate_in_background, image_id)
+    else:
+        generate_derivatives(image_id)
+
+
+def delete_derivatives(derivatives):
+    from django.core.files.storage import default_storage
+
+    for name in set((derivatives or {}).values()):
+        default_storage.delete(name)
@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.http import QueryDict
+
+from product.bulk import sync_bulk_created
+from product.filters import ProductFilter
+from product.models import AttributeValue, Brand, Category, Product
+
+BENCH_SELLER = "catalog-benchmark@example.com"
+BENCH_ROOT = "Bench root"
+BENCH_CATEGORIES = [f"Bench category {i}" for i in range(20)]
+BENCH_BRANDS = [f"Bench brand {i}" for i in range(10)]
+ORDERINGS = [["-created_at", "-id"], ["price", "id"], ["-price", "-id"]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Print EXPLAIN plans and timings of the product list query for every "
+        "ProductFilter/ordering combination. --seed adds a synthetic catalog "
+        "owned by a benchmark seller; run it against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Synthetic products to create first.")
+        parser.add_argument(
+            "--cleanup", action="store_true",
+            help="Delete the benchmark seller, its products, categories and brands, then exit.",
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query; the median is reported.")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            self._cleanup()
+            return
+        if options["seed"]:
+            self._seed(options["seed"], options["batch_size"])
+        if not Product.objects.exists():
+            raise CommandError("No products to benchmark; pass --seed N.")
+
+        for label, params in self._filter_cases():
+            for ordering in ORDERINGS:
+                queryset = ProductFilter(params, queryset=Product.objects.all()).qs
+                queryset = queryset.order_by(*ordering)[:options["page_size"]]
+                self._report(f"{label} | order by {', '.join(ordering)}", queryset, options["repeat"])
+
+    def _report(self, title, queryset, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            list(queryset.all())  # fresh clone, no result cache
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(f"  median {statistics.median(timings):.2f} ms over {len(timings)} runs")
+        for line in queryset.explain().splitlines():
+            self.stdout.write(f"  {line}")
+
+    def _filter_cases(self):
+        category = Category.objects.filter(products__isnull=False).first()
+        parent = Category.objects.filter(children__isnull=False).first() or category
+        brand = Brand.objects.filter(products__isnull=False).first()
+        seller_id = Product.objects.values_list("seller_id", flat=True).first()
+        # One value from each of two attributes, so the AND path is measured.
+        values = {}
+        for value in AttributeValue.objects.filter(products__isnull=False).distinct().order_by("id")[:50]:
+            values.setdefault(value.attribute_id, value)
+        values = list(values.values())[:2]
+
+        cases = [
+            ("no filter", {}),
+            ("category", {"category": category.pk}),
+            ("category_tree", {"category_tree": parent.pk}),
+            ("seller", {"seller": seller_id}),
+            ("in_stock", {"in_stock": "true"}),
+            ("price range", {"price_min": "10", "price_max": "100"}),
+            ("category + in_stock", {"category": category.pk, "in_stock": "true"}),
+        ]
+        if brand:
+            cases.append(("brand", {"brand": brand.pk}))
+        if values:
+            cases.append(("attributes", {"attributes": [v.pk for v in values]}))
+
+        for label, params in cases:
+            query = QueryDict(mutable=True)
+            for key, value in params.items():
+                query.setlist(key, [str(v) for v in value] if isinstance(value, list) else [str(value)])
+            yield label, query
+
+    def _cleanup(self):
+        User = get_user_model()
+        deleted = 0
+        with transaction.atomic():
+            # The seller's products go with it; subcategories before their root (PROTECT).
+            for queryset in (
+                User.objects.filter(email=BENCH_SELLER),
+                Category.objects.filter(name__in=BENCH_CATEGORIES),
+                Category.objects.filter(name=BENCH_ROOT),
+                Brand.objects.filter(name__in=BENCH_BRANDS),
+            ):
+                deleted += queryset.delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} benchmark rows."))
+
+    def _seed(self, count, batch_size):
+        User = get_user_model()
+        seller = User.objects.filter(email=BENCH_SELLER).first()
+        if seller is None:
+            seller = User.objects.create_user(email=BENCH_SELLER, full_name="Catalog Benchmark")
+
+        root = Category.objects.get_or_create(name=BENCH_ROOT)[0]
+        categories = [
+            Category.objects.get_or_create(name=name, defaults={"parent": root})[0] for name in BENCH_CATEGORIES
+        ]
+        brands = [Brand.objects.get_or_create(name=name)[0] for name in BENCH_BRANDS]
+        values = list(AttributeValue.objects.all()[:20])
+
+        rng = random.Random(42)
+        Through = Product.attributes.through
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            with transaction.atomic():
+                products = Product.objects.bulk_create([
+                    Product(
+                        name=f"Bench product {created + i}",
+                        price=Decimal(rng.randint(100, 100000)) / 100,
+                        qty=rng.choice([0, 0, 1, 5, 20]),
+                        category=rng.choice(categories),
+                        brand=rng.choice(brands + [None]),
+                        seller=seller,
+                    )
+                    for i in range(size)
+                ])
+                links = Through.objects.bulk_create([
+                    Through(product_id=product.pk, attributevalue_id=value.pk)
+                    for product in products
+                    for value in rng.sample(values, min(2, len(values)))
+                ])
+                sync_bulk_created(products, links)
+            created += size
+        self.stdout.write(self.style.SUCCESS(f"Seeded {created} products."))
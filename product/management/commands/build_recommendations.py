@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from product.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Fold Paid orders not counted yet into the frequently-bought-together recommendations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=settings.PRODUCT_RECOMMENDATIONS_TOP_K)
+        parser.add_argument("--batch-size", type=int, default=1000, help="Orders per counting batch.")
+        parser.add_argument("--full", action="store_true", help="Discard all counts and rebuild from every order.")
+
+    def handle(self, *args, **options):
+        result = build_recommendations(
+            top_k=options["top_k"], batch_size=options["batch_size"], full=options["full"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {result['orders']} orders, refreshed recommendations for {result['products']} products."
+        ))
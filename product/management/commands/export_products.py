@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from product.bulk import FILE_FORMATS, iter_export_lines
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalog to a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file, '-' for stdout.")
+        parser.add_argument("--file-format", choices=FILE_FORMATS, default="csv")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--seller", help="Only export products of the seller with this email.")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options["seller"]:
+            queryset = queryset.filter(seller__email=options["seller"])
+
+        lines = iter_export_lines(queryset, options["file_format"], chunk_size=options["chunk_size"])
+        if options["path"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["path"], "w", newline="") as out:
+            out.writelines(lines)
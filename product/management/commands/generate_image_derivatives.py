@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from product.images import generate_derivatives, needs_derivatives
+from product.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail/medium/WebP derivatives for product images that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Regenerate derivatives for every image, not only missing or outdated ones.",
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        for image in ProductImage.objects.order_by("id").iterator(chunk_size=500):
+            if options["force"] or needs_derivatives(image):
+                generate_derivatives(image.pk)
+                generated += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {generated} images."))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from product.bulk import FILE_FORMATS, ProductImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream-import products from a CSV or JSON Lines file for one seller."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument("--seller", required=True, help="Email of the seller who will own the products.")
+        parser.add_argument("--file-format", choices=FILE_FORMATS, help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=settings.PRODUCT_IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            seller = User.objects.get(email=options["seller"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['seller']}.")
+
+        file_format = options["file_format"] or detect_format(options["path"])
+        importer = ProductImporter(seller, batch_size=options["batch_size"])
+        with open(options["path"], "rb") as stream:
+            report = importer.run(iter_rows(stream, file_format))
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']} products, {report['error_count']} rows rejected."
+        ))
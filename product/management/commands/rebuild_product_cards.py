@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from product.cache import CATALOG_GENERATION_KEY, bump_generations
+from product.cards import rebuild_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ProductCard table from scratch in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_cards(batch_size=options["batch_size"])
+        bump_generations([CATALOG_GENERATION_KEY])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} product cards."))
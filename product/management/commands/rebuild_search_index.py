@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.cache import CATALOG_GENERATION_KEY, bump_generations
+from product.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Drop and rebuild the product full-text search index in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=2000,
+            help="Number of products written to the index per statement batch.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            total = backend.rebuild(batch_size=options["batch_size"])
+        bump_generations([CATALOG_GENERATION_KEY])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {total} products with {backend.__class__.__name__}."
+        ))
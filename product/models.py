@@ -55,11 +55,36 @@ class TimestampedModel(models.Model):
 class Category(TimestampedModel):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
+    # PROTECT: deleting a category must not take its subcategories and their products with it.
+    parent = models.ForeignKey(
+        "self", on_delete=models.PROTECT, null=True, blank=True, related_name="children"
+    )
 
     def __str__(self):
         return self.name
 
 
+class CategoryClosure(models.Model):
+    """
+    One row per (ancestor, descendant) pair, including each category with
+    itself at depth 0. `categories.py` maintains it from signals.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="uniq_category_closure_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"]),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 class Brand(TimestampedModel):
     name = models.CharField(max_length=255, unique=True)
 
@@ -104,12 +129,21 @@ class Product(TimestampedModel):
     attributes = models.ManyToManyField(AttributeValue, blank=True, related_name="products")
 
     class Meta:
+        # Shaped after the list queries: filter column first, then the
+        # keyset ordering (see KeysetCursorPagination). The leading columns
+        # also serve plain category/seller/brand lookups. Check changes
+        # with `manage.py benchmark_catalog_queries`.
         indexes = [
             models.Index(fields=["name"]),
-            models.Index(fields=["price"]),
-            models.Index(fields=["category"]),
-            models.Index(fields=["brand"]),
-            models.Index(fields=["seller"]),
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            models.Index(fields=["-created_at", "-id"], name="product_created_idx"),
+            models.Index(fields=["category", "-created_at", "-id"], name="product_category_created_idx"),
+            models.Index(fields=["category", "price", "id"], name="product_category_price_idx"),
+            models.Index(fields=["seller", "-created_at", "-id"], name="product_seller_created_idx"),
+            models.Index(fields=["brand", "price", "id"], name="product_brand_price_idx"),
+            models.Index(
+                fields=["-created_at", "-id"], condition=Q(qty__gt=0), name="product_in_stock_created_idx"
+            ),
         ]
 
     def __str__(self):
@@ -128,6 +162,8 @@ class ProductImage(TimestampedModel):
     name = models.CharField(max_length=255, blank=True)
     alternative_text = models.CharField(max_length=255, blank=True)
     is_primary = models.BooleanField(default=False)
+    # Storage names of resized copies keyed by label, e.g. {"thumbnail": ..., "medium_webp": ...}
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ["-is_primary", "id"]
@@ -146,6 +182,82 @@ class ProductImage(TimestampedModel):
 
 
 
+class ProductCard(models.Model):
+    """
+    Flat read model with one row per product, used to render product cards
+    without joins. `cards.py` keeps it in sync; don't write to it directly.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="card"
+    )
+    name = models.CharField(max_length=255)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    in_stock = models.BooleanField()
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=255)
+    brand_id = models.BigIntegerField(null=True)
+    brand_name = models.CharField(max_length=255, blank=True)
+    seller_id = models.BigIntegerField()
+    primary_image_path = models.CharField(max_length=500, blank=True)
+    # {"Color": ["Red", "Blue"], "Size": ["M"]}
+    attribute_summary = models.JSONField(default=dict)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "product"]),
+            models.Index(fields=["category_id", "-created_at"]),
+            models.Index(fields=["seller_id", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ProductCooccurrence(models.Model):
+    """
+    Number of orders that contained both products. Each pair is stored in
+    both directions so one product's row set is a single index range.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "other"], name="uniq_product_cooccurrence_pair"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} + {self.other_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Top products bought together with `product`, rebuilt by `build_recommendations`."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommendations")
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommended_in")
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="uniq_product_recommendation_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} (#{self.rank})"
+
+
+class RecommendationRun(models.Model):
+    """One row per `build_recommendations` run."""
+    orders_processed = models.PositiveIntegerField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Run of {self.orders_processed} orders at {self.finished_at}"
+
+
 class Wishlist(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="wishlists")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="wishlist")
@@ -0,0 +1,133 @@
+# products/pagination.py
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset pagination for catalog listings.
+
+    DRF's CursorPagination stores only the first ordering column in the cursor
+    and steps over ties with an OFFSET. Here the cursor stores every ordering
+    column and always ends on the primary key, so each page is one
+    `WHERE (a, id) < (x, y) ORDER BY a, id LIMIT n` query. There is no COUNT(*)
+    and no OFFSET, and pages stay stable while new rows are inserted.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        pk_name = queryset.model._meta.pk.name
+        ordering = [
+            o.replace("pk", pk_name) if o.lstrip("-") == "pk" else o
+            for o in super().get_ordering(request, queryset, view)
+        ]
+        if pk_name not in [o.lstrip("-") for o in ordering]:
+            # Tiebreaker follows the leading column so one index scan serves both.
+            prefix = "-" if ordering[0].startswith("-") else ""
+            ordering.append(prefix + pk_name)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._keyset_filter(queryset, ordering, position))
+
+        # Fetch one extra row to know whether another page follows.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip("-")
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
+
+    def _keyset_filter(self, queryset, ordering, position):
+        """
+        Build the row-value comparison `(a, b, id) > (x, y, z)` as
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)`,
+        flipping each comparison for descending columns.
+        """
+        values = self._decode_position(queryset, ordering, position)
+        names = [o.lstrip("-") for o in ordering]
+
+        condition = Q()
+        for i, order in enumerate(ordering):
+            lookup = "__lt" if order.startswith("-") else "__gt"
+            clause = Q(**dict(zip(names[:i], values[:i])))
+            clause &= Q(**{names[i] + lookup: values[i]})
+            condition |= clause
+        return condition
+
+    def _decode_position(self, queryset, ordering, position):
+        try:
+            raw = json.loads(position)
+            if not isinstance(raw, list) or len(raw) != len(ordering):
+                raise ValueError
+            return [
+                self._get_field(queryset, order.lstrip("-")).to_python(value)
+                for order, value in zip(ordering, raw)
+            ]
+        except (ValueError, TypeError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_field(self, queryset, name):
+        # Annotated sort keys (e.g. search relevance) carry their own output field.
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+
+class WishlistCursorPagination(KeysetCursorPagination):
+    ordering = ("-created", "-id")
+
+
+def _reverse_ordering(ordering):
+    return tuple(o[1:] if o.startswith("-") else "-" + o for o in ordering)
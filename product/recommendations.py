@@ -0,0 +1,96 @@
+# products/recommendations.py
+"""
+"Frequently bought together" recommendations from order co-occurrence.
+
+`build_recommendations` is an incremental batch job, run by the
+`build_recommendations` command. It reads only the Paid orders not counted
+yet and claims each one through `Order.recommendations_counted`, like the
+sales rollups do, so an order that commits after a later one is still
+picked up by the next run. For every pair of products in the same order it
+adds one to ProductCooccurrence. It then rewrites the top-K
+ProductRecommendation rows of the products it touched. Requests read
+those rows with one lookup on the (product, rank) index.
+"""
+from collections import Counter
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import ProductCooccurrence, ProductRecommendation, RecommendationRun
+
+
+def build_recommendations(top_k=10, batch_size=1000, full=False):
+    """Fold new Paid orders into the co-occurrence counts and refresh the affected top-K lists."""
+    from payments.models import Order, OrderItem
+
+    with transaction.atomic():
+        if full:
+            ProductCooccurrence.objects.all().delete()
+            ProductRecommendation.objects.all().delete()
+            RecommendationRun.objects.all().delete()
+            Order.objects.filter(recommendations_counted=True).update(recommendations_counted=False)
+        # Serializes runs: a second one waits here for this one to finish.
+        RecommendationRun.objects.select_for_update().order_by("-id").first()
+
+        touched, orders = set(), 0
+        while True:
+            order_ids = list(
+                Order.objects.select_for_update()
+                .filter(status="Paid", recommendations_counted=False)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not order_ids:
+                break
+            Order.objects.filter(pk__in=order_ids).update(recommendations_counted=True)
+            items = (
+                OrderItem.objects.filter(order_id__in=order_ids)
+                .order_by("order_id")
+                .values_list("order_id", "product_id")
+            )
+            counts = Counter()
+            for _, rows in groupby(items, key=itemgetter(0)):
+                products = sorted({product_id for _, product_id in rows})
+                for a, b in combinations(products, 2):
+                    counts[(a, b)] += 1
+                    counts[(b, a)] += 1
+                touched.update(products if len(products) > 1 else ())
+            _add_counts(counts)
+            orders += len(order_ids)
+
+        touched = sorted(touched)
+        for start in range(0, len(touched), batch_size):
+            _refresh_top(touched[start:start + batch_size], top_k)
+        RecommendationRun.objects.create(orders_processed=orders)
+    return {"orders": orders, "products": len(touched)}
+
+
+def _add_counts(counts):
+    if not counts:
+        return
+    existing = ProductCooccurrence.objects.filter(product_id__in={a for a, _ in counts})
+    for product_id, other_id, count in existing.values_list("product_id", "other_id", "count"):
+        if (product_id, other_id) in counts:
+            counts[(product_id, other_id)] += count
+    ProductCooccurrence.objects.bulk_create(
+        [ProductCooccurrence(product_id=a, other_id=b, count=count) for (a, b), count in counts.items()],
+        batch_size=1000, update_conflicts=True, unique_fields=["product", "other"], update_fields=["count"],
+    )
+
+
+def _refresh_top(product_ids, top_k):
+    top = (
+        ProductCooccurrence.objects.filter(product_id__in=product_ids)
+        .annotate(position=Window(RowNumber(), partition_by=F("product_id"), order_by=[F("count").desc(), F("other_id")]))
+        .filter(position__lte=top_k)
+        .values_list("product_id", "other_id", "count", "position")
+    )
+    rows = [
+        ProductRecommendation(product_id=product_id, recommended_id=other_id, score=count, rank=position)
+        for product_id, other_id, count, position in top
+    ]
+    ProductRecommendation.objects.filter(product_id__in=product_ids).delete()
+    ProductRecommendation.objects.bulk_create(rows, batch_size=1000)
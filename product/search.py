@@ -0,0 +1,199 @@
+# products/search.py
+"""
+Full-text search index for products.
+
+The index lives in its own table keyed by product id and is kept in sync by
+the Product signals in `signals.py`. SQLite uses an FTS5 virtual table and
+Postgres a tsvector column with a GIN index. Any other database falls back
+to the old `icontains` scan. In every backend the product name is weighted
+above the description.
+"""
+import re
+from functools import lru_cache
+
+from django.db import OperationalError, connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+SEARCH_TABLE = "product_search"
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(term):
+    return _TOKEN_RE.findall(term.lower())
+
+
+class BaseSearchBackend:
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def index_products(self, rows):
+        """rows: iterable of (id, name, description) tuples."""
+
+    def remove_products(self, ids):
+        pass
+
+    def search(self, queryset, term):
+        q = Q()
+        for token in tokenize(term):
+            q &= Q(name__icontains=token) | Q(description__icontains=token)
+        return queryset.filter(q)
+
+    def rebuild(self, batch_size=2000):
+        self.drop_index()
+        self.create_index()
+        rows = Product.objects.order_by().values_list("id", "name", "description")
+        batch, total = [], 0
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self.index_products(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index_products(batch)
+            total += len(batch)
+        return total
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 virtual table; rowid is the product id, bm25 weights name over description."""
+
+    def create_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+                "name, description, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+
+    def drop_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def index_products(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove_products(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(i,) for i in ids])
+
+    def search(self, queryset, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return queryset
+        match = " ".join(f'"{token}"*' for token in tokens)
+        product_table = connection.ops.quote_name(queryset.model._meta.db_table)
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match])
+        ).annotate(
+            # bm25() is lower-is-better; negate it so every backend sorts rank descending.
+            search_rank=RawSQL(
+                f"SELECT -bm25({SEARCH_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) "
+                f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"AND rowid = {product_table}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector (name 'A', description 'B') behind a GIN index."""
+
+    document_sql = (
+        "setweight(to_tsvector('english', coalesce(%s, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(%s, '')), 'B')"
+    )
+
+    def create_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                "product_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+    def drop_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+    def index_products(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+                f"VALUES (%s, {self.document_sql}) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+    def remove_products(self, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = ANY(%s)", [list(ids)])
+
+    def search(self, queryset, term):
+        tokens = tokenize(term)
+        if not tokens:
+            return queryset
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        product_table = connection.ops.quote_name(queryset.model._meta.db_table)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT product_id FROM {SEARCH_TABLE} "
+                "WHERE document @@ to_tsquery('english', %s)",
+                [tsquery],
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank(document, to_tsquery('english', %s)) FROM {SEARCH_TABLE} "
+                f"WHERE product_id = {product_table}.id",
+                [tsquery],
+                output_field=FloatField(),
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def _backend_for(vendor):
+    if vendor == "postgresql":
+        return PostgresSearchBackend()
+    if vendor == "sqlite" and _sqlite_has_fts5():
+        return SQLiteSearchBackend()
+    return BaseSearchBackend()
+
+
+def _sqlite_has_fts5():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            return bool(cursor.fetchone()[0])
+    except OperationalError:
+        return False
+
+
+def get_search_backend():
+    return _backend_for(connection.vendor)
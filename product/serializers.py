@@ -1,16 +1,59 @@
 # products/serializers.py
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import (
     Category, Brand, Attribute, AttributeValue,
-    Product, ProductImage, Wishlist
+    Product, ProductCard, ProductImage, Wishlist
 )
-from accounts.serializers import RegisterSerializer
+from .categories import is_descendant
+
+def _csv_param(request, name):
+    raw = request.query_params.get(name, "") if request else ""
+    return {part.strip() for part in raw.split(",") if part.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Lets read requests pick fields with `?fields=a,b` and opt into the
+    fields listed in `Meta.expandable_fields` with `?expand=x,y`.
+    Expandable fields are left out unless they are requested.
+    """
+
+    # Done in get_fields() rather than __init__ so nested use works too:
+    # a nested serializer only sees the request once it is bound.
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is None or request.method not in ("GET", "HEAD", "OPTIONS"):
+            return fields
+        requested = _csv_param(request, "fields")
+        expand = _csv_param(request, "expand")
+        expandable = set(getattr(self.Meta, "expandable_fields", ()))
+        for name in list(fields):
+            if name in expand:
+                continue
+            visible = name in requested if requested else name not in expandable
+            if not visible:
+                fields.pop(name)
+        return fields
+
 
 # --- Simple serializers ---
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ["id", "name", "description", "created_at", "updated_at"]
+        fields = ["id", "name", "description", "parent", "created_at", "updated_at"]
+
+    def validate_parent(self, value):
+        if value and self.instance and is_descendant(value.pk, self.instance.pk):
+            raise serializers.ValidationError("A category cannot be moved under itself or its subcategories.")
+        return value
+
+
+class CategoryTreeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    children = serializers.ListField(child=serializers.DictField())
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -41,11 +84,12 @@ class AttributeValueSerializer(serializers.ModelSerializer):
 # --- Product Image ---
 class ProductImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
         fields = [
-            "id", "product", "image", "image_url",
+            "id", "product", "image", "image_url", "srcset",
             "name", "alternative_text", "is_primary",
             "created_at", "updated_at"
         ]
@@ -57,9 +101,18 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_srcset(self, obj):
+        """{"thumbnail": url, "thumbnail_webp": url, "medium": url, ...}; empty until generated."""
+        return {label: _storage_url(name, self.context.get("request")) for label, name in obj.derivatives.items()}
+
+
+def _storage_url(name, request=None):
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
 
 # --- Product ---
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     # Read-only nested objects
     category = CategorySerializer(read_only=True)
     brand = BrandSerializer(read_only=True)
@@ -108,12 +161,150 @@ class ProductSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class ProductCardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Lightweight representation for product grids. Card fields come from the
+    denormalized ProductCard row (joined via `select_related("card")`);
+    nested objects are only included through `?expand=`.
+    """
+    category_name = serializers.SerializerMethodField()
+    brand_name = serializers.SerializerMethodField()
+    in_stock = serializers.BooleanField(read_only=True)
+    primary_image = serializers.SerializerMethodField()
+    attribute_summary = serializers.SerializerMethodField()
+    # Annotated by ProductViewSet with an Exists() subquery.
+    is_wishlisted = serializers.BooleanField(read_only=True)
+
+    category = CategorySerializer(read_only=True)
+    brand = BrandSerializer(read_only=True)
+    attributes = AttributeValueSerializer(many=True, read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+    seller = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            "id", "name", "price", "in_stock", "primary_image",
+            "category_name", "brand_name", "attribute_summary", "is_wishlisted",
+            "description", "qty", "seller",
+            "category", "brand", "attributes", "images",
+            "created_at", "updated_at",
+        ]
+        expandable_fields = [
+            "attribute_summary", "description", "qty", "seller",
+            "category", "brand", "attributes", "images",
+            "created_at", "updated_at",
+        ]
+        read_only_fields = fields
+
+    # A product saved moments ago may not have its card yet; fall back to
+    # the relations so the response is still complete.
+    def _card(self, obj):
+        try:
+            return obj.card
+        except ProductCard.DoesNotExist:
+            return None
+
+    def get_category_name(self, obj):
+        card = self._card(obj)
+        return card.category_name if card else obj.category.name
+
+    def get_brand_name(self, obj):
+        card = self._card(obj)
+        if card:
+            return card.brand_name or None
+        return obj.brand.name if obj.brand else None
+
+    def get_attribute_summary(self, obj):
+        card = self._card(obj)
+        if card:
+            return card.attribute_summary
+        summary = {}
+        for value in obj.attributes.all():
+            summary.setdefault(value.attribute.name, []).append(value.value)
+        return summary
+
+    def get_primary_image(self, obj):
+        card = self._card(obj)
+        if card:
+            name = card.primary_image_path
+        else:
+            image = next((i for i in obj.images.all() if i.is_primary), None)
+            name = image.derivatives.get("thumbnail", image.image.name) if image else ""
+        return _storage_url(name, self.context.get("request")) if name else None
+
+
+class AutocompleteSuggestionSerializer(serializers.Serializer):
+    text = serializers.CharField()
+    type = serializers.ChoiceField(choices=["category", "brand", "product"])
+    id = serializers.IntegerField()
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk import. Related objects are given by name
+    and resolved in batches by `bulk.LookupCache`, so validation runs no queries.
+    """
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    qty = serializers.IntegerField(required=False, min_value=0, default=0)
+    category = serializers.CharField(max_length=255)
+    brand = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+    attributes = serializers.ListField(
+        child=serializers.RegexField(r"^[^:]+:.+$", error_messages={"invalid": "Use 'Attribute:Value'."}),
+        required=False, default=list,
+    )
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Price must be greater than 0.")
+        return value
+
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    qty = serializers.IntegerField(required=False, min_value=0)
+    qty_delta = serializers.IntegerField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+
+    def validate_price(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Price must be greater than 0.")
+        return value
+
+    def validate(self, attrs):
+        if "qty" in attrs and "qty_delta" in attrs:
+            raise serializers.ValidationError("Send either qty or qty_delta, not both.")
+        if not {"qty", "qty_delta", "price"} & attrs.keys():
+            raise serializers.ValidationError("Nothing to update: send qty, qty_delta or price.")
+        return attrs
+
+
+class ProductBulkUpdateSerializer(serializers.ListSerializer):
+    child = ProductBulkUpdateItemSerializer()
+
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each product id may appear only once.")
+        return attrs
+
+
+class WishlistProductCardSerializer(ProductCardSerializer):
+    class Meta(ProductCardSerializer.Meta):
+        fields = [name for name in ProductCardSerializer.Meta.fields if name != "is_wishlisted"]
+        read_only_fields = fields
+
+
 class WishlistSerializer(serializers.ModelSerializer):
-    user = RegisterSerializer(read_only=True)  # updated when user model is already there
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all()
     )
+    product_card = WishlistProductCardSerializer(source="product", read_only=True)
+
     class Meta:
-        model = Wishlist 
-        fields = ["id", "user", "product", "created"]
+        model = Wishlist
+        fields = ["id", "user", "product", "product_card", "created"]
 
@@ -0,0 +1,175 @@
+# products/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .autocomplete import record_changes_on_commit as record_autocomplete_changes
+from .bitmaps import is_enabled as bitmap_index_enabled, record_changes_on_commit
+from .cache import invalidate_products, invalidate_wishlist
+from .cards import refresh_cards_on_commit, rename_brand, rename_category
+from .categories import invalidate_tree, sync_closure
+from .images import delete_derivatives, needs_derivatives, schedule_derivatives
+from .models import Attribute, AttributeValue, Brand, Category, Product, ProductImage, Wishlist
+from .search import get_search_backend
+
+
+# ---- Search index ----
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_products([(instance.id, instance.name, instance.description)])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.id])
+
+
+# ---- Image derivatives ----
+@receiver(post_save, sender=ProductImage)
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or not needs_derivatives(instance):
+        return
+    transaction.on_commit(lambda: schedule_derivatives(instance.pk))
+
+
+@receiver(post_delete, sender=ProductImage)
+def remove_image_derivatives(sender, instance, **kwargs):
+    derivatives = instance.derivatives
+    transaction.on_commit(lambda: delete_derivatives(derivatives))
+
+
+# ---- Category hierarchy ----
+@receiver(post_save, sender=Category)
+def category_tree_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        sync_closure(instance, created=created)
+    invalidate_tree()
+
+
+@receiver(post_delete, sender=Category)
+def category_tree_deleted(sender, instance, **kwargs):
+    invalidate_tree()
+
+
+# ---- Response cache and product cards ----
+def _products_changed(product_ids):
+    # Cards are refreshed before the cache generation moves on, so a
+    # recomputed response can't pick up a stale card.
+    product_ids = set(product_ids)
+    refresh_cards_on_commit(product_ids)
+    invalidate_products(product_ids)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _products_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # The card row goes with the product (CASCADE).
+    invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    _products_changed([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    rename_category(instance)
+    invalidate_products(Product.objects.filter(category_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    invalidate_products(Product.objects.filter(category_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, **kwargs):
+    rename_brand(instance)
+    invalidate_products(Product.objects.filter(brand_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+def brand_deleted(sender, instance, **kwargs):
+    # SET_NULL on products is a bulk UPDATE that sends no signals.
+    _products_changed(Product.objects.filter(brand_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=AttributeValue)
+@receiver(pre_delete, sender=AttributeValue)
+def attribute_value_changed(sender, instance, **kwargs):
+    _products_changed(instance.products.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Attribute)
+def attribute_saved(sender, instance, **kwargs):
+    _products_changed(Product.objects.filter(attributes__attribute=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def wishlist_changed(sender, instance, **kwargs):
+    invalidate_wishlist(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Product.attributes.through)
+def product_attributes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _products_changed([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        _products_changed(pk_set)
+    elif action == "pre_clear":
+        _products_changed(instance.products.values_list("id", flat=True))
+
+
+# ---- Attribute bitmap index ----
+@receiver(m2m_changed, sender=Product.attributes.through)
+def index_product_attributes(sender, instance, action, reverse, pk_set, **kwargs):
+    if not bitmap_index_enabled():
+        return
+    if action == "pre_clear":
+        related = instance.products if reverse else instance.attributes
+        pk_set = set(related.values_list("id", flat=True))
+        action = "post_remove"
+    if action not in ("post_add", "post_remove"):
+        return
+    pairs = [(pk, instance.pk) for pk in pk_set] if not reverse else [(instance.pk, pk) for pk in pk_set]
+    if action == "post_add":
+        record_changes_on_commit(links=pairs)
+    else:
+        record_changes_on_commit(unlinks=pairs)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_attributes(sender, instance, **kwargs):
+    record_changes_on_commit(products=[instance.pk])
+
+
+@receiver(post_delete, sender=AttributeValue)
+def unindex_attribute_value(sender, instance, **kwargs):
+    record_changes_on_commit(values=[instance.pk])
+
+
+# ---- Autocomplete ----
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def autocomplete_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_autocomplete_changes(sender._meta.model_name, updated=[(instance.pk, instance.name)])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Category)
+def autocomplete_deleted(sender, instance, **kwargs):
+    record_autocomplete_changes(sender._meta.model_name, removed=[instance.pk])
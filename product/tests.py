@@ -1,3 +1,900 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from payments.models import Order, OrderItem
+
+from . import images
+from .autocomplete import PrefixIndex, autocomplete_index
+from .bitmaps import Bitmap
+from .bulk import apply_bulk_updates
+from .facets import facets_cache_key
+from .filters import ProductFilter
+from .images import generate_derivatives
+from .models import (
+    Attribute, AttributeValue, Brand, Category, CategoryClosure, Product, ProductCard, ProductCooccurrence,
+    ProductImage, ProductRecommendation, Wishlist,
+)
+from .search import get_search_backend
+from .serializers import CategorySerializer
+
+User = get_user_model()
+
+
+class ProductPaginationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Electronics")
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                price=Decimal("10.00") * (i % 3 + 1),
+                qty=5,
+                seller=self.seller,
+                category=self.category,
+            )
+            for i in range(7)
+        ]
+        self.url = reverse("product-list")
+
+    def _collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            ids.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_pages_cover_catalog_once(self):
+        ids = self._collect_ids(self.url + "?page_size=3")
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.created_at, p.id), reverse=True)]
+        self.assertEqual(ids, expected)
+
+    def test_ordering_by_price_breaks_ties_on_id(self):
+        ids = self._collect_ids(self.url + "?page_size=2&ordering=price")
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]
+        self.assertEqual(ids, expected)
+
+    def test_cursor_is_stable_across_inserts(self):
+        response = self.client.get(self.url + "?page_size=3")
+        first_page = [item["id"] for item in response.data["results"]]
+        Product.objects.create(name="New", price=Decimal("1.00"), seller=self.seller, category=self.category)
+
+        second = self.client.get(response.data["next"])
+        second_page = [item["id"] for item in second.data["results"]]
+        self.assertFalse(set(first_page) & set(second_page))
+
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual([item["id"] for item in previous.data["results"]], first_page)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url + "?cursor=bogus")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Audio")
+        self.in_description = Product.objects.create(
+            name="Speaker", description="Pairs well with wireless headphones",
+            price=Decimal("40.00"), seller=self.seller, category=self.category,
+        )
+        self.in_name = Product.objects.create(
+            name="Wireless Headphones", description="Over-ear",
+            price=Decimal("80.00"), seller=self.seller, category=self.category,
+        )
+        Product.objects.create(name="Cable", price=Decimal("5.00"), seller=self.seller, category=self.category)
+        self.url = reverse("product-list")
+
+    def _search(self, term):
+        response = self.client.get(self.url, {"search": term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_name_matches_rank_above_description(self):
+        self.assertEqual(self._search("headphones"), [self.in_name.id, self.in_description.id])
+
+    def test_prefix_terms_match(self):
+        self.assertEqual(self._search("wirel head"), [self.in_name.id, self.in_description.id])
+
+    def test_index_follows_save_and_delete(self):
+        self.in_name.name = "Studio Monitors"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_name.save()
+        self.assertEqual(self._search("monitors"), [self.in_name.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.in_name.delete()
+        self.assertEqual(self._search("monitors"), [])
+
+    def test_search_results_paginate_by_relevance(self):
+        first = self.client.get(self.url, {"search": "headphones", "page_size": 1})
+        second = self.client.get(first.data["next"])
+        self.assertEqual(first.data["results"][0]["id"], self.in_name.id)
+        self.assertEqual(second.data["results"][0]["id"], self.in_description.id)
+        self.assertIsNone(second.data["next"])
+
+    def test_rebuild_command_restores_index(self):
+        get_search_backend().drop_index()
+        get_search_backend().create_index()
+        self.assertEqual(self._search("headphones"), [])
+        call_command("rebuild_search_index", batch_size=2, stdout=StringIO())
+        self.assertEqual(self._search("headphones"), [self.in_name.id, self.in_description.id])
+
+
+class ProductFacetsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.phones = Category.objects.create(name="Phones")
+        self.laptops = Category.objects.create(name="Laptops")
+        self.brand = Brand.objects.create(name="Acme")
+        color = Attribute.objects.create(name="Color")
+        self.red = AttributeValue.objects.create(attribute=color, value="Red")
+        self.blue = AttributeValue.objects.create(attribute=color, value="Blue")
+
+        phone = Product.objects.create(
+            name="Phone", price=Decimal("20.00"), qty=3, seller=self.seller, category=self.phones, brand=self.brand
+        )
+        phone.attributes.set([self.red, self.blue])
+        Product.objects.create(name="Cheap phone", price=Decimal("10.00"), qty=0, seller=self.seller, category=self.phones)
+        laptop = Product.objects.create(name="Laptop", price=Decimal("900.00"), qty=1, seller=self.seller, category=self.laptops)
+        laptop.attributes.set([self.red])
+        self.url = reverse("product-facets")
+
+    def test_counts_every_dimension(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(
+            {c["name"]: c["count"] for c in data["categories"]}, {"Phones": 2, "Laptops": 1}
+        )
+        self.assertEqual(data["brands"], [{"id": self.brand.id, "name": "Acme", "count": 1}])
+        self.assertEqual({a["value"]: a["count"] for a in data["attributes"]}, {"Red": 2, "Blue": 1})
+        self.assertEqual(data["price"][0], {"min": "0", "max": "25", "count": 2})
+        self.assertEqual(data["price"][-1]["count"], 0)
+        self.assertEqual(data["in_stock"], {"true": 2, "false": 1})
+
+    def test_counts_follow_filter_selection(self):
+        response = self.client.get(self.url, {"attributes": [self.red.id, self.blue.id], "in_stock": "true"})
+        data = response.data
+        # The phone matches both selected values but is counted once.
+        self.assertEqual(data["total"], 2)
+        self.assertEqual({c["name"]: c["count"] for c in data["categories"]}, {"Phones": 1, "Laptops": 1})
+
+    def test_cache_key_ignores_param_order_and_paging(self):
+        first = QueryDict("category=1&brand=2&cursor=abc")
+        second = QueryDict("brand=2&category=1&ordering=price")
+        self.assertEqual(facets_cache_key(first), facets_cache_key(second))
+        self.assertNotEqual(facets_cache_key(first), facets_cache_key(QueryDict("category=2")))
+
+
+class ProductResponseCacheTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Garden")
+        color = Attribute.objects.create(name="Color")
+        self.green = AttributeValue.objects.create(attribute=color, value="Green")
+        self.product = Product.objects.create(
+            name="Hose", price=Decimal("12.00"), qty=4, seller=self.seller, category=self.category
+        )
+        self.list_url = reverse("product-list")
+        self.detail_url = reverse("product-detail", args=[self.product.id])
+
+    def test_second_read_is_served_without_queries(self):
+        self.assertEqual(self.client.get(self.list_url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["results"][0]["name"], "Hose")
+
+    def test_product_save_invalidates_list_and_detail(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        self.product.name = "Garden hose"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(self.list_url).data["results"][0]["name"], "Garden hose")
+        self.assertEqual(self.client.get(self.detail_url).data["name"], "Garden hose")
+
+    def test_related_changes_invalidate_detail(self):
+        self.client.get(self.detail_url)
+        self.category.name = "Outdoor"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(self.client.get(self.detail_url).data["category"]["name"], "Outdoor")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.attributes.add(self.green)
+        self.assertEqual(len(self.client.get(self.detail_url).data["attributes"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.green.delete()
+        self.assertEqual(self.client.get(self.detail_url).data["attributes"], [])
+
+    def test_stale_entry_served_while_another_worker_recomputes(self):
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Rake", price=Decimal("9.00"), seller=self.seller, category=self.category)
+        # Simulate the recompute lock being held by another worker.
+        with patch("product.cache.cache.add", return_value=False):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+class ProductRepresentationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Shoes")
+        self.brand = Brand.objects.create(name="Stride")
+        size = Attribute.objects.create(name="Size")
+        self.values = [AttributeValue.objects.create(attribute=size, value=str(n)) for n in range(40, 44)]
+        self.url = reverse("product-list")
+
+    def _create_products(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                product = Product.objects.create(
+                    name=f"Runner {i}", price=Decimal("50.00"), qty=1,
+                    seller=self.seller, category=self.category, brand=self.brand,
+                )
+                product.attributes.set(self.values)
+
+    def test_list_returns_cards(self):
+        self._create_products(1)
+        card = self.client.get(self.url).data["results"][0]
+        self.assertEqual(
+            set(card),
+            {"id", "name", "price", "in_stock", "primary_image", "category_name", "brand_name", "is_wishlisted"},
+        )
+        self.assertEqual(card["category_name"], "Shoes")
+        self.assertEqual(card["brand_name"], "Stride")
+
+    def test_fields_and_expand_select_output(self):
+        self._create_products(1)
+        card = self.client.get(self.url, {"fields": "id,name", "expand": "attributes"}).data["results"][0]
+        self.assertEqual(set(card), {"id", "name", "attributes"})
+        self.assertEqual(card["attributes"][0]["attribute"]["name"], "Size")
+
+    def test_query_count_does_not_grow_with_page(self):
+        self._create_products(2)
+        # products joined to their cards + attribute values (with their attribute joined)
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"expand": "attributes"})
+        cache.clear()
+        self._create_products(5)
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"expand": "attributes"})
+
+    def test_detail_keeps_full_representation(self):
+        self._create_products(1)
+        product = Product.objects.get()
+        data = self.client.get(reverse("product-detail", args=[product.id])).data
+        self.assertIn("description", data)
+        self.assertEqual(len(data["attributes"]), 4)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PRODUCT_IMAGE_PROCESS_WORKERS=0)
+class ProductImageDerivativesTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Art")
+        self.product = Product.objects.create(name="Poster", price=Decimal("15.00"), seller=self.seller, category=category)
+
+    def _upload(self, size=(1600, 1200)):
+        buffer = BytesIO()
+        Image.new("RGB", size, "red").save(buffer, "PNG")
+        upload = SimpleUploadedFile("poster.png", buffer.getvalue(), content_type="image/png")
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(product=self.product, image=upload, is_primary=True)
+
+    def test_derivatives_are_stored_next_to_original(self):
+        image = self._upload()
+        image.refresh_from_db()
+        self.assertEqual(set(image.derivatives), {"thumbnail", "thumbnail_webp", "medium", "medium_webp"})
+        folder = image.image.name.rsplit("/", 1)[0]
+        for name in image.derivatives.values():
+            self.assertTrue(name.startswith(folder + "/"))
+            self.assertTrue(default_storage.exists(name))
+        with default_storage.open(image.derivatives["thumbnail_webp"]) as f:
+            thumbnail = Image.open(f)
+            self.assertEqual(thumbnail.format, "WEBP")
+            self.assertEqual(max(thumbnail.size), 200)
+
+    def test_serializers_expose_srcset_and_thumbnail(self):
+        image = self._upload()
+        image.refresh_from_db()
+        data = self.client.get(reverse("product-detail", args=[self.product.id])).data
+        self.assertEqual(set(data["images"][0]["srcset"]), set(image.derivatives))
+        card = self.client.get(reverse("product-list")).data["results"][0]
+        self.assertTrue(card["primary_image"].endswith(image.derivatives["thumbnail"]))
+
+    def test_delete_removes_derivatives(self):
+        image = self._upload()
+        image.refresh_from_db()
+        names = list(image.derivatives.values())
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    @override_settings(PRODUCT_IMAGE_PROCESS_WORKERS=1)
+    def test_process_pool_renders_derivatives(self):
+        image = self._upload()
+        ProductImage.objects.filter(pk=image.pk).update(derivatives={})
+        derivatives = generate_derivatives(image.pk)
+        self.assertEqual(len(derivatives), 4)
+
+    @override_settings(PRODUCT_IMAGE_PROCESS_WORKERS=2)
+    def test_dispatcher_keeps_every_pool_worker_busy(self):
+        both_running = threading.Barrier(2, timeout=5)
+        started = []
+
+        def render(image_id):
+            started.append(image_id)
+            both_running.wait()
+
+        with patch.object(images, "_dispatcher", None), patch.object(images, "generate_derivatives", render):
+            images.schedule_derivatives(1)
+            images.schedule_derivatives(2)
+            images._dispatcher.shutdown(wait=True)
+        self.assertEqual(sorted(started), [1, 2])
+        self.assertFalse(both_running.broken)
+
+
+class ProductBulkImportExportTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Kitchen")
+        self.brand = Brand.objects.create(name="Chef")
+        color = Attribute.objects.create(name="Color")
+        self.black = AttributeValue.objects.create(attribute=color, value="Black")
+        self.import_url = reverse("product-bulk-import")
+        self.export_url = reverse("product-bulk-export")
+
+    def _upload(self, name, content, **extra):
+        self.client.force_authenticate(self.seller)
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(self.import_url, {"file": upload, **extra}, format="multipart")
+
+    def test_csv_import_creates_products_and_reports_bad_rows(self):
+        content = (
+            "name,description,price,qty,category,brand,attributes\n"
+            "Pan,Non-stick,25.00,3,Kitchen,Chef,Color:Black\n"
+            "Pot,,0,1,Kitchen,,\n"
+            "Knife,,12.50,2,Garage,,\n"
+            "Lid,,4.00,,Kitchen,,\n"
+        )
+        with self.assertNumQueries(9):
+            response = self._upload("products.csv", content, batch_size=10)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual([e["row"] for e in response.data["errors"]], [3, 4])
+        self.assertIn("price", response.data["errors"][0]["errors"])
+        self.assertIn("category", response.data["errors"][1]["errors"])
+
+        pan = Product.objects.get(name="Pan")
+        self.assertEqual(pan.seller, self.seller)
+        self.assertEqual(pan.brand, self.brand)
+        self.assertEqual(list(pan.attributes.all()), [self.black])
+        self.assertEqual(get_search_backend().search(Product.objects.all(), "non-stick").get(), pan)
+
+    def test_jsonl_import_in_small_batches(self):
+        lines = [
+            '{"name": "Cup %d", "price": "3.00", "category": "Kitchen", "attributes": {"Color": "Black"}}' % i
+            for i in range(5)
+        ]
+        response = self._upload("cups.jsonl", "\n".join(lines + ["not json"]), batch_size=2)
+        self.assertEqual(response.data["created"], 5)
+        self.assertEqual(response.data["errors"], [{"row": 6, "errors": {"row": ["Invalid JSON."]}}])
+        self.assertEqual(Product.attributes.through.objects.count(), 5)
+
+    def test_export_streams_every_product(self):
+        for i in range(3):
+            product = Product.objects.create(
+                name=f"Bowl {i}", price=Decimal("8.00"), qty=i, seller=self.seller,
+                category=self.category, brand=self.brand,
+            )
+            product.attributes.add(self.black)
+
+        response = self.client.get(self.export_url, {"file_format": "jsonl"})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([r["name"] for r in rows], ["Bowl 0", "Bowl 1", "Bowl 2"])
+        self.assertEqual(rows[0]["attributes"], ["Color:Black"])
+
+        self.assertNotIn("id", rows[0])
+
+        csv_body = b"".join(self.client.get(self.export_url).streaming_content).decode()
+        self.assertEqual(csv_body.splitlines()[0], "name,description,price,qty,category,brand,attributes")
+        self.assertEqual(csv_body.splitlines()[1].split(",")[-1], "Color:Black")
+
+    def test_export_output_reimports(self):
+        Product.objects.create(name="Tray", price=Decimal("6.00"), seller=self.seller, category=self.category)
+        out = StringIO()
+        call_command("export_products", stdout=out)
+        response = self._upload("again.csv", out.getvalue())
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(Product.objects.filter(name="Tray").count(), 2)
+
+
+class ProductBulkUpdateTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.other = User.objects.create_user(email="other@example.com", full_name="Other", password="testpass")
+        category = Category.objects.create(name="Tools")
+        self.hammer = Product.objects.create(name="Hammer", price=Decimal("9.00"), qty=10, seller=self.seller, category=category)
+        self.saw = Product.objects.create(name="Saw", price=Decimal("19.00"), qty=4, seller=self.seller, category=category)
+        self.drill = Product.objects.create(name="Drill", price=Decimal("60.00"), qty=1, seller=self.other, category=category)
+        self.url = reverse("product-bulk-update")
+        self.client.force_authenticate(self.seller)
+
+    def test_applies_absolute_delta_and_price_in_one_update(self):
+        payload = [
+            {"id": self.hammer.id, "qty": 3, "price": "8.50"},
+            {"id": self.saw.id, "qty_delta": -2},
+        ]
+        # ownership check + savepoint + UPDATE + release
+        with self.assertNumQueries(4):
+            response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 2, "errors": []})
+        self.hammer.refresh_from_db()
+        self.saw.refresh_from_db()
+        self.assertEqual((self.hammer.qty, self.hammer.price), (3, Decimal("8.50")))
+        self.assertEqual((self.saw.qty, self.saw.price), (2, Decimal("19.00")))
+
+    def test_rejects_products_of_other_sellers(self):
+        response = self.client.patch(self.url, [{"id": self.drill.id, "qty": 0}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data["ids"], [self.drill.id])
+        self.drill.refresh_from_db()
+        self.assertEqual(self.drill.qty, 1)
+
+    def test_update_is_scoped_to_the_seller(self):
+        report = apply_bulk_updates([{"id": self.hammer.id, "qty": 2}, {"id": self.drill.id, "qty": 0}], self.seller)
+        self.assertEqual(report, {"updated": 1, "errors": []})
+        self.hammer.refresh_from_db()
+        self.drill.refresh_from_db()
+        self.assertEqual(self.hammer.qty, 2)
+        self.assertEqual(self.drill.qty, 1)
+
+    def test_negative_stock_rolls_back_batch(self):
+        payload = [{"id": self.hammer.id, "qty": 7}, {"id": self.saw.id, "qty_delta": -5}]
+        response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(self.saw.id, response.data["errors"][0]["errors"])
+        self.hammer.refresh_from_db()
+        self.assertEqual(self.hammer.qty, 10)
+
+    def test_validates_items(self):
+        payload = [{"id": self.hammer.id, "qty": 1, "qty_delta": 1}, {"id": self.hammer.id, "price": "1.00"}]
+        response = self.client.patch(self.url, payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductCardReadModelTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.category = Category.objects.create(name="Bags")
+        self.brand = Brand.objects.create(name="Carry")
+        material = Attribute.objects.create(name="Material")
+        self.leather = AttributeValue.objects.create(attribute=material, value="Leather")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name="Tote", price=Decimal("70.00"), qty=2,
+                seller=self.seller, category=self.category, brand=self.brand,
+            )
+            self.product.attributes.add(self.leather)
+
+    def test_card_is_built_from_signals(self):
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual(
+            (card.name, card.category_name, card.brand_name, card.in_stock),
+            ("Tote", "Bags", "Carry", True),
+        )
+        self.assertEqual(card.attribute_summary, {"Material": ["Leather"]})
+
+    def test_card_follows_related_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Handbags"
+            self.category.save()
+            self.product.qty = 0
+            self.product.save()
+            self.brand.delete()
+        card = ProductCard.objects.get(product=self.product)
+        self.assertEqual((card.category_name, card.brand_name, card.in_stock), ("Handbags", "", False))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertFalse(ProductCard.objects.exists())
+
+    def test_rebuild_command(self):
+        ProductCard.objects.all().delete()
+        call_command("rebuild_product_cards", batch_size=1, stdout=StringIO())
+        self.assertEqual(ProductCard.objects.get().brand_name, "Carry")
+
+    def test_list_reads_cards_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("product-list"), {"expand": "attribute_summary"})
+        card = response.data["results"][0]
+        self.assertEqual(card["brand_name"], "Carry")
+        self.assertEqual(card["attribute_summary"], {"Material": ["Leather"]})
+
+
+class ProductAttributeBitmapIndexTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Shirts")
+        color = Attribute.objects.create(name="Color")
+        size = Attribute.objects.create(name="Size")
+        self.red = AttributeValue.objects.create(attribute=color, value="Red")
+        self.blue = AttributeValue.objects.create(attribute=color, value="Blue")
+        self.medium = AttributeValue.objects.create(attribute=size, value="M")
+        self.products = {}
+        for name, values in (("Red M", [self.red, self.medium]), ("Blue M", [self.blue, self.medium]), ("Red", [self.red])):
+            product = Product.objects.create(
+                name=name, price=Decimal("15.00"), qty=1, seller=self.seller, category=category
+            )
+            product.attributes.set(values)
+            self.products[name] = product
+        self.url = reverse("product-list")
+
+    def _names(self, values):
+        response = self.client.get(self.url, {"attributes": [v.id for v in values]})
+        return {card["name"] for card in response.data["results"]}
+
+    def test_bitmap_set_operations(self):
+        first = Bitmap.from_ids([1, 5, 70000, 140000])
+        second = Bitmap.from_ids([5, 70000, 3])
+        self.assertEqual(list(first & second), [5, 70000])
+        self.assertEqual(list(first | second), [1, 3, 5, 70000, 140000])
+        first.difference_update([70000, 140000])
+        self.assertEqual((list(first), len(first)), ([1, 5], 2))
+
+    def test_same_results_with_and_without_index(self):
+        selections = [[], [self.red], [self.red, self.blue], [self.red, self.medium], [self.red, self.blue, self.medium]]
+        expected = [{"Red M", "Blue M", "Red"}, {"Red M", "Red"}, {"Red M", "Blue M", "Red"}, {"Red M"}, {"Red M", "Blue M"}]
+        for enabled in (False, True):
+            with self.subTest(enabled=enabled), override_settings(PRODUCT_ATTRIBUTE_BITMAP_INDEX=enabled):
+                cache.clear()
+                self.assertEqual([self._names(values) for values in selections], expected)
+
+    @override_settings(PRODUCT_ATTRIBUTE_BITMAP_INDEX=True, PRODUCT_ATTRIBUTE_BITMAP_MAX_IDS=1)
+    def test_broad_selection_is_not_sent_as_an_id_list(self):
+        def sql(value):
+            return str(ProductFilter(QueryDict(f"attributes={value.id}"), queryset=Product.objects.all()).qs.query)
+
+        self.assertIn("attributevalue_id", sql(self.red))  # 2 products: subquery
+        self.assertNotIn("attributevalue_id", sql(self.blue))  # 1 product: id list
+        self.assertEqual(self._names([self.red]), {"Red M", "Red"})
+        self.assertEqual(self._names([self.blue]), {"Blue M"})
+
+    @override_settings(PRODUCT_ATTRIBUTE_BITMAP_INDEX=True)
+    def test_index_follows_attribute_changes(self):
+        self.assertEqual(self._names([self.blue]), {"Blue M"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products["Red"].attributes.add(self.blue)
+            self.products["Blue M"].delete()
+        self.assertEqual(self._names([self.blue]), {"Red"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.blue.products.clear()
+        self.assertEqual(self._names([self.blue]), set())
+
+    @override_settings(PRODUCT_ATTRIBUTE_BITMAP_INDEX=True)
+    def test_facet_counts_from_index(self):
+        response = self.client.get(reverse("product-facets"), {"attributes": [self.medium.id]})
+        self.assertEqual(
+            [(a["value"], a["count"]) for a in response.data["attributes"]],
+            [("Blue", 1), ("Red", 1), ("M", 2)],
+        )
+
+
+class CategoryHierarchyTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.electronics = Category.objects.create(name="Electronics")
+        self.phones = Category.objects.create(name="Phones", parent=self.electronics)
+        self.smartphones = Category.objects.create(name="Smartphones", parent=self.phones)
+        self.laptops = Category.objects.create(name="Laptops", parent=self.electronics)
+        self.books = Category.objects.create(name="Books")
+        for name, category in (("Pixel", self.smartphones), ("ThinkPad", self.laptops), ("Novel", self.books)):
+            Product.objects.create(name=name, price=Decimal("10.00"), qty=1, seller=self.seller, category=category)
+        self.url = reverse("product-list")
+
+    def _names(self, category):
+        response = self.client.get(self.url, {"category_tree": category.id})
+        return {card["name"] for card in response.data["results"]}
+
+    def test_filter_covers_the_whole_subtree(self):
+        self.assertEqual(self._names(self.electronics), {"Pixel", "ThinkPad"})
+        self.assertEqual(self._names(self.phones), {"Pixel"})
+        self.assertEqual(
+            CategoryClosure.objects.get(ancestor=self.electronics, descendant=self.smartphones).depth, 2
+        )
+
+    def test_moving_a_category_moves_its_subtree(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phones.parent = self.books
+            self.phones.save()
+        self.assertEqual(self._names(self.electronics), {"ThinkPad"})
+        self.assertEqual(self._names(self.books), {"Novel", "Pixel"})
+        self.assertEqual(
+            set(CategoryClosure.objects.filter(descendant=self.smartphones).values_list("ancestor__name", "depth")),
+            {("Smartphones", 0), ("Phones", 1), ("Books", 2)},
+        )
+
+    def test_deleting_a_parent_category_is_refused(self):
+        response = self.client.delete(reverse("category-detail", args=[self.electronics.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Category.objects.count(), 5)
+        self.assertEqual(Product.objects.count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("category-detail", args=[self.smartphones.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._names(self.electronics), {"ThinkPad"})
+        self.assertFalse(CategoryClosure.objects.filter(descendant_id=self.smartphones.id).exists())
+
+    def test_cannot_move_under_own_subtree(self):
+        serializer = CategorySerializer(self.electronics, data={"parent": self.smartphones.id}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("parent", serializer.errors)
+
+    def test_tree_is_nested_and_cached(self):
+        url = reverse("category-tree")
+        tree = self.client.get(url).data
+        self.assertEqual([node["name"] for node in tree], ["Books", "Electronics"])
+        self.assertEqual(
+            [(c["name"], [g["name"] for g in c["children"]]) for c in tree[1]["children"]],
+            [("Laptops", []), ("Phones", ["Smartphones"])],
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Tablets", parent=self.electronics)
+        names = [c["name"] for c in self.client.get(url).data[1]["children"]]
+        self.assertEqual(names, ["Laptops", "Phones", "Tablets"])
+
+    def test_rebuild_command(self):
+        CategoryClosure.objects.all().delete()
+        call_command("rebuild_category_closure", stdout=StringIO())
+        self.assertEqual(CategoryClosure.objects.count(), 5 + 4)
+        self.assertEqual(self._names(self.electronics), {"Pixel", "ThinkPad"})
+
+
+class CatalogBenchmarkCommandTestCase(APITestCase):
+    def test_seeds_and_explains_every_combination(self):
+        color = Attribute.objects.create(name="Color")
+        AttributeValue.objects.create(attribute=color, value="Red")
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("benchmark_catalog_queries", seed=60, repeat=1, batch_size=25, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Seeded 60 products.", output)
+        self.assertIn("category_tree | order by price, id", output)
+        self.assertIn("attributes | order by -created_at, -id", output)
+        # Seeded through bulk_create, yet listed like any other product.
+        self.assertEqual(ProductCard.objects.count(), 60)
+        response = self.client.get(reverse("product-list"), {"search": "bench product"})
+        self.assertTrue(response.data["results"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("benchmark_catalog_queries", cleanup=True, stdout=StringIO())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+        self.assertFalse(Brand.objects.exists())
+        self.assertFalse(ProductCard.objects.exists())
+
+
+class WishlistTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="buyer@example.com", full_name="Buyer", password="testpass")
+        self.other = User.objects.create_user(email="other@example.com", full_name="Other", password="testpass")
+        category = Category.objects.create(name="Toys")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kite, self.ball, self.yoyo = [
+                Product.objects.create(name=name, price=Decimal("5.00"), qty=1, seller=self.other, category=category)
+                for name in ("Kite", "Ball", "Yoyo")
+            ]
+        Wishlist.objects.create(user=self.user, product=self.kite)
+        Wishlist.objects.create(user=self.user, product=self.ball)
+        Wishlist.objects.create(user=self.other, product=self.yoyo)
+        self.url = reverse("wishlist-list")
+
+    def test_lists_only_own_rows_with_cards_in_one_query(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        rows = response.data["results"]
+        self.assertEqual([row["product_card"]["name"] for row in rows], ["Ball", "Kite"])
+        self.assertNotIn("user", rows[0])
+        self.assertNotIn("is_wishlisted", rows[0]["product_card"])
+
+    def test_adding_twice_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(self.url, {"product": self.yoyo.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Wishlist.objects.filter(user=self.user, product=self.yoyo).exists())
+        response = self.client.post(self.url, {"product": self.yoyo.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_product_list_flags_wishlisted_products(self):
+        url = reverse("product-list")
+        flags = lambda: {c["name"]: c["is_wishlisted"] for c in self.client.get(url).data["results"]}
+        self.assertEqual(flags(), {"Kite": False, "Ball": False, "Yoyo": False})
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(flags(), {"Kite": True, "Ball": True, "Yoyo": False})
+        # Cached per user, and invalidated when their wishlist changes.
+        with self.captureOnCommitCallbacks(execute=True):
+            Wishlist.objects.filter(user=self.user, product=self.kite).delete()
+        self.assertEqual(flags(), {"Kite": False, "Ball": True, "Yoyo": False})
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(flags(), {"Kite": False, "Ball": False, "Yoyo": True})
+
+
+class ProductAutocompleteTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        self.phones = Category.objects.create(name="Smartphones")
+        self.brand = Brand.objects.create(name="Smarty")
+        for name in ("Smart Phone X", "Smart Phone X", "Old phone", "Smartwatch with an extra long name"):
+            Product.objects.create(name=name, price=Decimal("99.00"), qty=1, seller=seller, category=self.phones)
+        autocomplete_index.load()
+        self.url = reverse("product-autocomplete")
+
+    def _suggest(self, q, **params):
+        return [(s["type"], s["text"]) for s in self.client.get(self.url, {"q": q, **params}).data]
+
+    def test_ranked_prefix_matches_without_queries(self):
+        with self.assertNumQueries(0):
+            suggestions = self._suggest("SMART")
+        self.assertEqual(suggestions, [
+            ("category", "Smartphones"), ("brand", "Smarty"),
+            ("product", "Smart Phone X"), ("product", "Smartwatch with an extra long name"),
+        ])
+        self.assertEqual(self._suggest("phone"), [("product", "Old phone"), ("product", "Smart Phone X")])
+        self.assertEqual(self._suggest("smartwatch with an extra"), [("product", "Smartwatch with an extra long name")])
+        self.assertEqual(len(self._suggest("smart", limit=2)), 2)
+        self.assertEqual(self._suggest(""), [])
+
+    def test_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = "Phonetic"
+            self.brand.save()
+            self.phones.delete()
+            Brand.objects.create(name="Smartex")
+        with self.assertNumQueries(0):
+            self.assertEqual(self._suggest("smart"), [("brand", "Smartex")])
+        self.assertEqual(self._suggest("phon"), [("brand", "Phonetic")])
+
+    def test_removal_prunes_the_trie(self):
+        index = PrefixIndex(top_size=4)
+        index.add("brand", 1, "Acme Tools")
+        index.add("brand", 2, "Acme")
+        self.assertEqual([s["id"] for s in index.lookup("acme", 5)], [2, 1])
+        index.remove("brand", 1)
+        self.assertEqual(set(index.root.children), {"a"})
+        self.assertEqual(index.lookup("tools", 5), [])
+
+    def test_repeated_words_share_a_path(self):
+        index = PrefixIndex(top_size=4)
+        index.add("product", 1, "la la la la la la la la la la")
+        index.add("product", 1, "la la la la la la la la la la!")
+        self.assertEqual([s["id"] for s in index.lookup("la la", 5)], [1])
+        index.remove("product", 1)
+        self.assertEqual(index.root.children, {})
+
+    def test_empty_until_the_first_build_finishes(self):
+        with patch.object(autocomplete_index, "_index", None), \
+                patch.object(autocomplete_index, "_reloading", True), \
+                patch.object(autocomplete_index, "load") as load:
+            with self.assertNumQueries(0):
+                self.assertEqual(self._suggest("smart"), [])
+        load.assert_not_called()
+
+
+class ProductRecommendationsTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        seller = User.objects.create_user(email="seller@example.com", full_name="Seller", password="testpass")
+        category = Category.objects.create(name="Kitchen")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pan, self.lid, self.oil, self.salt = [
+                Product.objects.create(name=name, price=Decimal("9.00"), qty=5, seller=seller, category=category)
+                for name in ("Pan", "Lid", "Oil", "Salt")
+            ]
+
+    def _order(self, *products):
+        order = Order.objects.create(
+            stripe_checkout_id=f"cs_{Order.objects.count()}", amount=Decimal("10.00"),
+            currency="usd", customer_email="buyer@example.com", status="Paid",
+        )
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product) for product in products])
+
+    def _recommended(self, product):
+        response = self.client.get(reverse("product-recommendations", args=[product.id]))
+        return [card["name"] for card in response.data]
+
+    def test_builds_top_k_incrementally(self):
+        self._order(self.pan, self.lid, self.oil)
+        self._order(self.pan, self.lid)
+        self._order(self.salt)
+        call_command("build_recommendations", top_k=2, stdout=StringIO())
+        self.assertEqual(self._recommended(self.pan), ["Lid", "Oil"])
+        self.assertEqual(self._recommended(self.salt), [])
+        self.assertEqual(ProductCooccurrence.objects.get(product=self.pan, other=self.lid).count, 2)
+
+        # Only the new orders are read; existing counts are added to.
+        self._order(self.oil, self.salt)
+        self._order(self.oil, self.salt)
+        self._order(self.oil, self.salt, self.pan)
+        out = StringIO()
+        call_command("build_recommendations", top_k=2, stdout=out)
+        self.assertIn("Processed 3 orders", out.getvalue())
+        self.assertEqual(self._recommended(self.oil), ["Salt", "Pan"])
+        self.assertEqual(self._recommended(self.pan), ["Lid", "Oil"])
+        self.assertEqual(ProductCooccurrence.objects.get(product=self.pan, other=self.oil).count, 2)
+
+        call_command("build_recommendations", full=True, top_k=2, stdout=StringIO())
+        self.assertEqual(ProductRecommendation.objects.filter(product=self.oil).count(), 2)
+        self.assertEqual(ProductCooccurrence.objects.get(product=self.oil, other=self.salt).count, 3)
+
+    def test_served_with_one_query(self):
+        self._order(self.pan, self.lid)
+        call_command("build_recommendations", stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(self._recommended(self.pan), ["Lid"])
+        response = self.client.get(reverse("product-recommendations", args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("product-recommendations", args=["abc"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_order_paid_after_a_later_one_is_counted(self):
+        self._order(self.pan, self.lid)
+        early = Order.objects.get()
+        Order.objects.filter(pk=early.pk).update(status="Pending")
+        self._order(self.oil, self.salt)
+        call_command("build_recommendations", stdout=StringIO())
+        self.assertEqual(self._recommended(self.pan), [])
+
+        # The lower id becomes Paid only now, after the run passed the later order.
+        Order.objects.filter(pk=early.pk).update(status="Paid")
+        out = StringIO()
+        call_command("build_recommendations", stdout=out)
+        self.assertIn("Processed 1 orders", out.getvalue())
+        self.assertEqual(self._recommended(self.pan), ["Lid"])
+        self.assertEqual(ProductCooccurrence.objects.get(product=self.oil, other=self.salt).count, 1)
@@ -1,19 +1,35 @@
 # products/views.py
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, ProtectedError, Value
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Category, Brand, Attribute, AttributeValue,
     Product, ProductImage, Wishlist
 )
 from .serializers import (
-    CategorySerializer, BrandSerializer, AttributeSerializer,
-    AttributeValueSerializer, ProductSerializer, ProductImageSerializer, WishlistSerializer
+    CategorySerializer, CategoryTreeSerializer, BrandSerializer, AttributeSerializer,
+    AttributeValueSerializer, ProductSerializer, ProductCardSerializer,
+    ProductBulkUpdateItemSerializer, ProductBulkUpdateSerializer,
+    ProductImageSerializer, WishlistSerializer, AutocompleteSuggestionSerializer
 )
-from .filters import ProductFilter
+from .autocomplete import autocomplete_index
+from .bulk import (
+    FILE_FORMATS, ProductImporter, apply_bulk_updates, detect_format, iter_export_lines, iter_rows
+)
+from .cache import CachedCatalogResponseMixin, wishlist_generation_key
+from .categories import get_tree
+from .facets import get_facets
+from .filters import ProductFilter, ProductSearchFilter, RelevanceOrderingFilter
+from .pagination import KeysetCursorPagination, WishlistCursorPagination
 from .permissions import IsSellerOrReadOnly
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = (
@@ -25,6 +41,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     )
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsSellerOrReadOnly]
+    pagination_class = KeysetCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = ProductFilter
     search_fields = ["name", "description"]
@@ -61,12 +78,36 @@ class ProductImageViewSet(viewsets.ModelViewSet):
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = KeysetCursorPagination
+
+    @extend_schema(responses={200: CategoryTreeSerializer(many=True)})
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def tree(self, request):
+        """
+        GET /categories/tree/
+        The whole hierarchy as nested {id, name, children}, for navigation menus.
+        """
+        return Response(get_tree())
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        DELETE /categories/{id}/
+        Refused while the category has subcategories: move or delete those first.
+        """
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"detail": "This category has subcategories. Move or delete them first."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
 @extend_schema(tags=["Brands"])
 class BrandViewSet(viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetCursorPagination
 
 
 @extend_schema(tags=["Attributes"])
@@ -81,21 +122,201 @@ class AttributeValueViewSet(viewsets.ModelViewSet):
     queryset = AttributeValue.objects.all()
     serializer_class = AttributeValueSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetCursorPagination
+
+
+# Relations each product serializer field reads from.
+PRODUCT_SELECT_RELATED = {
+    "category": "category",
+    "brand": "brand",
+    "seller": "seller",
+    # Card fields are denormalized into ProductCard: one join, no prefetch.
+    "category_name": "card",
+    "brand_name": "card",
+    "primary_image": "card",
+    "attribute_summary": "card",
+}
+PRODUCT_PREFETCH_RELATED = {
+    "attributes": lambda: Prefetch("attributes", queryset=AttributeValue.objects.select_related("attribute")),
+    "images": lambda: "images",
+}
+
+
+def _is_wishlisted(user):
+    if not user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Wishlist.objects.filter(user=user, product=OuterRef("pk")))
 
 
 @extend_schema(tags=["Products"])
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().select_related('category', 'brand', 'seller').prefetch_related('attributes', 'images')
+class ProductViewSet(CachedCatalogResponseMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    pagination_class = KeysetCursorPagination
+    filter_backends = [ProductSearchFilter, RelevanceOrderingFilter, DjangoFilterBackend]
+    filterset_class = ProductFilter
     search_fields = ['name', 'description']
     ordering_fields = ['price', 'created_at']
-    filterset_fields = ['category', 'brand', 'seller', 'attributes']
+
+    def get_serializer_class(self):
+        if self.action in ("list", "recommendations"):
+            return ProductCardSerializer
+        return ProductSerializer
+
+    def get_queryset(self):
+        """
+        Join and prefetch only the relations behind the fields that will
+        actually be rendered (after `?fields=` / `?expand=`).
+        """
+        fields = self.get_serializer().fields
+        select = {PRODUCT_SELECT_RELATED[name] for name in fields if name in PRODUCT_SELECT_RELATED}
+        prefetch = [PRODUCT_PREFETCH_RELATED[name]() for name in fields if name in PRODUCT_PREFETCH_RELATED]
+        queryset = super().get_queryset().select_related(*select).prefetch_related(*prefetch)
+        if "is_wishlisted" in fields:
+            queryset = queryset.annotate(is_wishlisted=_is_wishlisted(self.request.user))
+        return queryset
+
+    def list_cache_generation_keys(self, request):
+        # is_wishlisted makes an authenticated user's list theirs alone.
+        if request.user.is_authenticated:
+            return [wishlist_generation_key(request.user.pk)]
+        return []
 
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
 
+    @extend_schema(
+        request={"multipart/form-data": {
+            "type": "object",
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "file_format": {"type": "string", "enum": list(FILE_FORMATS)},
+                "batch_size": {"type": "integer"},
+            },
+        }},
+        responses={201: dict, 400: dict},
+    )
+    @action(
+        detail=False, methods=["post"], url_path="import",
+        permission_classes=[permissions.IsAuthenticated], parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
+        POST /products/import/  (multipart: file=<.csv|.jsonl>, file_format?, batch_size?)
+        Creates products for the current seller and reports per-row errors.
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": ["This field is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get("file_format") or detect_format(upload.name)
+        if file_format not in FILE_FORMATS:
+            return Response({"file_format": [f"Use one of {', '.join(FILE_FORMATS)}."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = min(int(request.data.get("batch_size") or settings.PRODUCT_IMPORT_BATCH_SIZE), 5000)
+        except ValueError:
+            return Response({"batch_size": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ProductImporter(request.user, batch_size=max(batch_size, 1))
+        report = importer.run(iter_rows(upload.open("rb"), file_format))
+        code = status.HTTP_201_CREATED if report["created"] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=code)
+
+    @extend_schema(responses={(200, "text/csv"): OpenApiTypes.BINARY})
+    @action(detail=False, methods=["get"], url_path="export")
+    def bulk_export(self, request):
+        """
+        GET /products/export/?file_format=csv|jsonl&<same filters as the list>
+        Streams the matching catalog; memory stays flat however large it is.
+        Public like the list it mirrors, and in the importer's columns, so a
+        re-import creates new products rather than updating these.
+        """
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in FILE_FORMATS:
+            return Response({"file_format": [f"Use one of {', '.join(FILE_FORMATS)}."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(Product.objects.all())
+        content_type = "application/x-ndjson" if file_format == "jsonl" else "text/csv"
+        response = StreamingHttpResponse(iter_export_lines(queryset, file_format), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="products.{file_format}"'
+        return response
+
+    @extend_schema(request=ProductBulkUpdateItemSerializer(many=True), responses={200: dict, 400: dict, 403: dict})
+    @action(detail=False, methods=["patch"], url_path="bulk", permission_classes=[permissions.IsAuthenticated])
+    def bulk_update(self, request):
+        """
+        PATCH /products/bulk/  body: [{id, qty | qty_delta, price}, ...]
+        Stock/price sync with set-based UPDATEs. Every id must belong to the caller.
+        """
+        serializer = ProductBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data
+
+        ids = {item["id"] for item in items}
+        owned = set(Product.objects.filter(id__in=ids, seller=request.user).values_list("id", flat=True))
+        if ids - owned:
+            return Response(
+                {"detail": "Not allowed.", "ids": sorted(ids - owned)},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        report = apply_bulk_updates(items, request.user, batch_size=settings.PRODUCT_BULK_UPDATE_BATCH_SIZE)
+        code = status.HTTP_400_BAD_REQUEST if report["errors"] else status.HTTP_200_OK
+        return Response(report, status=code)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("q", str, description="What the user has typed so far."),
+            OpenApiParameter("limit", int, description="Defaults to (and is capped at) PRODUCT_AUTOCOMPLETE_MAX_RESULTS."),
+        ],
+        responses={200: AutocompleteSuggestionSerializer(many=True)},
+    )
+    @action(
+        detail=False, methods=["get"],
+        authentication_classes=[], permission_classes=[permissions.AllowAny], pagination_class=None,
+    )
+    def autocomplete(self, request):
+        """
+        GET /products/autocomplete/?q=sma&limit=5
+        Category, brand and product names starting with `q` (at any word),
+        answered from the in-memory prefix index without database queries.
+        """
+        max_results = settings.PRODUCT_AUTOCOMPLETE_MAX_RESULTS
+        try:
+            limit = min(int(request.query_params.get("limit", max_results)), max_results)
+        except ValueError:
+            limit = max_results
+        return Response(autocomplete_index.suggest(request.query_params.get("q", ""), max(limit, 1)))
+
+    @extend_schema(responses={200: ProductCardSerializer(many=True)})
+    @action(detail=True, methods=["get"], pagination_class=None)
+    def recommendations(self, request, pk=None):
+        """
+        GET /products/{id}/recommendations/
+        Products most often bought together with this one, best first.
+        Precomputed by the `build_recommendations` command.
+        """
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        products = self.get_queryset().filter(recommended_in__product_id=pk).order_by("recommended_in__rank")
+        serializer = self.get_serializer(products, many=True)
+        if not serializer.data and not Product.objects.filter(pk=pk).exists():
+            raise NotFound()
+        return Response(serializer.data)
+
+    @extend_schema(responses={200: dict})
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        """
+        GET /products/facets/?<same filters as the list>
+        Counts per category, brand, attribute value, price bucket and stock state.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset, request.query_params))
+
 @extend_schema(tags=["Product Images"])
 class ProductImageViewSet(viewsets.ModelViewSet):
     queryset = ProductImage.objects.all()
@@ -111,6 +332,8 @@ class WishlistViewSet(viewsets.ModelViewSet):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = WishlistCursorPagination
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+    def get_queryset(self):
+        # The current user's rows only, each with its product card in the same query.
+        return super().get_queryset().filter(user=self.request.user).select_related("product__card")